@@ -0,0 +1,159 @@
+import os
+import select
+import shlex
+import subprocess
+import threading
+import time
+
+import metrics
+
+ADB = os.environ.get("ADB", "adb")
+
+# Printed on a line of its own after every command, followed by the exit
+# status, so we know where its output ends. printf assembles it from two
+# pieces, so a shell that echoes its input (a PTY, adbd without shell_v2)
+# never shows the marker itself.
+MARKER = "__ADB_DONE__"
+TRAILER = "; printf '\\n__ADB_%s%s\\n' DONE__ $?"
+
+
+class AdbError(Exception):
+    """`sent` is True when the command reached the shell and may have run."""
+
+    def __init__(self, message, sent=False):
+        super().__init__(message)
+        self.sent = sent
+
+
+class AdbShell:
+    """One long-lived `adb shell` session to a Firestick.
+
+    Commands are written to the shell's stdin followed by a printf of MARKER
+    and the exit status, so each command costs a single round trip instead of
+    a new adb process. The session is reopened automatically if it drops,
+    but a command is only ever written once: if the shell fails after that,
+    the command may already have run, so run() raises instead of retrying.
+    """
+
+    def __init__(self, address, adb=ADB, timeout=5.0):
+        self.address = address
+        self.serial = address if ':' in address else f"{address}:5555"
+        self.adb = adb
+        self.timeout = timeout
+        self.proc = None
+        self.connected = False
+        self._buffer = b''
+        self._line = b''
+        self.lock = threading.Lock()
+
+    def connect(self):
+        """Run `adb connect` once; later calls are free."""
+        if self.connected:
+            return True
+        result = subprocess.run([self.adb, "connect", self.address], capture_output=True, text=True)
+        if result.returncode != 0 or "unable" in result.stdout or "failed" in result.stdout:
+            raise AdbError(f"Failed to connect to {self.address}: {result.stderr or result.stdout}".strip())
+        self.connected = True
+        return True
+
+    def _open(self):
+        self.connect()
+        self.proc = subprocess.Popen(
+            [self.adb, "-s", self.serial, "shell"],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+            bufsize=0)
+        self._buffer = b''
+
+    def close(self):
+        if self.proc is not None:
+            try:
+                self.proc.stdin.close()
+            except OSError:
+                pass
+            try:
+                self.proc.wait(timeout=1)
+            except subprocess.TimeoutExpired:
+                self.proc.kill()
+            self.proc = None
+
+    def _read_until_marker(self, timeout):
+        deadline = time.monotonic() + timeout
+        fd = self.proc.stdout.fileno()
+        needle = b'\n' + MARKER.encode()
+        while True:
+            index = self._buffer.find(needle)
+            if index >= 0:
+                end = self._buffer.find(b'\n', index + 1)
+                if end >= 0:
+                    output = self._buffer[:index]
+                    if output.startswith(self._line):
+                        output = output[len(self._line):]  # Echoed back by the shell
+                    status = self._buffer[index + len(needle):end].strip()
+                    self._buffer = self._buffer[end + 1:]
+                    if not status.isdigit():
+                        raise AdbError(f"Unexpected reply from {self.serial}: {status!r}")
+                    return int(status), output.decode(errors='replace').strip()
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise AdbError(f"Timed out waiting for {self.serial}")
+            ready, _, _ = select.select([fd], [], [], remaining)
+            if ready:
+                chunk = os.read(fd, 4096)
+                if not chunk:
+                    raise AdbError(f"ADB shell to {self.serial} closed")
+                self._buffer += chunk
+
+    def _alive(self):
+        """False if the session has ended, checked without blocking."""
+        if self.proc is None or self.proc.poll() is not None:
+            return False
+        fd = self.proc.stdout.fileno()
+        while select.select([fd], [], [], 0)[0]:
+            chunk = os.read(fd, 4096)
+            if not chunk:
+                return False
+            self._buffer += chunk
+        return True
+
+    def _send(self, command):
+        # A session that dropped while idle is reopened before anything is written
+        if not self._alive():
+            self._drop()
+            self._open()
+        self._line = f"{command}{TRAILER}\n".encode()
+        self.proc.stdin.write(self._line)
+
+    def _drop(self):
+        self.close()
+        self.connected = False
+
+    def run(self, command, timeout=None):
+        """Run a shell command and return (exit_status, output).
+
+        `timeout` overrides the shell's timeout for commands known to be slow.
+        """
+        if not isinstance(command, str):
+            command = shlex.join(command)
+        with self.lock, metrics.timed('adb_roundtrip'):
+            try:
+                self._send(command)
+            except (OSError, AdbError):
+                # Session dropped (Firestick slept, Wi-Fi blip) before the
+                # command went out; reconnect and send it once more
+                self._drop()
+                self._send(command)
+            try:
+                return self._read_until_marker(self.timeout if timeout is None else timeout)
+            except (OSError, AdbError) as e:
+                # The command may have run, or still be running: never send it twice
+                self._drop()
+                raise AdbError(str(e), sent=True)
+
+    def keyevent(self, keyevent):
+        return self.run(f"input keyevent {keyevent}")
+
+    def start_activity(self, component, action=None):
+        args = ["am", "start"]
+        if action:
+            args += ["-a", action]
+        return self.run(args + ["-n", component])
@@ -1,16 +1,225 @@
-from flask import Flask, request, jsonify, send_from_directory, render_template
-import subprocess
 import logging
+import os
+
+from devices import DevicePool
+from engine import MAX_REPEAT_RATE, REPEAT_RATE
+import logs
+
+# Log through a background writer to a rotating app.log (see logs.py)
+logs.setup()
+
+# One engine per room for the lifetime of the server so the HID gadgets, ADB
+# connections and IR setup are reused across button presses. The channels
+# start warming in parallel straight away, while the slower Flask import
+# below runs.
+pool = DevicePool(serve_ir=True)
+pool.warm_up(background=True)
+
+from flask import Flask, Response, request, jsonify, send_from_directory, render_template
+
+from jobs import JobQueue, DONE
+from events import EventBroker
+from macros import MacroStore
+from scheduler import Scheduler
+import metrics
+import registry
 
 app = Flask(__name__, static_folder='static', template_folder='templates')
 
-# Set up logging to app.log at INFO level
-logging.basicConfig(filename='app.log', level=logging.INFO, format='%(asctime)s %(levelname)s: %(message)s')
+# Commands run on per-channel workers so requests return straight away
+jobs = JobQueue(pool)
+
+# Named macros from macros.json, compiled once and reloaded when the file changes
+macro_store = MacroStore()
+
+# Results and status are pushed to browsers over /events
+broker = EventBroker()
+# Threads left for requests once every /events stream is open
+REQUEST_THREADS = int(os.environ.get('REQUEST_THREADS', '8'))
+
+def publish_job(job):
+    """One job event per ref, so presses folded into the job hear about it too."""
+    result = job.as_json()
+    broker.publish('job', result)
+    for ref in job.merged_refs:
+        broker.publish('job', dict(result, ref=ref))
+
+jobs.listeners.append(publish_job)
+
+def log_job(job):
+    """One line per finished job; the captured output only at DEBUG or on errors."""
+    if job.status == DONE:
+        logging.info('Executed: %s | Job: %s | %.1f ms', job.command, job.id, (job.finished - job.started) * 1000)
+        if logging.getLogger().isEnabledFor(logging.DEBUG):
+            logging.debug('Output of job %s: %s', job.id, ' | '.join(job.output))
+    else:
+        logging.warning('Failed: %s | Job: %s | Output: %s', job.command, job.id, ' | '.join(job.output))
+
+jobs.listeners.append(log_job)
+
+# Device state changes are pushed too; each Firestick is polled in the background
+for name, room_engine in pool.items():
+    room_engine.state.listeners.append(lambda state, room=name: broker.publish('state', dict(state, room=room)))
+    room_engine.state.start()
+
+# Scheduled and state-triggered automations from automations.json, queued
+# like any other macro so they reuse the open channels
+scheduler = Scheduler(jobs, pool, macro_store)
+scheduler.start()
+
+def status():
+    held = {name: e.held[0].name if e.held else None for name, e in pool.items()}
+    return {'held': held, 'queues': jobs.depths(), 'ready': pool.ready()}
+
+def requested_room():
+    """Room named by the request (form field, JSON body or ?room=); None means the default room."""
+    data = request.get_json(silent=True) or {}
+    return request.form.get('room') or data.get('room') or request.args.get('room')
+
+def engine_for(room):
+    """The room's engine, or None if the room isn't in the inventory."""
+    return pool.engines.get(room or pool.default)
+
+def unknown_room(room):
+    return jsonify({'status': 'error', 'error': f'Unknown room {room}'}), 404
 
 @app.route('/')
 def serve_index():
     return render_template('index.html')
 
+@app.route('/commands')
+def list_commands():
+    return jsonify(registry.as_json())
+
+@app.route('/rooms')
+def list_rooms():
+    return jsonify({
+        'default': pool.default,
+        'rooms': [{'name': room.name, 'firestick': room.firestick, 'hid': room.hid,
+                   'ir': sorted(pool.get(room.name).ir_remotes())} for room in pool.rooms.values()],
+    })
+
+@app.route('/events')
+def events():
+    client = broker.subscribe()
+    if client is None:
+        # Pages without a stream fall back to polling /jobs
+        return 'Too many event streams', 503
+    return Response(broker.stream(client, hello=status()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/send', methods=['POST'])
+def send():
+    """Lightweight form-encoded control path; results come back over /events."""
+    action = request.form.get('action', 'execute')
+    user_command = request.form.get('command', '')
+    ref = request.form.get('ref')
+    room = request.form.get('room') or None
+    engine = engine_for(room)
+    if engine is None:
+        return f'Unknown room {room}', 404
+
+    if action == 'release':
+        engine.release(ref=ref)
+        broker.publish('status', status())
+        return '', 204
+    if not user_command:
+        return 'No command provided', 400
+    if action == 'macro':
+        plan = macro_store.get(user_command)
+        if plan is None:
+            return f'Unknown macro {user_command}', 404
+        return str(jobs.submit_plan(plan, ref=ref, room=room).id), 202
+    if action == 'press':
+        ok, output = engine.press(user_command, ref=ref)
+        broker.publish('press', {'ref': ref, 'room': room, 'command': user_command, 'ok': ok, 'output': output})
+        broker.publish('status', status())
+        return '', 204
+
+    job = jobs.submit(user_command, coalesce=True, ref=ref, room=room)
+    return str(job.id), 202
+
+@app.route('/ready')
+def readiness():
+    """200 once every room's HID gadget, ADB shell and pigpiod are open; 503 until then."""
+    ready = pool.ready()
+    return jsonify({'ready': ready, 'rooms': pool.readiness()}), 200 if ready else 503
+
+@app.route('/metrics')
+def prometheus_metrics():
+    return Response(metrics.prometheus(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/metrics/summary')
+def metrics_summary():
+    return jsonify({'stages': metrics.summary(), 'queues': jobs.depths()})
+
+@app.route('/logs')
+def recent_logs():
+    limit = request.args.get('limit', 100, type=int)
+    level = logging.getLevelName(request.args.get('level', 'NOTSET').upper())
+    if not isinstance(level, int):
+        return jsonify({'status': 'error', 'error': 'Unknown level'}), 400
+    return jsonify({'records': logs.recent(limit, level)})
+
+@app.route('/state')
+def device_state():
+    room = request.args.get('room')
+    engine = engine_for(room)
+    if engine is None:
+        return unknown_room(room)
+    if request.args.get('refresh'):
+        engine.state.poll_firestick()
+    return jsonify(dict(engine.state.snapshot(), room=room or pool.default))
+
+@app.route('/state/<device>', methods=['PUT', 'POST'])
+def correct_state(device):
+    """Tell the cache what a device is really doing, e.g. {"power": true} after using its own remote."""
+    room = request.args.get('room')
+    engine = engine_for(room)
+    if engine is None:
+        return unknown_room(room)
+    try:
+        engine.state.set(device, **(request.get_json() or {}))
+    except KeyError as e:
+        return jsonify({'status': 'error', 'error': f'Unknown device or field: {e}'}), 400
+    return jsonify(dict(engine.state.snapshot(), room=room or pool.default))
+
+@app.route('/macros')
+def list_macros():
+    return jsonify(macro_store.as_json())
+
+@app.route('/macros/<name>', methods=['POST'])
+def run_macro(name):
+    plan = macro_store.get(name)
+    if plan is None:
+        return jsonify({'status': 'error', 'error': f'Unknown macro {name}'}), 404
+    if request.args.get('dry_run'):
+        return jsonify({'status': 'planned', 'plan': plan.as_json(), 'timeline': plan.timeline()})
+    room = requested_room()
+    if engine_for(room) is None:
+        return unknown_room(room)
+    job = jobs.submit_plan(plan, room=room)
+    logging.info('Queued macro: %s | Job: %s | Room: %s', name, job.id, job.room)
+    return jsonify({'status': 'queued', 'job': job.id}), 202
+
+@app.route('/automations')
+def list_automations():
+    return jsonify(scheduler.as_json())
+
+@app.route('/automations/<name>', methods=['POST'])
+def run_automation(name):
+    """Run an automation now, whatever its schedule or trigger."""
+    room = requested_room()
+    if engine_for(room) is None:
+        return unknown_room(room)
+    try:
+        job = scheduler.run(name, room=room)
+    except KeyError:
+        return jsonify({'status': 'error', 'error': f'Unknown automation {name}'}), 404
+    if job is None:
+        return jsonify({'status': 'error', 'error': f'Automation {name} could not be queued'}), 500
+    return jsonify({'status': 'queued', 'job': job.id}), 202
+
 @app.route('/<path:filename>')
 def serve_static(filename):
     return send_from_directory(app.static_folder, filename)
@@ -21,22 +230,72 @@ def execute():
     user_command = data.get('command')
     if not user_command:
         return jsonify({'status': 'error', 'error': 'No command provided'}), 400
-    
-    # Build the full command as a list to avoid shell injection
-    full_command = ['python3', 'send_keystrokes.py', user_command]
+    room = data.get('room')
+    if engine_for(room) is None:
+        return unknown_room(room)
     
     try:
-        result = subprocess.run(full_command, capture_output=True, text=True)
-        output = result.stdout.strip() + ('\n' + result.stderr.strip() if result.stderr else '')
-        logging.info(f'Executed: {full_command} | Return code: {result.returncode} | Output: {output}')
-        
-        if result.returncode == 0:
-            return jsonify({'status': 'success', 'output': output})
-        else:
-            return jsonify({'status': 'error', 'error': output}), 500
+        job = jobs.submit(user_command, coalesce=bool(data.get('coalesce')), room=room)
+        logging.debug('Queued: %s | Job: %s | Room: %s | Channel: %s', user_command, job.id, job.room, job.channel)
     except Exception as e:
-        logging.error(f'Exception executing command: {e}')
+        logging.error('Exception queueing command: %s', e)
         return jsonify({'status': 'error', 'error': str(e)}), 500
 
+    if not data.get('wait'):
+        return jsonify({'status': 'queued', 'job': job.id}), 202
+
+    # Callers that need the result (scripts, old clients) can still block
+    job.done.wait()
+    if job.status == DONE:
+        return jsonify({'status': 'success', 'job': job.id, 'output': job.as_json()['output']})
+    return jsonify({'status': 'error', 'job': job.id, 'error': job.as_json()['output']}), 500
+
+@app.route('/jobs/<int:job_id>')
+def job_status(job_id):
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({'status': 'error', 'error': f'Unknown job {job_id}'}), 404
+    return jsonify(job.as_json())
+
+@app.route('/press', methods=['POST'])
+def press():
+    data = request.get_json(silent=True) or {}
+    user_command = data.get('command')
+    if not user_command:
+        return jsonify({'status': 'error', 'error': 'No command provided'}), 400
+    engine = engine_for(data.get('room'))
+    if engine is None:
+        return unknown_room(data.get('room'))
+
+    try:
+        rate = float(data.get('rate', REPEAT_RATE))
+    except (TypeError, ValueError):
+        rate = 0.0
+    if not rate > 0:  # Also rejects NaN
+        return jsonify({'status': 'error', 'error': 'rate must be a positive number of repeats per second'}), 400
+    rate = min(rate, MAX_REPEAT_RATE)
+    ok, output = engine.press(user_command, rate=rate, ref=data.get('ref'))
+    logging.info('Pressed: %s | Success: %s', user_command, ok)
+    if ok:
+        return jsonify({'status': 'success', 'output': output})
+    return jsonify({'status': 'error', 'error': output}), 500
+
+@app.route('/release', methods=['POST'])
+def release():
+    engine = engine_for(requested_room())
+    if engine is None:
+        return unknown_room(requested_room())
+    data = request.get_json(silent=True) or {}
+    engine.release(ref=data.get('ref'))
+    return jsonify({'status': 'success'})
+
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', debug=True)
+    port = int(os.environ.get('PORT', '5000'))
+    try:
+        from waitress import serve
+    except ImportError:
+        # No production server installed; the threaded dev server still handles /events
+        app.run(host='0.0.0.0', port=port, threaded=True)
+    else:
+        # Open /events streams each hold a thread; the rest serve button presses
+        serve(app, host='0.0.0.0', port=port, threads=broker.max_clients + REQUEST_THREADS)
@@ -0,0 +1,48 @@
+"""Compare one adb process per keyevent against the persistent AdbShell session.
+
+Uses sim/fake_adb.py as the adb binary. FAKE_ADB_DROP_AFTER is set so the
+persistent session is dropped periodically and has to reconnect before the
+next command.
+
+    python3 bench/bench_adb.py [--runs 50]
+"""
+import argparse
+import os
+import subprocess
+import time
+
+from common import SIM_DIR, report
+from adb import AdbShell
+
+FAKE_ADB = os.path.join(SIM_DIR, "fake_adb.py")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument("--runs", type=int, default=50)
+    args = parser.parse_args()
+    os.environ["FAKE_ADB_DROP_AFTER"] = "20"
+
+    spawn = []
+    for _ in range(args.runs):
+        start = time.perf_counter()
+        subprocess.run([FAKE_ADB, "shell", "input", "keyevent", "3"], capture_output=True, text=True)
+        spawn.append(time.perf_counter() - start)
+
+    shell = AdbShell("127.0.0.1", adb=FAKE_ADB)
+    persistent = []
+    for _ in range(args.runs):
+        start = time.perf_counter()
+        status, _ = shell.keyevent(3)
+        persistent.append(time.perf_counter() - start)
+        assert status == 0
+        # Sessions drop while idle (the fake exits right after a reply), and
+        # a command sent into a dropping session isn't retried
+        time.sleep(0.005)
+    shell.close()
+
+    print("HOME keyevent")
+    report("spawn", spawn)
+    report("persistent", persistent)
+
+if __name__ == "__main__":
+    main()
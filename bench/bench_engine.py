@@ -0,0 +1,57 @@
+"""Compare per-command latency of the subprocess path against the resident engine.
+
+Runs entirely against stand-in devices: a regular file plays /dev/hidg0 and
+sim/fake_adb.py plays the adb binary.
+
+    python3 bench/bench_engine.py [--runs 20]
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from common import BASE_DIR, SIM_DIR, report
+from engine import CommandEngine
+
+FAKE_ADB = os.path.join(SIM_DIR, "fake_adb.py")
+COMMANDS = ["UP", "HOME", "PLAYPAUSE", "NETFLIX"]
+
+def time_subprocess(command, env, runs):
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, os.path.join(BASE_DIR, "send_keystrokes.py"), command],
+                       env=env, capture_output=True, text=True)
+        samples.append(time.perf_counter() - start)
+    return samples
+
+def time_engine(engine, command, runs):
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        engine.execute(command)
+        samples.append(time.perf_counter() - start)
+    return samples
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument("--runs", type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        hidg = os.path.join(tmp, "hidg0")
+        open(hidg, "wb").close()
+        env = dict(os.environ, HID_DEVICE=hidg, ADB=FAKE_ADB)
+
+        engine = CommandEngine(hid_device=hidg, adb=FAKE_ADB)
+        engine.execute("ESC")  # warm up: connect ADB and open the gadget once
+        for command in COMMANDS:
+            print(command)
+            report("subprocess", time_subprocess(command, env, args.runs))
+            report("engine", time_engine(engine, command, args.runs))
+        engine.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""Measure IR waveform build cost per press with a mocked pigpio.
+
+"rebuild" reproduces the old per-press path (parse the JSON, build one pulse
+pair per carrier cycle, create and delete the wave); "resident" is the
+long-lived Emitter with its compiled cache and resident waves.
+
+Then compares one flat wave per button with the Emitter's wave_chain over
+shared burst waves: pulses created and build time for the whole remote, and
+a long capture that is over pigpio's pulse limit as a flat wave.
+
+    python3 bench/bench_ir_build.py [--presses 50]
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+from common import BASE_DIR, report
+sys.path.insert(0, os.path.join(BASE_DIR, "ir"))
+
+import fake_pigpio
+sys.modules['pigpio'] = fake_pigpio
+
+import emitter
+
+REMOTE = os.path.join(BASE_DIR, "ir", "tlc_tv.json")
+BUTTONS = ["VolumeUp", "VolumeDown", "Up", "Down", "Select"]
+TX_PIN = 17
+
+def rebuild_press(pi, button):
+    with open(REMOTE) as f:
+        timings = json.load(f)["buttons"][button]
+    pi.set_mode(TX_PIN, fake_pigpio.OUTPUT)
+    pi.wave_clear()
+    pi.wave_add_generic(emitter.to_pulses(emitter.compile_waveform(timings, TX_PIN)))
+    wid = pi.wave_create()
+    pi.wave_send_once(wid)
+    pi.wave_delete(wid)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument("--presses", type=int, default=50)
+    args = parser.parse_args()
+
+    pi = fake_pigpio.pi()
+    rebuild = []
+    for i in range(args.presses):
+        start = time.perf_counter()
+        rebuild_press(pi, BUTTONS[i % len(BUTTONS)])
+        rebuild.append(time.perf_counter() - start)
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        emitter.CACHE_DIR = cache_dir
+        start = time.perf_counter()
+        emitter.compile_remote(REMOTE, cache_dir=cache_dir)
+        cold_compile = time.perf_counter() - start
+        start = time.perf_counter()
+        emitter.compile_remote(REMOTE, cache_dir=cache_dir)
+        warm_compile = time.perf_counter() - start
+
+        resident = []
+        ir = emitter.Emitter(pi=fake_pigpio.pi())
+        for i in range(args.presses):
+            start = time.perf_counter()
+            ir.send(REMOTE, BUTTONS[i % len(BUTTONS)], TX_PIN)
+            resident.append(time.perf_counter() - start)
+
+    print(f"Whole-remote compile: {cold_compile * 1000:.2f} ms cold, {warm_compile * 1000:.2f} ms from disk cache")
+    print(f"Per press ({args.presses} presses over {len(BUTTONS)} buttons)")
+    report("rebuild", rebuild, width=14, places=3)
+    report("resident", resident, width=14, places=3)
+    print(f"  waves created: {ir.pi.stats['create']} resident vs {args.presses} rebuild")
+    compare_chains()
+
+def build_all(frames, flat):
+    """Pulses and seconds to build every frame, flat or chained."""
+    pi = fake_pigpio.pi()
+    ir = emitter.Emitter(pi=pi)
+    start = time.perf_counter()
+    for name, frame in frames.items():
+        if ir.segment(name, frame, TX_PIN, flat) is None:
+            return None, None
+    return sum(len(w) for w in pi.waves.values()), time.perf_counter() - start
+
+def compare_chains():
+    with open(REMOTE) as f:
+        buttons = json.load(f)["buttons"]
+    remote = emitter.open_remote(REMOTE)
+    sources = (("raw captures", buttons), ("decoded", {name: remote[name] for name in remote}))
+    for source, timings in sources:
+        frames = {name: emitter.compile_frame(t) for name, t in timings.items()}
+        print(f"Whole remote ({len(frames)} buttons, {source})")
+        for label, flat in (("flat waves", True), ("chained", False)):
+            pulses, seconds = build_all(frames, flat)
+            print(f"  {label:<14} {pulses:6d} pulses   {seconds * 1000:8.3f} ms")
+
+    # Six NEC frames captured back to back, as when a learn runs long
+    frame = buttons[BUTTONS[0]]
+    long = emitter.compile_frame((frame + [40000]) * 5 + frame)
+    flat_pulses = len(emitter.flatten(long, TX_PIN)) // 3
+    # The flat wave is expected to fail; don't log it
+    emitter.log.disabled = True
+    ir = emitter.Emitter(pi=fake_pigpio.pi())
+    flat_ok = ir.segment('long', long, TX_PIN, flat=True) is not None
+    chain_ok = ir.transmit('long', long, TX_PIN)
+    emitter.log.disabled = False
+    print(f"Long capture ({len(long)} timings, {flat_pulses} pulses flat, limit {fake_pigpio.MAX_PULSES})")
+    print(f"  flat wave: {'sent' if flat_ok else 'failed'}   chained: {'sent' if chain_ok else 'failed'} "
+          f"({emitter.chain_size(long)} chain bytes)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""Per-press IR latency: one emitter.py process per press vs the resident service.
+
+Runs against sim/fake_pigpio.py, so only the process, import, connection and
+wave-building overhead is measured.
+
+    python3 bench/bench_ir_service.py [--presses 20]
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from common import BASE_DIR, SIM_DIR, report
+STUBS = os.path.join(SIM_DIR, "stubs")
+sys.path.insert(0, STUBS)
+
+SOCKET = os.path.join(tempfile.mkdtemp(), "ir.sock")
+os.environ["IR_SOCKET"] = SOCKET
+
+from ir.service import IRService, REMOTES
+
+EMITTER = os.path.join(BASE_DIR, "ir", "emitter.py")
+
+def time_cli(env, presses):
+    pin, json_file = REMOTES['tv']
+    samples = []
+    for _ in range(presses):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, EMITTER, str(pin), json_file, "VolumeUp"],
+                       env=env, capture_output=True, text=True)
+        samples.append(time.perf_counter() - start)
+    return samples
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument("--presses", type=int, default=20)
+    args = parser.parse_args()
+    env = dict(os.environ, PYTHONPATH=STUBS)
+
+    standalone = time_cli(env, args.presses)
+
+    service = IRService()
+    service.preload()
+    service.serve(SOCKET, background=True)
+    client = time_cli(env, args.presses)
+
+    in_process = []
+    for _ in range(args.presses):
+        start = time.perf_counter()
+        assert service.send('tv', 'VolumeUp')
+        in_process.append(time.perf_counter() - start)
+    sends = service.emitter.pi.stats['send'] + service.emitter.pi.stats['chain']
+    service.close()
+
+    print("TV VolumeUp")
+    report("emitter.py alone", standalone, width=18, places=3)
+    report("emitter.py client", client, width=18, places=3)
+    report("in-process", in_process, width=18, places=3)
+    print(f"  service transmitted {sends} of {2 * args.presses} presses")
+
+if __name__ == "__main__":
+    main()
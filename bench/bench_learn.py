@@ -0,0 +1,71 @@
+"""Replay captured IR buttons through the learning tool with a fake pigpio.
+
+Every button of the captured remotes is turned into a receiver edge stream
+(with jitter, a tick counter about to wrap and a trailing NEC repeat code)
+and played into ir.learn's Recorder through fake pigpio callbacks, with an
+artificial delay before each callback to mimic a slow Pi Zero. Reports
+whether each learned button matches the protocol code of the original
+capture, and how long learning took.
+
+    python3 bench/bench_learn.py [--presses 3] [--latency 0.0005]
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+from common import BASE_DIR
+
+import fake_pigpio
+sys.modules['pigpio'] = fake_pigpio
+
+from ir import learn
+from ir.emitter import NEC_REPEAT
+from ir.protocols import decode
+from ir.remote_store import RemoteStore
+
+REMOTES = [os.path.join(BASE_DIR, "ir", "tlc_tv.json"), os.path.join(BASE_DIR, "ir", "samsung_soundbar.json")]
+GPIO = 22
+
+def press(timings, rng):
+    """Edge stream for one jittered press followed by a repeat code."""
+    jittered = [max(1, int(t * rng.uniform(0.93, 1.07))) for t in timings]
+    held = jittered + [40000] + NEC_REPEAT
+    return fake_pigpio.edges_from_timings(held, start_tick=0xFFFFFFFF - rng.randrange(200000))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument("--presses", type=int, default=3)
+    parser.add_argument("--latency", type=float, default=0.0005, help="Seconds of delay before each callback")
+    args = parser.parse_args()
+
+    rng = random.Random(1)
+    learn.FRAME_GAP_MS = 20
+    for remote in REMOTES:
+        with open(remote) as f:
+            buttons = json.load(f)["buttons"]
+        pi = fake_pigpio.pi()
+        queue = [name for name in buttons for _ in range(args.presses)]
+
+        def prompt(message):
+            # Each "Press ..." prompt plays the next recorded press
+            if message.startswith("Press "):
+                pi.replay(GPIO, press(buttons[queue.pop(0)], rng), latency=args.latency)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            store = os.path.join(tmp, "learned.irr")
+            start = time.perf_counter()
+            added = learn.learn(pi, store, list(buttons), args.presses, GPIO, timeout=5.0, prompt=prompt)
+            elapsed = time.perf_counter() - start
+            learned = RemoteStore(store)
+            matches = sum(learned.code(name) == decode(buttons[name]) for name in added)
+            print(f"{os.path.basename(remote)}: learned {len(added)}/{len(buttons)} buttons, "
+                  f"{matches} match the original codes, {elapsed:.2f}s "
+                  f"({args.presses} presses each, {args.latency * 1000:.1f} ms callback delay)")
+            learned.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""Load test for the web control channel against stand-in devices.
+
+Starts the app under waitress on a local port with a plain file as the HID
+gadget and sim/fake_adb.py as adb, opens one /events stream and drives
+presses from several concurrent clients. Reports round-trip latency (POST
+sent until the result event arrives) and presses/sec, next to the blocking
+JSON /execute path for comparison. Expect /send to come out a little
+slower per press on an idle machine: its result makes an extra hop through
+the /events stream thread. What it buys is that no request waits on a busy
+channel.
+
+    python3 bench/bench_load.py [--clients 4] [--presses 50] [--command HOME]
+"""
+import argparse
+import http.client
+import json
+import os
+import tempfile
+import threading
+import time
+import urllib.parse
+
+from common import SIM_DIR, report
+
+TMP = tempfile.mkdtemp()
+os.environ["HID_DEVICE"] = os.path.join(TMP, "hidg0")
+os.environ["ADB"] = os.path.join(SIM_DIR, "fake_adb.py")
+os.environ["IR_SOCKET"] = os.path.join(TMP, "ir.sock")
+open(os.environ["HID_DEVICE"], "wb").close()
+os.chdir(TMP)  # keep app.log out of the repo
+
+from waitress import create_server
+
+from app import app
+
+class EventReader(threading.Thread):
+    """Reads /events and records when each ref's result arrives."""
+
+    def __init__(self, port):
+        super().__init__(daemon=True)
+        self.port = port
+        self.arrived = {}
+        self.condition = threading.Condition()
+
+    def run(self):
+        conn = http.client.HTTPConnection("127.0.0.1", self.port)
+        conn.request("GET", "/events")
+        response = conn.getresponse()
+        event = None
+        for raw in response:
+            line = raw.decode().rstrip("\n")
+            if line.startswith("event: "):
+                event = line[7:]
+            elif line.startswith("data: ") and event == "job":
+                ref = json.loads(line[6:])["ref"]
+                with self.condition:
+                    self.arrived[ref] = time.perf_counter()
+                    self.condition.notify_all()
+
+    def wait(self, ref, timeout=10):
+        with self.condition:
+            self.condition.wait_for(lambda: ref in self.arrived, timeout)
+            return self.arrived.get(ref)
+
+def stream_client(port, reader, client_id, presses, command, samples):
+    conn = http.client.HTTPConnection("127.0.0.1", port)
+    for i in range(presses):
+        ref = f"{client_id}-{i}"
+        body = urllib.parse.urlencode({"action": "execute", "command": command, "ref": ref})
+        start = time.perf_counter()
+        conn.request("POST", "/send", body, {"Content-Type": "application/x-www-form-urlencoded"})
+        conn.getresponse().read()
+        arrived = reader.wait(ref)
+        if arrived is not None:
+            samples.append(arrived - start)
+
+def json_client(port, presses, command, samples):
+    conn = http.client.HTTPConnection("127.0.0.1", port)
+    for _ in range(presses):
+        body = json.dumps({"command": command, "wait": True})
+        start = time.perf_counter()
+        conn.request("POST", "/execute", body, {"Content-Type": "application/json"})
+        conn.getresponse().read()
+        samples.append(time.perf_counter() - start)
+
+def run_clients(target, count, args_for):
+    threads = [threading.Thread(target=target, args=args_for(i)) for i in range(count)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument("--clients", type=int, default=4)
+    parser.add_argument("--presses", type=int, default=50)
+    parser.add_argument("--command", default="HOME")
+    args = parser.parse_args()
+
+    server = create_server(app, host="127.0.0.1", port=0, threads=16)
+    port = server.effective_port
+    threading.Thread(target=server.run, daemon=True).start()
+
+    reader = EventReader(port)
+    reader.start()
+    time.sleep(0.2)
+
+    print(f"{args.clients} clients x {args.presses} presses of {args.command}")
+    samples = []
+    elapsed = run_clients(json_client, args.clients, lambda i: (port, args.presses, args.command, samples))
+    report("JSON /execute", samples, 14, stats=("median", "p95"), extra=f"   {len(samples) / elapsed:7.1f} presses/sec")
+
+    samples = []
+    elapsed = run_clients(stream_client, args.clients,
+                          lambda i: (port, reader, i, args.presses, args.command, samples))
+    report("/send + SSE", samples, 14, stats=("median", "p95"), extra=f"   {len(samples) / elapsed:7.1f} presses/sec")
+    server.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""Compare looking up one IR button in a JSON capture and in a packed store.
+
+Builds remotes of increasing size from the TV capture's buttons and times
+a single-button lookup the old way (parse the whole JSON file) against the
+mmap-backed store (open cost, then each lookup with the store mapped).
+
+    python3 bench/bench_remote_store.py [--sizes 12,100,1000,5000] [--lookups 200]
+"""
+import argparse
+import json
+import os
+import statistics
+import tempfile
+import time
+
+from common import BASE_DIR
+
+from ir.remote_store import RemoteStore, convert
+
+REMOTE = os.path.join(BASE_DIR, "ir", "tlc_tv.json")
+
+def make_remote(path, size):
+    with open(REMOTE) as f:
+        source = json.load(f)
+    captured = list(source["buttons"].values())
+    buttons = {f"Button{i:05d}": captured[i % len(captured)] for i in range(size)}
+    with open(path, "w") as f:
+        json.dump({"remote_name": f"synthetic-{size}", "buttons": buttons}, f, indent=4)
+    return list(buttons)
+
+def median_ms(samples):
+    return statistics.median(samples) * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument("--sizes", default="12,100,1000,5000")
+    parser.add_argument("--lookups", type=int, default=200)
+    args = parser.parse_args()
+
+    print(f"{'buttons':>8} {'json KB':>8} {'store KB':>9} {'json lookup':>12} {'store open':>11} {'store lookup':>13}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in (int(s) for s in args.sizes.split(",")):
+            json_file = os.path.join(tmp, f"remote{size}.json")
+            names = make_remote(json_file, size)
+            store_file = convert(json_file, os.path.join(tmp, f"remote{size}.irr"))
+            wanted = [names[(i * 7919) % len(names)] for i in range(args.lookups)]
+
+            parse = []
+            for name in wanted[:max(5, args.lookups // 20)]:
+                start = time.perf_counter()
+                with open(json_file) as f:
+                    json.load(f)["buttons"][name]
+                parse.append(time.perf_counter() - start)
+
+            opens = []
+            for _ in range(20):
+                start = time.perf_counter()
+                RemoteStore(store_file).close()
+                opens.append(time.perf_counter() - start)
+
+            store = RemoteStore(store_file)
+            lookups = []
+            for name in wanted:
+                start = time.perf_counter()
+                store[name]
+                lookups.append(time.perf_counter() - start)
+            store.close()
+
+            print(f"{size:>8} {os.path.getsize(json_file) / 1024:>8.0f} {os.path.getsize(store_file) / 1024:>9.0f} "
+                  f"{median_ms(parse):>9.3f} ms {median_ms(opens):>8.3f} ms {median_ms(lookups):>10.4f} ms")
+
+if __name__ == "__main__":
+    main()
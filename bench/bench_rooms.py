@@ -0,0 +1,92 @@
+"""Several rooms driven at once from one pool, against fake Firesticks.
+
+Builds an inventory of N rooms, each with its own fake ADB endpoint
+(127.0.0.2, 127.0.0.3, ...) and HID gadget file, then queues the same
+number of ADB keyevents and HID presses to every room through the job
+queue. The run is compared with sending all of them to a single room,
+which is how the old single global channel behaved. Afterwards the fake
+adb log is checked to make sure every endpoint received exactly its own
+room's commands.
+
+    python3 bench/bench_rooms.py [--rooms 3] [--presses 20] [--adb-latency 0.02]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from collections import Counter
+
+from common import SIM_DIR
+
+TMP = tempfile.mkdtemp()
+os.environ["ADB"] = os.path.join(SIM_DIR, "fake_adb.py")
+os.environ["FAKE_ADB_LOG"] = os.path.join(TMP, "adb.log")
+os.environ["STATE_POLL_INTERVAL"] = "0"
+
+from devices import DevicePool, Room
+from jobs import JobQueue, DONE
+
+def make_rooms(count):
+    rooms = {}
+    for i in range(count):
+        name = f"room{i + 1}"
+        hid = os.path.join(TMP, f"hidg{i}")
+        open(hid, "wb").close()
+        rooms[name] = Room(name, f"127.0.0.{i + 2}", hid, {})
+    return rooms
+
+def run(jobs, targets, presses):
+    """Queue `presses` HOME and UP presses per target room; return elapsed seconds."""
+    start = time.perf_counter()
+    queued = []
+    for _ in range(presses):
+        for room in targets:
+            queued.append(jobs.submit("HOME", room=room))
+            queued.append(jobs.submit("UP", room=room))
+    for job in queued:
+        job.done.wait()
+    elapsed = time.perf_counter() - start
+    failed = [job for job in queued if job.status != DONE]
+    if failed:
+        raise RuntimeError(f"{len(failed)} jobs failed: {failed[0].output}")
+    return elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rooms", type=int, default=3)
+    parser.add_argument("--presses", type=int, default=20)
+    parser.add_argument("--adb-latency", type=float, default=0.02,
+                        help="Seconds each fake Firestick takes per shell command")
+    args = parser.parse_args()
+    os.environ["FAKE_ADB_LATENCY"] = str(args.adb_latency)
+
+    rooms = make_rooms(args.rooms)
+    pool = DevicePool(rooms, state_file=None)
+    pool.warm_up()
+    if not pool.ready():
+        sys.exit(f"Rooms did not warm up: {pool.readiness()}")
+    jobs = JobQueue(pool)
+    try:
+        # Same total work either way: rooms x presses keyevent/HID pairs
+        single = run(jobs, [pool.default] * args.rooms, args.presses)
+        parallel = run(jobs, list(rooms), args.presses)
+    finally:
+        pool.close()
+
+    total = args.rooms * args.presses * 2
+    print(f"{total} commands, {args.adb_latency * 1000:.0f} ms per ADB command")
+    print(f"one room:            {single:6.3f}s  {total / single:7.1f} commands/s")
+    print(f"{args.rooms} rooms in parallel: {parallel:6.3f}s  {total / parallel:7.1f} commands/s  "
+          f"({single / parallel:.1f}x)")
+
+    with open(os.environ["FAKE_ADB_LOG"]) as f:
+        keyevents = Counter(line.split()[0] for line in f if "input keyevent" in line)
+    expected = {f"{room.firestick}:5555": args.presses for room in rooms.values()}
+    expected[f"{rooms[pool.default].firestick}:5555"] += args.rooms * args.presses
+    if dict(keyevents) != expected:
+        sys.exit(f"Keyevents went to the wrong Firesticks: {dict(keyevents)}, expected {expected}")
+    print("Every fake Firestick received exactly its own room's keyevents")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""Automation timing and cost, against stand-in devices.
+
+Loads --automations state-triggered automations, each waiting a different
+"after" delay of up to two seconds, fires them all with one Firestick state
+change and reports how late the single timer thread runs them. Then
+compares running an automation in the service with what an external cron
+job pays: a `send_keystrokes.py` process per run, with ADB at
+--adb-latency per round trip.
+
+    python3 bench/bench_scheduler.py [--automations 200] [--runs 10]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from common import BASE_DIR, report
+
+from hid_sink import HidSink
+from serve import simulate
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--automations", type=int, default=200)
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--adb-latency", type=float, default=0.02)
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    sink = HidSink()
+    simulate(tmp, sink.path, args.adb_latency)
+    os.environ["STATE_POLL_INTERVAL"] = "0"
+    path = os.environ["AUTOMATIONS_FILE"] = os.path.join(tmp, "automations.json")
+    delays = {f"a{i}": 2.0 * (i + 1) / args.automations for i in range(args.automations)}
+    config = {name: {"when": {"device": "firestick", "field": "power", "to": False},
+                     "after": after, "steps": "HOME"} for name, after in delays.items()}
+    config["home"] = {"cron": "@yearly", "steps": "HOME"}
+    with open(path, "w") as f:
+        json.dump(config, f)
+    os.chdir(tmp)
+
+    import app
+    scheduler = app.scheduler
+    state = app.pool.get().state
+    app.pool.warm_up()
+
+    # Stamp each automation as the timer thread hands it over
+    fired = {}
+    run = scheduler.run
+    def stamped(name, room=None):
+        fired[name] = time.time()
+        return run(name, room)
+    scheduler.run = stamped
+
+    state.set('firestick', power=True)
+    start = time.time()
+    state.set('firestick', power=False)
+    time.sleep(2.5)
+    late = [fired[name] - start - after for name, after in delays.items() if name in fired]
+    print(f"{len(late)} of {args.automations} automations fired by the timer thread")
+    report("lateness", late, 22, stats=("median", "max"))
+
+    # Let the fired runs drain from the macro queue
+    scheduler.run = run
+    for automation in scheduler.automations.values():
+        job = app.jobs.get(automation.last_job)
+        if job is not None:
+            job.done.wait()
+    service = []
+    for _ in range(args.runs):
+        begin = time.perf_counter()
+        scheduler.run("home").done.wait()
+        service.append(time.perf_counter() - begin)
+
+    cron = []
+    for _ in range(args.runs):
+        begin = time.perf_counter()
+        subprocess.run([sys.executable, os.path.join(BASE_DIR, "send_keystrokes.py"), "HOME"],
+                       capture_output=True, text=True)
+        cron.append(time.perf_counter() - begin)
+    print(f"HOME, {args.runs} runs")
+    report("automation in service", service, 22, stats=("median", "max"))
+    report("cron + send_keystrokes", cron, 22, stats=("median", "max"))
+    app.pool.close()
+    sink.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""Cold-start time of the web app against stand-in devices.
+
+Starts `python3 app.py` as a fresh process (as systemd does after
+RPIREBOOT) with a plain file as the HID gadget, sim/fake_adb.py as adb and
+the fake pigpio module, and measures from process start until:
+
+- the server answers at all (first response from /ready),
+- the first command succeeds (POST /execute HOME, sent as soon as it answers),
+- /ready reports every channel warm.
+
+Also times a one-shot HID-only CLI command, which no longer waits for
+`adb connect`.
+
+    python3 bench/bench_startup.py [--runs 5] [--adb-latency 0.2]
+"""
+import argparse
+import http.client
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+from common import BASE_DIR, SIM_DIR, report
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def make_env(tmp, adb_latency):
+    env = dict(os.environ)
+    env.update({
+        "HID_DEVICE": os.path.join(tmp, "hidg0"),
+        "ADB": os.path.join(SIM_DIR, "fake_adb.py"),
+        "FAKE_ADB_LATENCY": str(adb_latency),
+        "IR_SOCKET": os.path.join(tmp, "ir.sock"),
+        "PYTHONPATH": os.pathsep.join([os.path.join(SIM_DIR, "stubs"), BASE_DIR]),
+        "LOG_FILE": os.path.join(tmp, "app.log"),
+        "DEVICES_FILE": os.path.join(tmp, "devices.json"),  # none: the single default room
+    })
+    open(env["HID_DEVICE"], "wb").close()
+    return env
+
+def request(port, method, path, body=None):
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+    try:
+        headers = {"Content-Type": "application/json"} if body is not None else {}
+        conn.request(method, path, body=json.dumps(body) if body is not None else None, headers=headers)
+        response = conn.getresponse()
+        return response.status, json.loads(response.read() or b"null")
+    finally:
+        conn.close()
+
+def cold_start(adb_latency):
+    """Return (seconds to first response, first command, all channels ready)."""
+    tmp = tempfile.mkdtemp()
+    env = make_env(tmp, adb_latency)
+    port = free_port()
+    env["PORT"] = str(port)
+    start = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, os.path.join(BASE_DIR, "app.py")], cwd=tmp, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while True:
+            try:
+                request(port, "GET", "/ready")
+                break
+            except OSError:
+                if proc.poll() is not None:
+                    raise RuntimeError("app.py exited during startup")
+                time.sleep(0.005)
+        answering = time.perf_counter() - start
+
+        status, reply = request(port, "POST", "/execute", {"command": "HOME", "wait": True})
+        if status != 200:
+            raise RuntimeError(f"First command failed: {reply}")
+        first_command = time.perf_counter() - start
+
+        while True:
+            status, reply = request(port, "GET", "/ready")
+            if status == 200:
+                break
+            channels = [channel for room in reply["rooms"].values() for channel in room["channels"].values()]
+            if any(channel["status"] == "failed" for channel in channels):
+                raise RuntimeError(f"Warm-up failed: {reply['rooms']}")
+            time.sleep(0.005)
+        ready = time.perf_counter() - start
+        return answering, first_command, ready
+    finally:
+        proc.terminate()
+        proc.wait()
+
+def cli_command(adb_latency, command="UP"):
+    tmp = tempfile.mkdtemp()
+    env = make_env(tmp, adb_latency)
+    start = time.perf_counter()
+    subprocess.run([sys.executable, os.path.join(BASE_DIR, "send_keystrokes.py"), command], cwd=tmp, env=env,
+                   capture_output=True, check=True)
+    return time.perf_counter() - start
+
+# Columns for report(): cold starts vary, so the spread matters more than the mean
+STATS = {'width': 28, 'places': 1, 'stats': ("median", "min", "max")}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--adb-latency", type=float, default=0.2,
+                        help="Seconds the fake adb sleeps per command (network hop)")
+    args = parser.parse_args()
+
+    results = [cold_start(args.adb_latency) for _ in range(args.runs)]
+    report("server answering", [r[0] for r in results], **STATS)
+    report("first command (HOME)", [r[1] for r in results], **STATS)
+    report("all channels ready", [r[2] for r in results], **STATS)
+    report("CLI HID-only command (UP)", [cli_command(args.adb_latency) for _ in range(args.runs)], **STATS)
+
+if __name__ == "__main__":
+    main()
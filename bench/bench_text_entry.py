@@ -0,0 +1,102 @@
+"""Characters/sec of each text entry strategy, against stand-in devices.
+
+HID writes go to a pty standing in for /dev/hidg0. ADB goes through a
+persistent sim/fake_adb.py shell that sleeps --adb-latency per command
+(the network hop) and --input-latency per `input` call (the tool starting
+on the Firestick). Each string is typed with HID only, ADB only, and the
+automatic choice. Text typed over ADB is read back from the fake device
+to check the escaping. A last run takes the Firestick offline to show the
+fallback to HID.
+
+    python3 bench/bench_text_entry.py [--adb-latency 0.01] [--input-latency 0.3]
+"""
+import argparse
+import os
+import pty
+import sys
+import tempfile
+import threading
+import time
+import tty
+
+from common import SIM_DIR
+
+from adb import AdbShell
+from hid import HidWriter
+from text_entry import TextEntry
+
+FAKE_ADB = os.path.join(SIM_DIR, "fake_adb.py")
+
+TEXTS = [
+    "Dune",
+    "The Office Season 3",
+    "50% off: \"Mr. Robot\" & 'Succession' (2018) $5 <HD> #1 | ~/a;b%s\\n",
+    "Lorem ipsum dolor sit amet, consectetur adipiscing elit, sed do eiusmod tempor incididunt ut labore "
+    "et dolore magna aliqua. Ut enim ad minim veniam, quis nostrud exercitation ullamco laboris nisi ut "
+    "aliquip ex ea commodo consequat.\nDuis aute irure dolor in reprehenderit.",
+]
+
+def drain(fd):
+    while True:
+        try:
+            if not os.read(fd, 4096):
+                return
+        except OSError:
+            return
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--adb-latency", type=float, default=0.01)
+    parser.add_argument("--input-latency", type=float, default=0.3)
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    typed_path = os.path.join(tmp, "typed")
+    os.environ.update({
+        "FAKE_ADB_LATENCY": str(args.adb_latency),
+        "FAKE_ADB_INPUT_LATENCY": str(args.input_latency),
+        "FAKE_ADB_TYPED": typed_path,
+    })
+
+    master, slave = pty.openpty()
+    tty.setraw(slave)
+    threading.Thread(target=drain, args=(master,), daemon=True).start()
+    hid = HidWriter(os.ttyname(slave), log=lambda message: None)
+    adb_shell = AdbShell("127.0.0.1", adb=FAKE_ADB)
+    adb_shell.run("true")  # the web app keeps this session open
+
+    print(f"{args.adb_latency * 1000:g} ms per ADB round trip, {args.input_latency * 1000:g} ms per `input` call")
+    print(f"{'length':>6}  {'hid':>9}  {'adb':>9}  {'auto':>9}  chars/sec")
+    for text in TEXTS:
+        rates = []
+        for mode in ('hid', 'adb', 'auto'):
+            entry = TextEntry(hid, adb_shell, log=print, mode=mode)
+            chosen = entry.choose(text)
+            open(typed_path, "w").close()
+            start = time.perf_counter()
+            if not entry.type(text):
+                sys.exit(f"{mode} failed to type {text!r}")
+            elapsed = time.perf_counter() - start
+            if chosen == 'adb':
+                with open(typed_path) as f:
+                    typed = f.read()
+                if typed != text:
+                    sys.exit(f"ADB typed {typed!r} instead of {text!r}")
+            label = f"{len(text) / elapsed:7.1f}" + (f" {chosen[0]}" if mode == 'auto' else "  ")
+            rates.append(label)
+        print(f"{len(text):>6}  {rates[0]:>9}  {rates[1]:>9}  {rates[2]:>9}")
+    print("(auto: h = typed over HID, a = over ADB)")
+
+    # Firestick unreachable: the ADB attempt fails and HID takes over
+    offline = AdbShell("127.0.0.1", adb=FAKE_ADB)
+    os.environ["FAKE_ADB_OFFLINE"] = "127.0.0.1"
+    entry = TextEntry(hid, offline, log=lambda message: None)
+    entry.adb_seconds = 0  # Make the automatic choice go to ADB first; forcing it would rule out the fallback
+    start = time.perf_counter()
+    ok = entry.type(TEXTS[3])
+    print(f"ADB offline, fell back to HID: {'ok' if ok else 'FAILED'} in {time.perf_counter() - start:.2f}s")
+    adb_shell.close()
+    hid.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""Typing throughput (chars/sec) over a pty standing in for /dev/hidg0.
+
+"legacy" reproduces the old send_key() loop (two writes with a fixed 20 ms
+sleep after each, plus print I/O); the others use hid.HidWriter at various
+report intervals.
+
+    python3 bench/bench_typing.py [--text "..."]
+"""
+import argparse
+import os
+import pty
+import threading
+import time
+import tty
+
+import common  # Puts the repository on sys.path
+
+import hid
+
+TEXT = "The Office Season 3 Episode 12!"
+
+def drain(fd, counter):
+    while True:
+        try:
+            data = os.read(fd, 4096)
+        except OSError:
+            return
+        if not data:
+            return
+        counter[0] += len(data)
+
+def legacy_type(fd, text):
+    devnull = open(os.devnull, 'w')
+    for modifier, keycode in filter(None, map(hid.char_to_key, text)):
+        report = hid.report(keycode, modifier)
+        print(f"Sending report: {report.hex()}", file=devnull)
+        os.write(fd, report)
+        time.sleep(0.02)
+        os.write(fd, hid.NULL_REPORT)
+        time.sleep(0.02)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument("--text", default=TEXT)
+    args = parser.parse_args()
+
+    master, slave = pty.openpty()
+    tty.setraw(slave)
+    received = [0]
+    threading.Thread(target=drain, args=(master, received), daemon=True).start()
+    slave_path = os.ttyname(slave)
+
+    print(f"Typing {len(args.text)} characters")
+    start = time.perf_counter()
+    legacy_type(slave, args.text)
+    elapsed = time.perf_counter() - start
+    print(f"  {'legacy':<16} {len(args.text) / elapsed:8.1f} chars/sec")
+
+    for interval in (0.02, 0.008, 0.004, 0.001):
+        writer = hid.HidWriter(slave_path, interval=interval, log=lambda message: None)
+        start = time.perf_counter()
+        writer.type_string(args.text)
+        elapsed = time.perf_counter() - start
+        writer.close()
+        print(f"  {f'writer {interval * 1000:g} ms':<16} {len(args.text) / elapsed:8.1f} chars/sec")
+
+    start = time.perf_counter()
+    for _ in range(1000):
+        hid.build_reports(args.text)
+    print(f"  report build: {(time.perf_counter() - start):.3f} ms per string")
+    time.sleep(0.1)
+    print(f"  {received[0]} bytes reached the pty")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,33 @@
+"""Shared setup for the bench scripts.
+
+Importing it puts the repository root and sim/ on sys.path, so a script
+run as `python3 bench/<script>.py` can import the app's modules and the
+stand-in devices.
+"""
+import os
+import statistics
+import sys
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SIM_DIR = os.path.join(BASE_DIR, "sim")
+for path in (SIM_DIR, BASE_DIR):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[max(0, int(len(ordered) * fraction) - 1)]
+
+STATS = {
+    'median': statistics.median,
+    'mean': statistics.mean,
+    'min': min,
+    'max': max,
+    'p95': lambda values: percentile(values, 0.95),
+}
+
+def report(label, samples, width=12, places=2, stats=('median', 'mean'), extra=''):
+    """Print `stats` of `samples` (seconds) in milliseconds, then `extra`."""
+    ms = [s * 1000 for s in samples]
+    figures = "   ".join(f"{name} {STATS[name](ms):8.{places}f} ms" for name in stats)
+    print(f"  {label:<{width}} {figures}{extra}")
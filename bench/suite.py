@@ -0,0 +1,223 @@
+"""Benchmark suite that runs on any Linux box, with regression checks.
+
+Everything runs against the simulated devices in sim/:
+- a HidSink pty decodes the HID reports;
+- sim/fake_adb.py runs the persistent shell, with optional latency;
+- sim/fake_pigpio.py validates every waveform.
+
+Timings are the best of --runs, which is the most repeatable figure on a
+busy machine. Each benchmark also checks that its result is correct: the decoded
+keystrokes, the report pacing, and the IR mark/space timings against the
+capture.
+
+    dispatch   engine.run_command() for an HID key and an ADB keyevent
+    typing     HidWriter chars/sec, decoded and paced correctly
+    ir_build   building a button's chain of waves, and a resident send
+    execute    POST /execute round trip through waitress
+
+    python3 bench/suite.py [--only typing,ir_build] [--save results.json]
+                           [--compare results.json] [--tolerance 0.5]
+
+--compare exits with status 1 when a result is more than --tolerance worse
+than the saved one (slower, or lower throughput), or when a correctness
+check fails.
+"""
+import argparse
+import http.client
+import json
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+from common import BASE_DIR
+
+from hid_sink import HidSink
+from serve import simulate
+
+TMP = tempfile.mkdtemp()
+SINK = HidSink()
+simulate(TMP, SINK.path)
+os.chdir(TMP)
+
+import fake_pigpio
+import hid
+from engine import CommandEngine
+from ir.emitter import Emitter
+from ir.remote_store import open_remote
+from ir.service import REMOTES
+
+TEXT = "The Office Season 3 Episode 12! (US) ~ 50% off"
+
+# name -> (unit, True if higher is better)
+UNITS = {}
+
+def best_us(samples):
+    return min(samples) * 1e6
+
+def timed(func, runs):
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+def record(results, name, value, unit, higher_is_better=False):
+    results[name] = value
+    UNITS[name] = (unit, higher_is_better)
+
+
+def bench_dispatch(results, failures, runs):
+    engine = CommandEngine(hid_device=SINK.path)
+    engine.warm_up()
+    SINK.clear()
+    for command in ("UP", "HOME"):
+        samples = timed(lambda: engine.run_command(command), runs)
+        record(results, f"dispatch.{command}", best_us(samples), "us")
+    engine.close()
+    if not SINK.wait_for_reports(2 * runs) or SINK.text() != "<UP>" * runs:
+        failures.append(f"dispatch: expected {runs} UP presses, decoded {SINK.text()[:40]!r}...")
+
+def bench_typing(results, failures, runs):
+    writer = hid.HidWriter(SINK.path, log=lambda message: None)
+    rates = []
+    for _ in range(runs):
+        SINK.clear()
+        start = time.perf_counter()
+        writer.type_string(TEXT)
+        rates.append(len(TEXT) / (time.perf_counter() - start))
+        SINK.wait_for_reports(len(hid.build_reports(TEXT)) // 8)
+        if SINK.text() != TEXT:
+            failures.append(f"typing: decoded {SINK.text()!r} instead of {TEXT!r}")
+            break
+    median_gap, _ = SINK.pacing()
+    gaps = SINK.intervals()
+    writer.close()
+    record(results, "typing.chars_per_sec", statistics.median(rates), "chars/s", higher_is_better=True)
+    record(results, "typing.report_gap", median_gap, "ms")
+    # Reports read from the pty in one go share a timestamp, so allow a few
+    # early ones; many of them mean the pacing broke
+    interval_ms = hid.REPORT_INTERVAL * 1000
+    early = sum(gap * 1000 < interval_ms / 2 for gap in gaps) / max(len(gaps), 1)
+    if median_gap < interval_ms * 0.9 or early > 0.05:
+        failures.append(f"typing: reports {median_gap:.2f} ms apart ({early:.0%} early), "
+                        f"interval is {interval_ms:g} ms")
+
+def bench_ir_build(results, failures, runs):
+    pin, json_file = REMOTES['tv']
+    buttons = list(open_remote(json_file))
+    pi = fake_pigpio.pi()
+    emitter = Emitter(pi=pi)
+    emitter.connect()
+
+    def build():
+        for button in buttons:
+            emitter.segment((json_file, pin, button), emitter.frame(json_file, button, pin), pin)
+        while emitter.evict():
+            pass
+
+    samples = timed(build, runs)
+    record(results, "ir_build.chain", best_us(samples) / len(buttons), "us")
+    samples = timed(lambda: emitter.send(json_file, buttons[0], pin), runs)
+    record(results, "ir_build.resident_send", best_us(samples), "us")
+
+    # The transmitted wave has to reproduce the capture
+    worst = 0.0
+    for button in buttons:
+        emitter.send(json_file, button, pin)
+        sent = pi.chain_timings(pi.chains[-1], pin)
+        captured = list(open_remote(json_file)[button])
+        if len(sent) != len(captured):
+            failures.append(f"ir_build: {button} has {len(sent)} marks/spaces, capture has {len(captured)}")
+            continue
+        worst = max([worst] + [abs(a - b) / b for a, b in zip(sent, captured) if b])
+    record(results, "ir_build.worst_timing_error", worst * 100, "%")
+    if worst > 0.05:
+        failures.append(f"ir_build: a mark or space is {worst:.1%} off the capture")
+    carrier = pi.chain_carrier(pi.chains[-1], pin)
+    if abs(carrier - 38.0) > 1.0:
+        failures.append(f"ir_build: carrier is {carrier:.1f} kHz")
+    emitter.close()
+
+def bench_execute(results, failures, runs):
+    from waitress import create_server
+    from app import app, pool
+    server = create_server(app, host="127.0.0.1", port=0, threads=8)
+    port = server.effective_port
+    threading.Thread(target=server.run, daemon=True).start()
+    pool.warm_up()
+
+    def execute(command):
+        conn = http.client.HTTPConnection("127.0.0.1", port)
+        conn.request("POST", "/execute", body=json.dumps({"command": command, "wait": True}),
+                     headers={"Content-Type": "application/json"})
+        response = conn.getresponse()
+        reply = json.loads(response.read())
+        conn.close()
+        if reply["status"] != "success":
+            failures.append(f"execute: {command} failed: {reply}")
+
+    for command in ("UP", "HOME", "TVVOLUP"):
+        samples = timed(lambda: execute(command), runs)
+        record(results, f"execute.{command}", min(samples) * 1000, "ms")
+    server.close()
+
+BENCHMARKS = {
+    'dispatch': bench_dispatch,
+    'typing': bench_typing,
+    'ir_build': bench_ir_build,
+    'execute': bench_execute,
+}
+
+def compare(results, baseline, tolerance):
+    """Names of results more than `tolerance` worse than the baseline."""
+    regressions = []
+    for name, value in results.items():
+        old = baseline.get(name)
+        if not old or name.endswith("timing_error"):
+            continue
+        _, higher_is_better = UNITS[name]
+        change = (old - value) / old if higher_is_better else (value - old) / old
+        if change > tolerance:
+            regressions.append(f"{name}: {old:.3f} -> {value:.3f} ({change:+.0%})")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--only", help="Comma-separated benchmarks to run: " + ", ".join(BENCHMARKS))
+    parser.add_argument("--runs", type=int, default=50)
+    parser.add_argument("--save", metavar="FILE", help="Write the results as JSON")
+    parser.add_argument("--compare", metavar="FILE", help="Fail on regressions against saved results")
+    parser.add_argument("--tolerance", type=float, default=0.5)
+    args = parser.parse_args()
+
+    names = args.only.split(",") if args.only else list(BENCHMARKS)
+    results, failures = {}, []
+    for name in names:
+        BENCHMARKS[name](results, failures, args.runs)
+
+    baseline = {}
+    if args.compare:
+        with open(os.path.join(BASE_DIR, args.compare) if not os.path.isabs(args.compare) else args.compare) as f:
+            baseline = json.load(f)
+    for name, value in results.items():
+        unit, _ = UNITS[name]
+        old = f"  (was {baseline[name]:.3f})" if name in baseline else ""
+        print(f"  {name:<30} {value:12.3f} {unit:<8}{old}")
+
+    if args.save:
+        path = args.save if os.path.isabs(args.save) else os.path.join(BASE_DIR, args.save)
+        with open(path, "w") as f:
+            json.dump(results, f, indent=2)
+
+    problems = failures + compare(results, baseline, args.tolerance)
+    for problem in problems:
+        print(f"FAIL {problem}")
+    SINK.close()
+    sys.exit(1 if problems else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""Inventory of the rooms this Pi controls, and one engine per room.
+
+Each room has a Firestick reached over ADB, optionally the HID gadget
+plugged into it, and the IR remotes of its TV and soundbar under the names
+the command registry uses ('tv', 'soundbar'). devices.json looks like
+devices.example.json:
+
+    {
+        "living room": {"firestick": "10.3.24.155", "hid": "/dev/hidg0",
+                        "ir": {"tv": [17, "ir/tlc_tv.json"], "soundbar": [27, "ir/samsung_soundbar.json"]}},
+        "bedroom": {"firestick": "10.3.24.156", "hid": null, "ir": {"tv": [22, "ir/tlc_tv.json"]}}
+    }
+
+Remote paths are relative to the inventory file. The first room is the
+default for commands that don't name one. Without devices.json the Pi
+controls a single room set up from FIRESTICK_IP and HID_DEVICE, as before.
+"""
+import json
+import os
+from collections import namedtuple
+
+from engine import CommandEngine, FIRESTICK_IP, HID_DEVICE, WARM_CHANNELS
+from state import STATE_FILE
+
+DEVICES_FILE = os.environ.get("DEVICES_FILE", os.path.join(os.path.dirname(os.path.abspath(__file__)), "devices.json"))
+
+DEFAULT_ROOM = 'default'
+
+# remotes: IR device name -> (GPIO pin, remote file), or None for the IR service's own remotes
+Room = namedtuple('Room', 'name firestick hid remotes')
+
+def load_inventory(path=DEVICES_FILE):
+    """Return {room name: Room}, in file order."""
+    if not os.path.exists(path):
+        return {DEFAULT_ROOM: Room(DEFAULT_ROOM, FIRESTICK_IP, HID_DEVICE, None)}
+    with open(path) as f:
+        config = json.load(f)
+    if not config:
+        raise ValueError(f"No rooms in {path}")
+    base = os.path.dirname(os.path.abspath(path))
+    rooms = {}
+    for name, spec in config.items():
+        if 'firestick' not in spec:
+            raise ValueError(f"Room '{name}' in {path} has no firestick address")
+        remotes = {remote: (int(pin), os.path.join(base, json_file))
+                   for remote, (pin, json_file) in spec.get('ir', {}).items()}
+        rooms[name] = Room(name, spec['firestick'], spec.get('hid'), remotes)
+    return rooms
+
+
+class DevicePool:
+    """One CommandEngine per room, created up front and kept for the pool's lifetime.
+
+    Every engine has its own persistent ADB shell, HID gadget, channel locks
+    and state cache, so rooms never wait on each other. IR is the exception:
+    the first room's engine owns the IR service and the others share it.
+    The state caches share `state_file`, keyed by Firestick address.
+    """
+
+    def __init__(self, rooms=None, echo=False, serve_ir=False, state_file=STATE_FILE):
+        self.rooms = load_inventory() if rooms is None else rooms
+        self.default = next(iter(self.rooms))
+        self.engines = {}
+        owner = None
+        for name, room in self.rooms.items():
+            engine = CommandEngine(hid_device=room.hid, firestick_ip=room.firestick, echo=echo,
+                                   serve_ir=serve_ir and owner is None, remotes=room.remotes, ir_owner=owner,
+                                   state_file=state_file)
+            owner = owner or engine
+            self.engines[name] = engine
+
+    def get(self, room=None):
+        """Engine for a room (the default room if None); KeyError for unknown rooms."""
+        return self.engines[room or self.default]
+
+    def items(self):
+        return self.engines.items()
+
+    def warm_up(self, background=False):
+        """Warm every room's channels in parallel (see CommandEngine.warm_up)."""
+        threads = []
+        for name, engine in self.engines.items():
+            room = self.rooms[name]
+            # Nothing to warm for a channel the room doesn't have
+            channels = [channel for channel in WARM_CHANNELS
+                        if not (channel == 'hid' and room.hid is None)
+                        and not (channel == 'ir' and room.remotes == {})]
+            threads.extend(engine.warm_up(channels, background=True))
+        if not background:
+            for thread in threads:
+                thread.join()
+        return threads
+
+    def ready(self):
+        return all(engine.ready() for engine in self.engines.values())
+
+    def readiness(self):
+        return {name: {'ready': engine.ready(), 'channels': engine.readiness} for name, engine in self.engines.items()}
+
+    def close(self):
+        # The IR owner goes last; the others only borrow its service
+        for engine in reversed(list(self.engines.values())):
+            engine.close()
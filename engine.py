@@ -0,0 +1,513 @@
+import errno
+import time
+import logging
+import os
+import subprocess
+import threading
+from collections import deque
+from contextlib import contextmanager
+
+from adb import ADB, AdbShell, AdbError
+from hid import HidWriter, KEYCODES
+import metrics
+import registry
+from state import DeviceState, EFFECTS
+from text_entry import TextEntry
+
+log = logging.getLogger(__name__)
+
+# Replace with your Firestick's IP
+FIRESTICK_IP = os.environ.get("FIRESTICK_IP", "10.3.24.155")  # Change this to your Firestick's IP
+
+# Device paths (overridable so the engine can run against stand-in devices)
+HID_DEVICE = os.environ.get("HID_DEVICE", "/dev/hidg0")
+# Used to start pigpiod and reboot the Pi; sim/fake_sudo.py only records the command
+SUDO = os.environ.get("SUDO", "sudo")
+
+# Hold-to-repeat: repeats per second for ADB keys, and a safety limit in case
+# the release never arrives (phone locked, Wi-Fi dropped)
+REPEAT_RATE = 8.0
+MAX_REPEAT_RATE = 30.0
+REPEAT_INITIAL_DELAY = 0.4
+MAX_HOLD = 15.0
+
+# Channels opened by warm_up(), and how long to wait for a freshly started pigpiod
+WARM_CHANNELS = ('hid', 'adb', 'ir')
+PIGPIOD_RETRIES = 5
+PIGPIOD_RETRY_DELAY = 0.2
+
+def parse_commands(command_string):
+    """Parse command string into a list, preserving quoted strings."""
+    commands = []
+    current = []
+    parts = command_string.split('"')
+    # Odd-numbered parts are inside quotes and are kept exactly as written
+    for i, part in enumerate(parts):
+        if i % 2:
+            current.append(part)
+            if i < len(parts) - 1:
+                commands.append(''.join(current))
+                current = []
+            continue
+        pieces = part.split(',')
+        for piece in pieces[:-1]:
+            current.append(piece)
+            command = ''.join(current).strip()
+            if command:
+                commands.append(command)
+            current = []
+        current.append(pieces[-1])
+    command = ''.join(current).strip()
+    if command:
+        commands.append(command)
+    return commands
+
+
+class CommandEngine:
+    """Long-lived command executor that keeps the HID, ADB and IR channels open.
+
+    The Flask app keeps one engine per room (see devices.py) for its whole
+    lifetime; the CLI creates one per invocation. `remotes` maps IR device
+    names to (GPIO pin, remote file), defaulting to the IR service's own
+    remotes, and engines created with `ir_owner` share that engine's IR
+    service, since pigpio can only transmit one wave at a time.
+    """
+
+    def __init__(self, hid_device=HID_DEVICE, adb=ADB, firestick_ip=FIRESTICK_IP, echo=False, serve_ir=False,
+                 remotes=None, ir_owner=None, state_file=None):
+        self.hid_device = hid_device
+        self.adb = adb
+        self.firestick_ip = firestick_ip
+        self.echo = echo
+        self.hid = HidWriter(hid_device, log=self.log)
+        self.adb_shell = AdbShell(firestick_ip, adb=adb)
+        # The state poll gets its own shell so dumpsys doesn't queue ahead of keyevents
+        self.state = DeviceState(AdbShell(firestick_ip, adb=adb), path=state_file, key=firestick_ip)
+        self.text = TextEntry(self.hid, self.adb_shell, log=self.log)
+        self.pigpiod_started = False
+        self.ir = None
+        self.ir_lock = threading.Lock()
+        self.serve_ir = serve_ir
+        self.remotes = remotes
+        self.ir_owner = ir_owner
+        # Output of the command running on each thread (see capture())
+        self._local = threading.local()
+        # One lock per output channel, so HID, ADB and IR can run side by side
+        self.locks = {channel: threading.Lock() for channel in ('hid', 'adb', 'ir', 'system')}
+        self.hold_lock = threading.Lock()
+        # channel -> {'status': 'warming'|'ready'|'failed', 'seconds': ..., 'error': ...} (see warm_up())
+        self.readiness = {}
+        self.held = None  # (command entry, stop event, safety timer, start time, rate, ref)
+        # Refs whose release arrived before their press (separate requests can race)
+        self.released_early = deque(maxlen=32)
+        # One handler per registry kind, so dispatch is a pair of dict lookups
+        self.handlers = {
+            registry.ADB_KEY: self.send_adb_keyevent,
+            registry.ADB_INTENT: lambda value: self.start_activity(*value),
+            registry.HID_KEY: self.press_key,
+            registry.IR: lambda value: self.send_ir_button(*value),
+            registry.SYSTEM: lambda value: getattr(self, value)(),
+            registry.SLEEP: self.sleep,
+            registry.ENSURE: lambda value: self.ensure(*value),
+        }
+
+    def log(self, message):
+        """Collect a line of output for the command running on this thread."""
+        output = getattr(self._local, 'output', None)
+        if output is not None:
+            output.append(message)
+        if self.echo:
+            print(message)
+
+    def fail(self, message):
+        """Log an error and mark the current command as failed."""
+        self._local.failed = True
+        self.log(message)
+
+    def failed(self):
+        return getattr(self._local, 'failed', False)
+
+    @contextmanager
+    def capture(self):
+        """Collect output and failures for one command on the current thread."""
+        self._local.output = []
+        self._local.failed = False
+        try:
+            yield self._local.output
+        finally:
+            self._local.output = None
+
+    # -- channel setup -------------------------------------------------
+
+    def connect_adb(self):
+        """Connect to Firestick via ADB (only once per engine)."""
+        try:
+            return self.adb_shell.connect()
+        except AdbError as e:
+            self.fail(str(e))
+            return False
+
+    def open_hid(self):
+        """Open the HID gadget, reusing the descriptor if it is already open."""
+        return self.hid.open()
+
+    def close_hid(self):
+        self.hid.close()
+
+    def start_pigpiod(self):
+        """Start pigpiod (once per engine) when it isn't already running."""
+        if not self.pigpiod_started:
+            try:
+                subprocess.run([SUDO, "pigpiod"], capture_output=True, text=True)
+            except OSError as e:
+                self.log(f"Could not start pigpiod: {e}")
+            self.pigpiod_started = True
+
+    def ir_remotes(self):
+        if self.remotes is None:
+            from ir.service import REMOTES
+            self.remotes = REMOTES
+        return self.remotes
+
+    def ir_service(self):
+        """Start the in-process IR service on first use (or use the owner's)."""
+        if self.ir_owner is not None:
+            return self.ir_owner.ir_service()
+        with self.ir_lock:
+            if self.ir is None:
+                from ir.service import IRService
+                ir = IRService(remotes=self.ir_remotes(), observe=metrics.observe)
+                if not ir.preload():
+                    # Fresh boot: pigpiod isn't up yet, so start it and give it a moment
+                    self.start_pigpiod()
+                    for _ in range(PIGPIOD_RETRIES):
+                        time.sleep(PIGPIOD_RETRY_DELAY)
+                        if ir.preload():
+                            break
+                self.ir = ir
+                if self.serve_ir:
+                    # Let emitter.py and cron jobs share our pigpio connection
+                    try:
+                        self.ir.serve(background=True)
+                    except (RuntimeError, OSError) as e:
+                        self.log(f"IR socket not started: {e}")
+            return self.ir
+
+    def warm_up(self, channels=WARM_CHANNELS, background=False):
+        """Open the given channels in parallel so the first command doesn't pay for them.
+
+        Runs once at service start; each channel holds its lock while it
+        warms, so commands that arrive early simply queue behind it. Results
+        are kept in self.readiness.
+        """
+        for channel in channels:
+            self.readiness[channel] = {'status': 'warming', 'seconds': None, 'error': None}
+        threads = [threading.Thread(target=self._warm, args=(channel,), name=f"warm-{channel}", daemon=True)
+                   for channel in channels]
+        for thread in threads:
+            thread.start()
+        if not background:
+            for thread in threads:
+                thread.join()
+        return threads
+
+    def _warm(self, channel):
+        start = time.monotonic()
+        with self.locks[channel], self.capture() as output:
+            try:
+                if channel == 'hid':
+                    self.open_hid()
+                elif channel == 'adb':
+                    # Opens the persistent shell as well as connecting
+                    status, result = self.adb_shell.run("true")
+                    if status != 0:
+                        self.fail(result)
+                elif channel == 'ir':
+                    # Compiles this room's remotes too when the service is shared
+                    if not self.ir_service().preload(self.ir_remotes()):
+                        self.fail("pigpiod not reachable")
+            except (AdbError, OSError, ImportError) as e:
+                self.fail(str(e))
+            failed = self.failed()
+            error = "; ".join(output) if failed else None
+        elapsed = time.monotonic() - start
+        metrics.observe('warm_up', elapsed, channel)
+        self.readiness[channel] = {'status': 'failed' if failed else 'ready', 'seconds': round(elapsed, 3),
+                                   'error': error}
+        if failed:
+            log.warning("%s channel failed to warm up after %.3fs: %s", channel, elapsed, error)
+        else:
+            log.info("%s channel ready in %.3fs", channel, elapsed)
+
+    def ready(self):
+        """True once every warmed channel came up."""
+        return bool(self.readiness) and all(r['status'] == 'ready' for r in self.readiness.values())
+
+    def close(self):
+        self.release()
+        self.state.stop()
+        self.close_hid()
+        self.adb_shell.close()
+        if self.ir is not None:
+            self.ir.close()
+            self.ir = None
+
+    # -- channel primitives ---------------------------------------------
+
+    def send_adb_keyevent(self, keyevent):
+        """Send an ADB keyevent to the Firestick."""
+        try:
+            status, output = self.adb_shell.keyevent(keyevent)
+        except AdbError as e:
+            status, output = 1, str(e)
+        if status == 0:
+            self.log(f"ADB keyevent {keyevent} sent successfully")
+        else:
+            self.fail(f"Error sending ADB keyevent {keyevent}: {output}")
+
+    def start_activity(self, component, action=None):
+        """Launch an app on the Firestick."""
+        try:
+            status, output = self.adb_shell.start_activity(component, action)
+        except AdbError as e:
+            status, output = 1, str(e)
+        if status != 0:
+            self.fail(f"Error starting {component}: {output}")
+
+    def reboot_firestick(self):
+        self.connect_adb()
+        subprocess.run([self.adb, "-s", self.adb_shell.serial, "reboot"], capture_output=True, text=True)
+        self.adb_shell.close()
+        self.adb_shell.connected = False
+
+    def reboot_pi(self):
+        subprocess.run([SUDO, "reboot"], capture_output=True, text=True)
+
+    def sleep(self, seconds):
+        self.log(f"Sleeping for {seconds} seconds")
+        time.sleep(seconds)
+
+    def send_ir_button(self, remote, button):
+        """Transmit a captured IR button through the resident IR service."""
+        try:
+            if remote not in self.ir_remotes():
+                self.fail(f"No IR remote '{remote}' configured")
+                return
+            pin, json_file = self.remotes[remote]
+            if self.ir is None and self.ir_owner is None and not self.serve_ir:
+                # CLI use: hand off to a running service instead of opening pigpio ourselves
+                from ir.emitter import request
+                reply = request({"pin": pin, "file": json_file, "button": button})
+                if reply is not None:
+                    if not reply["ok"]:
+                        self.fail(f"Failed to send IR {remote} {button}: {reply['error']}")
+                    return
+            if not self.ir_service().send_file(json_file, button, pin):
+                self.fail(f"Failed to send IR {remote} {button}")
+        except ImportError as e:
+            self.fail(f"IR unavailable: {e}")
+
+    def ensure(self, device, field, wanted, command):
+        """Send `command` only if the state cache doesn't already show `wanted`.
+
+        A toggle sent from an unknown state is as likely to undo `wanted` as
+        to reach it, so in that case nothing is sent and the command fails.
+        """
+        if device == 'firestick':
+            self.state.poll_firestick()
+        current = self.state.get(device, field)
+        if current == wanted:
+            self.log(f"{device} {field} already {wanted}")
+            return
+        if current is None:
+            if EFFECTS.get(command, (None, None, None))[2] == 'toggle':
+                self.fail(f"{device} {field} unknown, not sending toggle {command}; "
+                          f"tap it in the page's state line or PUT /state/{device}")
+                return
+            self.log(f"{device} {field} unknown, sending {command}")
+        if self.dispatch(command):
+            self.state.set(device, **{field: wanted})
+
+    def send_hid_key(self, keycode, modifier=0x00):
+        """Send a key over HID, retrying only the reports that didn't go out.
+
+        The writer reopens the gadget after a failed write. If the press
+        report went out, only the release is resent, so the key is never
+        pressed twice. A timeout means the host isn't polling, and retrying
+        the press would only wait again.
+        """
+        written = self.hid.reports_written
+        if self.hid.send_key(keycode, modifier):
+            return True
+        if self.hid.reports_written > written:
+            return self.hid.key_up()
+        if self.hid.last_error == errno.ETIMEDOUT:
+            return False
+        return self.hid.send_key(keycode, modifier)
+
+    def press_key(self, keycode):
+        if not self.send_hid_key(keycode):
+            self.fail(f"Failed to send key 0x{keycode:02x}")
+
+    def type_text(self, text, delay=0):
+        # Only \n and \t are escapes; other backslashes are typed as-is (passwords, paths)
+        text = text.replace('\\n', '\n').replace('\\t', '\t')
+        if not self.text.type(text, char_delay=delay):
+            self.fail(f"Failed to type '{text}'")
+
+    # -- execution ------------------------------------------------------
+
+    def execute(self, command_string, delay=0.0):
+        """Run a comma-separated command string synchronously.
+
+        Returns a (success, output) tuple where output holds the lines that
+        the old subprocess-based path printed to stdout.
+        """
+        with self.capture() as output:
+            commands = parse_commands(command_string)
+            self.log(f"Processing commands: {commands}")
+
+            # Only set up the channels these commands use, so an HID-only
+            # command doesn't wait for `adb connect`
+            channels = {registry.channel_for(command) for command in commands}
+            if 'adb' in channels and not self.connect_adb():
+                return False, "\n".join(output)
+
+            if 'hid' in channels:
+                try:
+                    self.open_hid()
+                except Exception as e:
+                    self.fail(f"Error opening {self.hid_device}: {e}")
+                    return False, "\n".join(output)
+
+            for command in commands:
+                if not self.run_step(command, delay):
+                    break
+                time.sleep(delay)  # Apply global delay between commands
+            return not self.failed(), "\n".join(output)
+
+    def run_step(self, command, delay=0.0):
+        """Run one parsed command under its channel's lock.
+
+        Returns False if it raised; softer failures are recorded by fail().
+        """
+        channel = registry.channel_for(command)
+        try:
+            if channel is None:
+                self.dispatch(command, delay)
+            else:
+                with self.locks[channel], metrics.timed('dispatch', channel):
+                    self.dispatch(command, delay)
+            return True
+        except Exception as e:
+            self.fail(f"Error executing '{command}': {e}")
+            if channel == 'hid':
+                self.close_hid()
+            return False
+
+    def run_command(self, command, delay=0.0):
+        """Run one parsed command with its own capture; returns (success, output lines)."""
+        with self.capture() as output:
+            self.run_step(command, delay)
+            return not self.failed(), list(output)
+
+    def dispatch(self, command, delay=0.0):
+        """Execute a single parsed command; returns True unless it failed."""
+        entry, value = registry.lookup(command)
+        if entry is not None:
+            # Track this command's own failure separately from earlier ones in the capture
+            failed_before = self.failed()
+            self._local.failed = False
+            self.handlers[entry.kind](value)
+            ok = not self._local.failed
+            self._local.failed = failed_before or not ok
+            if ok:
+                self.state.apply(entry.name)
+            return ok
+        elif command.upper() in KEYCODES:
+            self.log(f"Processing special key: '{command.upper()}'")
+            self.press_key(KEYCODES[command.upper()])
+        else:
+            self.log(f"Typing string: '{command}'")
+            self.type_text(command, delay=delay)
+        return not self.failed()
+
+    # -- hold to repeat ---------------------------------------------------
+
+    def press(self, command, rate=REPEAT_RATE, ref=None):
+        """Start holding a command until release().
+
+        HID keys stay down so the Firestick auto-repeats them, IR buttons are
+        repeated by one pigpio wave chain, and ADB keyevents are resent at
+        `rate` per second. Commands that can't repeat just run once, as does
+        a hold whose release(ref=...) already arrived.
+        """
+        entry, value = registry.lookup(command)
+        if entry is None or not entry.repeat:
+            return self.execute(command)
+
+        self.release()
+        with self.hold_lock, self.capture() as output:
+            if ref is not None and ref in self.released_early:
+                self.released_early.remove(ref)
+                self.log(f"{entry.name} released before it was held, sending once")
+                return self.execute(command)
+            stop = threading.Event()
+            if entry.kind == registry.HID_KEY:
+                with self.locks['hid']:
+                    if not self.hid.key_down(value):
+                        return False, "\n".join(output)
+            elif entry.kind == registry.IR:
+                remote, button = value
+                pin, json_file = self.ir_remotes().get(remote, (None, None))
+                with self.locks['ir']:
+                    if json_file is None or not self.ir_service().hold_file(json_file, button, pin,
+                                                                            period_us=int(1000000 / rate),
+                                                                            owner=self):
+                        self.fail(f"Failed to hold IR {remote} {button}")
+                        return False, "\n".join(output)
+            else:
+                threading.Thread(target=self._repeat, args=(entry, value, rate, stop), daemon=True).start()
+
+            timer = threading.Timer(MAX_HOLD, self.release, kwargs={'stop': stop})
+            timer.daemon = True
+            timer.start()
+            self.held = (entry, stop, timer, time.monotonic(), rate, ref)
+            self.log(f"Holding {entry.name}")
+            return True, "\n".join(output)
+
+    def _repeat(self, entry, value, rate, stop):
+        handler = self.handlers[entry.kind]
+        handler(value)
+        if stop.wait(REPEAT_INITIAL_DELAY):
+            return
+        while True:
+            handler(value)
+            if stop.wait(1.0 / rate):
+                return
+
+    def release(self, stop=None, ref=None):
+        """Stop the command started by press(), if any.
+
+        With `stop` or `ref` only the hold they belong to is stopped; a ref
+        that isn't held yet is remembered, so its press sends a single tap
+        instead of holding until MAX_HOLD.
+        """
+        with self.hold_lock:
+            held = self.held
+            if held is None or (stop is not None and held[1] is not stop) or (ref is not None and held[5] != ref):
+                if ref is not None:
+                    self.released_early.append(ref)
+                return
+            entry, stop, timer, started, rate, _ = self.held
+            self.held = None
+            timer.cancel()
+            stop.set()
+            if entry.kind == registry.HID_KEY:
+                with self.locks['hid']:
+                    self.hid.key_up()
+            elif entry.kind == registry.IR:
+                with self.locks['ir']:
+                    self.ir_service().release(owner=self)
+                # One step for the first frame, then one per repeat period
+                self.state.apply(entry.name, repeats=1 + int((time.monotonic() - started) * rate))
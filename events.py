@@ -0,0 +1,75 @@
+"""Server-sent events for the web remote.
+
+Each connected browser gets its own queue; publish() fans an event out to
+all of them. The /events endpoint streams these queues, so command results
+and device status are pushed instead of polled.
+
+Every open stream holds one server thread, so the number of streams is
+capped at MAX_CLIENTS (the rest of the server's threads stay free for
+button presses), and a stream that has carried no event for IDLE_TIMEOUT
+seconds ends; a page that is still open reconnects on its own.
+"""
+import json
+import os
+import queue
+import threading
+import time
+
+# Events a slow client may fall behind by before it is dropped
+CLIENT_BACKLOG = 100
+
+# Seconds between keep-alive comments, so proxies and phones keep the stream open
+KEEPALIVE = 15
+
+MAX_CLIENTS = int(os.environ.get("EVENT_CLIENTS", "8"))
+IDLE_TIMEOUT = float(os.environ.get("EVENT_IDLE_TIMEOUT", "300"))
+
+
+class EventBroker:
+    def __init__(self, max_clients=MAX_CLIENTS, idle_timeout=IDLE_TIMEOUT):
+        self.clients = set()
+        self.lock = threading.Lock()
+        self.max_clients = max_clients
+        self.idle_timeout = idle_timeout
+
+    def subscribe(self):
+        """A queue for a new stream, or None if MAX_CLIENTS streams are already open."""
+        client = queue.Queue(maxsize=CLIENT_BACKLOG)
+        with self.lock:
+            if len(self.clients) >= self.max_clients:
+                return None
+            self.clients.add(client)
+        return client
+
+    def unsubscribe(self, client):
+        with self.lock:
+            self.clients.discard(client)
+
+    def publish(self, event, data):
+        message = f"event: {event}\ndata: {json.dumps(data)}\n\n"
+        with self.lock:
+            clients = list(self.clients)
+        for client in clients:
+            try:
+                client.put_nowait(message)
+            except queue.Full:
+                self.unsubscribe(client)
+
+    def stream(self, client, hello=None):
+        """Generator for a streaming response; ends when the client disconnects or goes idle."""
+        try:
+            if hello is not None:
+                yield f"event: status\ndata: {json.dumps(hello)}\n\n"
+            last_event = time.monotonic()
+            while True:
+                try:
+                    yield client.get(timeout=KEEPALIVE)
+                    last_event = time.monotonic()
+                except queue.Empty:
+                    if client not in self.clients:
+                        return  # dropped for falling behind; the browser reconnects
+                    if time.monotonic() - last_event > self.idle_timeout:
+                        return  # frees the thread; an open page reconnects
+                    yield ": keep-alive\n\n"
+        finally:
+            self.unsubscribe(client)
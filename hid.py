@@ -0,0 +1,228 @@
+import errno
+import logging
+import os
+import time
+
+import metrics
+
+log = logging.getLogger(__name__)
+
+# HID keycode map (USB HID usage IDs for US keyboard layout)
+KEYCODES = {
+    'A': 0x04, 'B': 0x05, 'C': 0x06, 'D': 0x07, 'E': 0x08, 'F': 0x09, 'G': 0x0A,
+    'H': 0x0B, 'I': 0x0C, 'J': 0x0D, 'K': 0x0E, 'L': 0x0F, 'M': 0x10, 'N': 0x11,
+    'O': 0x12, 'P': 0x13, 'Q': 0x14, 'R': 0x15, 'S': 0x16, 'T': 0x17, 'U': 0x18,
+    'V': 0x19, 'W': 0x1A, 'X': 0x1B, 'Y': 0x1C, 'Z': 0x1D,
+    '1': 0x1E, '2': 0x1F, '3': 0x20, '4': 0x21, '5': 0x22, '6': 0x23, '7': 0x24,
+    '8': 0x25, '9': 0x26, '0': 0x27,
+    ' ': 0x2C,  # Space
+    '\n': 0x28,  # Enter
+    '.': 0x37,  # Period
+    ',': 0x36,  # Comma
+    'UP': 0x52,  # Up arrow
+    'DOWN': 0x51,  # Down arrow
+    'LEFT': 0x50,  # Left arrow
+    'RIGHT': 0x4F,  # Right arrow
+    'ENTER': 0x28,  # Enter key
+    'ESC': 0x29,  # Escape key
+}
+
+# Modifiers
+MOD_LEFT_SHIFT = 0x02
+
+# HID report format: 8 bytes (modifier, reserved, key1-6)
+NULL_REPORT = b'\x00\x00\x00\x00\x00\x00\x00\x00'
+
+def report(keycode, modifier=0x00):
+    return bytes([modifier, 0x00, keycode, 0x00, 0x00, 0x00, 0x00, 0x00])
+
+def _layout(unshifted, shifted):
+    """Build a char -> (modifier, keycode) table from two {keycode: chars} rows."""
+    table = {}
+    for keycode, chars in unshifted.items():
+        for char in chars:
+            table[char] = (0x00, keycode)
+    for keycode, chars in shifted.items():
+        for char in chars:
+            table[char] = (MOD_LEFT_SHIFT, keycode)
+    return table
+
+_LETTERS = {0x04 + i: c for i, c in enumerate('abcdefghijklmnopqrstuvwxyz')}
+_DIGITS = {0x1E + i: c for i, c in enumerate('1234567890')}
+
+# Every printable ASCII character plus Enter and Tab
+US_LAYOUT = _layout(
+    {**_LETTERS, **_DIGITS, 0x28: '\n', 0x2B: '\t', 0x2C: ' ', 0x2D: '-', 0x2E: '=', 0x2F: '[', 0x30: ']',
+     0x31: '\\', 0x33: ';', 0x34: "'", 0x35: '`', 0x36: ',', 0x37: '.', 0x38: '/'},
+    {**{k: c.upper() for k, c in _LETTERS.items()},
+     **{0x1E + i: c for i, c in enumerate('!@#$%^&*()')},
+     0x2D: '_', 0x2E: '+', 0x2F: '{', 0x30: '}', 0x31: '|', 0x33: ':', 0x34: '"', 0x35: '~',
+     0x36: '<', 0x37: '>', 0x38: '?'})
+
+# UK layout: same keys as US except around the Enter key and a few shifted digits
+UK_LAYOUT = dict(US_LAYOUT)
+UK_LAYOUT.update(_layout(
+    {0x32: '#', 0x64: '\\'},
+    {0x1F: '"', 0x20: '\u00a3', 0x34: '@', 0x32: '~', 0x64: '|'}))
+
+
+class Layout:
+    """A keyboard layout with its report bytes precomputed per character."""
+
+    def __init__(self, name, keys):
+        self.name = name
+        self.keys = keys
+        self.press = {char: report(keycode, modifier) for char, (modifier, keycode) in keys.items()}
+        # Release that lifts the key but keeps the modifier down for the next character
+        self.held = {char: bytes([modifier]) + NULL_REPORT[1:] for char, (modifier, _) in keys.items()}
+        self.modifier = {char: modifier for char, (modifier, _) in keys.items()}
+
+    def translate(self, text, log=None):
+        """Turn a whole string into one buffer of press/release reports.
+
+        Consecutive characters that need the same modifier keep it held: the
+        release between them only lifts the key, so shifted runs like "ABC"
+        don't toggle Shift for every character.
+        """
+        keys = self.keys
+        chars = [char for char in text if char in keys]
+        if log and len(chars) != len(text):
+            for char in sorted(set(text) - set(keys)):
+                log(f"Warning: No keycode for '{char}'")
+        press, held, modifier = self.press, self.held, self.modifier
+        out = []
+        for char, next_char in zip(chars, chars[1:] + [None]):
+            out.append(press[char])
+            if next_char is not None and modifier[next_char] == modifier[char]:
+                out.append(held[char])
+            else:
+                out.append(NULL_REPORT)
+        return b''.join(out)
+
+LAYOUTS = {}
+
+def register_layout(name, keys):
+    """Add a layout; `keys` maps characters to (modifier, keycode)."""
+    LAYOUTS[name] = Layout(name, keys)
+    return LAYOUTS[name]
+
+register_layout('us', US_LAYOUT)
+register_layout('uk', UK_LAYOUT)
+
+# Layout the Firestick's keyboard is set to
+LAYOUT = os.environ.get("HID_LAYOUT", "us")
+
+# Time between reports. The gadget accepts one report per host poll, so a
+# write that arrives early just waits (EAGAIN) for the previous one to drain.
+REPORT_INTERVAL = float(os.environ.get("HID_REPORT_INTERVAL", "0.008"))
+WRITE_TIMEOUT = 1.0
+
+def char_to_key(char, layout=LAYOUT):
+    """Return (modifier, keycode) for a character, or None if it can't be typed."""
+    return LAYOUTS[layout].keys.get(char)
+
+def build_reports(text, layout=LAYOUT, log=None):
+    """Precompute the report buffer for a whole string (8 bytes per report)."""
+    return LAYOUTS[layout].translate(text, log=log)
+
+
+class HidWriter:
+    """Owns the HID gadget and writes report sequences with steady pacing.
+
+    Reports are spaced on the monotonic clock against absolute deadlines, so
+    time spent building or writing one report doesn't push the rest later.
+    The deadline carries over between calls, so a sequence returns as soon
+    as its last report is written and the next call waits out the gap.
+    Each report is logged at DEBUG, which is skipped entirely unless enabled.
+    """
+
+    def __init__(self, path, interval=REPORT_INTERVAL, log=print, layout=LAYOUT):
+        self.path = path
+        self.layout = LAYOUTS[layout]
+        self.interval = interval
+        self.log = log
+        self.fd = None
+        self.next_time = 0.0  # Earliest time the next report may be written
+        self.reports_written = 0  # Running total, so callers can tell if a failed write sent anything
+        self.last_error = None  # errno of the last failed write
+
+    def open(self):
+        if self.path is None:
+            raise OSError(errno.ENODEV, "No HID gadget configured")
+        if self.fd is None:
+            self.fd = os.open(self.path, os.O_RDWR | os.O_NONBLOCK)
+        return self.fd
+
+    def close(self):
+        if self.fd is not None:
+            try:
+                os.close(self.fd)
+            except OSError:
+                pass
+            self.fd = None
+
+    def _write(self, data):
+        start = time.monotonic()
+        deadline = start + WRITE_TIMEOUT
+        while True:
+            try:
+                os.write(self.fd, data)
+                # Includes any wait for the host to poll the previous report
+                metrics.observe('hid_report', time.monotonic() - start)
+                return
+            except BlockingIOError:
+                # Host hasn't picked up the previous report yet
+                if time.monotonic() > deadline:
+                    raise OSError(errno.ETIMEDOUT, f"Timed out writing to {self.path}")
+                time.sleep(0.0005)
+
+    def write_reports(self, reports, interval=None):
+        """Write a buffer of 8-byte reports spaced `interval` seconds apart.
+
+        Returns False on error.
+        """
+        interval = self.interval if interval is None else interval
+        debug = log.isEnabledFor(logging.DEBUG)
+        view = memoryview(reports)
+        try:
+            self.open()
+            next_time = max(self.next_time, time.monotonic())
+            for offset in range(0, len(view), 8):
+                remaining = next_time - time.monotonic()
+                if remaining > 0:
+                    time.sleep(remaining)
+                data = view[offset:offset + 8]
+                self._write(data)
+                self.reports_written += 1
+                if debug:
+                    log.debug("Report sent: %s", bytes(data).hex())
+                next_time += interval
+            self.next_time = next_time
+            return True
+        except OSError as e:
+            self.log(f"Error writing to {self.path}: {e}")
+            self.last_error = e.errno
+            self.close()
+            return False
+
+    def send_key(self, keycode, modifier=0x00):
+        """Press and release a single key."""
+        return self.write_reports(report(keycode, modifier) + NULL_REPORT)
+
+    def key_down(self, keycode, modifier=0x00):
+        return self.write_reports(report(keycode, modifier), interval=0)
+
+    def key_up(self):
+        return self.write_reports(NULL_REPORT, interval=0)
+
+    def type_string(self, text, char_delay=0):
+        """Type a string; `char_delay` adds extra time between characters."""
+        reports = self.layout.translate(text, log=self.log)
+        log.debug("Typing %d characters", len(reports) // 16)
+        if not char_delay:
+            return self.write_reports(reports)
+        for i in range(0, len(reports), 16):
+            if not self.write_reports(reports[i:i + 16]):
+                return False
+            time.sleep(char_delay)
+        return True
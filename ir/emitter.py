@@ -1,74 +1,468 @@
-import pigpio
 import time
 import json
+import logging
 import sys
+import os
+import hashlib
+import pickle
+import socket
+from array import array
+from collections import OrderedDict
+
+try:
+    from ir.remote_store import open_remote
+except ImportError:
+    # Run as a script from the ir directory
+    from remote_store import open_remote
+
+log = logging.getLogger(__name__)
 
 # Settings
 CARRIER_FREQ = 38.0  # kHz, common for NEC; adjust if needed
 
+# Compiled frames are cached here, keyed by remote file hash and carrier
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".wavecache")
+# Bumped when the same remote file compiles to different frames
+CACHE_VERSION = 3
+
+# Unix socket of the resident IR service (see service.py)
+SOCKET_PATH = os.environ.get("IR_SOCKET", "/tmp/ir-emitter.sock")
+
+# NEC repeat code, sent every NEC_PERIOD_US while a button is held
+NEC_REPEAT = [9000, 2250, 560]
+NEC_PERIOD_US = 108000
+
+# How many pigpio waves to keep resident before evicting the least recently
+# used (pigpiod has 250 wave IDs)
+MAX_WAVES = 200
+
+# Marks of up to BURST_CYCLES carrier cycles (about 3.4ms at 38kHz) get a wave
+# of their own; longer ones, like the NEC header, loop the one-cycle wave.
+# pigpiod has only 20 loop counters per chain.
+BURST_CYCLES = 128
+# Longest wave_chain pigpiod accepts, in bytes
+MAX_CHAIN = 600
+MAX_LOOP = 65535
+
 def load_timings(json_file, button_name):
     try:
-        with open(json_file, 'r') as f:
-            data = json.load(f)
-        if button_name not in data["buttons"]:
-            print(f"Error: Button '{button_name}' not found in {json_file}")
+        remote = open_remote(json_file)
+        if button_name not in remote:
+            log.error("Button %r not found in %s", button_name, json_file)
             return None
-        return data["buttons"][button_name]
+        return remote[button_name]
     except FileNotFoundError:
-        print(f"Error: File {json_file} not found")
+        log.error("File %s not found", json_file)
         return None
     except json.JSONDecodeError:
-        print(f"Error: Invalid JSON in {json_file}")
+        log.error("Invalid JSON in %s", json_file)
         return None
     except Exception as e:
-        print(f"Error loading timings: {e}")
+        log.error("Error loading timings: %s", e)
         return None
 
-def send_ir_signal(timings, tx_pin):
-    pi = pigpio.pi()
-    if not pi.connected:
-        print("Failed to connect to pigpiod. Ensure 'sudo pigpiod' is running.")
+def carrier_cycle(tx_pin, carrier=CARRIER_FREQ):
+    """One carrier cycle at 50% duty as (gpio_on, gpio_off, delay) triples."""
+    mask = 1 << tx_pin
+    cycle_us = 1000.0 / carrier
+    on_us = int(round(cycle_us / 2.0))
+    off_us = int(round(cycle_us - on_us))
+    return array('I', (mask, 0, on_us, 0, mask, off_us))
+
+def compile_frame(timings, carrier=CARRIER_FREQ):
+    """Mark/space timings as [carrier cycles, space us, carrier cycles, ...]."""
+    cycle_us = 1000.0 / carrier
+    return array('I', (int(round(duration / cycle_us)) if i % 2 == 0 else duration
+                       for i, duration in enumerate(timings)))
+
+def flatten(frame, tx_pin, carrier=CARRIER_FREQ):
+    """A compiled frame as one flat waveform, a pulse pair per carrier cycle."""
+    wf = array('I')
+    cycle = carrier_cycle(tx_pin, carrier)
+    for i, value in enumerate(frame):
+        if i % 2 == 0:  # Mark: carrier bursts
+            wf.extend(cycle * value)
+        else:  # Space: off (no change)
+            wf.extend((0, 0, value))
+    return wf
+
+def compile_waveform(timings, tx_pin, carrier=CARRIER_FREQ):
+    """Turn mark/space timings into a flat array of (gpio_on, gpio_off, delay) triples."""
+    return flatten(compile_frame(timings, carrier), tx_pin, carrier)
+
+def is_nec_frame(frame, carrier=CARRIER_FREQ):
+    """True if a compiled frame starts with the NEC 9ms/4.5ms header."""
+    return (len(frame) > 1 and 8000 <= frame[0] * 1000.0 / carrier <= 10000
+            and 4000 <= frame[1] <= 5000)
+
+def duration_us(frame, carrier=CARRIER_FREQ):
+    cycle = carrier_cycle(0, carrier)
+    return sum(frame[0::2]) * (cycle[2] + cycle[5]) + sum(frame[1::2])
+
+def chain_delay(us):
+    """wave_chain delay commands for `us` microseconds (each is limited to 65535)."""
+    chain = []
+    while us > 0:
+        step = min(us, 65535)
+        chain += [255, 2, step & 255, step >> 8]
+        us -= step
+    return chain
+
+def marks(frame):
+    """(carrier cycles, following space us) for each mark of a compiled frame."""
+    return zip(frame[0::2], list(frame[1::2]) + [0])
+
+def chain_size(frame):
+    """Bytes of wave_chain data Emitter.segment() builds for a frame."""
+    size = 0
+    for cycles, space in marks(frame):
+        if cycles <= BURST_CYCLES:
+            size += 1 if cycles or space else 0
+        else:
+            size += 7 * -(-cycles // MAX_LOOP) + (1 if space else 0)
+    return size
+
+def to_pulses(wf):
+    """Expand a compiled waveform into pigpio pulses for wave_add_generic."""
+    import pigpio
+    return [pigpio.pulse(wf[i], wf[i + 1], wf[i + 2]) for i in range(0, len(wf), 3)]
+
+def compile_remote(json_file, carrier=CARRIER_FREQ, cache_dir=CACHE_DIR):
+    """Compile every button in a remote file, reusing the on-disk cache when possible."""
+    try:
+        with open(json_file, 'rb') as f:
+            raw = f.read()
+    except FileNotFoundError:
+        log.error("File %s not found", json_file)
+        return None
+
+    key = f"{hashlib.sha1(raw).hexdigest()}-{carrier:g}-{CACHE_VERSION}"
+    cache_file = os.path.join(cache_dir, f"{os.path.basename(json_file)}.{key}.pickle")
+    try:
+        with open(cache_file, 'rb') as f:
+            packed = pickle.load(f)
+        return {name: array('I', data) for name, data in packed.items()}
+    except (OSError, pickle.PickleError, EOFError, ValueError):
+        pass
+
+    try:
+        remote = open_remote(json_file)
+    except ValueError:
+        log.error("Invalid remote file %s", json_file)
+        return None
+    compiled = {name: compile_frame(remote[name], carrier) for name in remote}
+
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp = cache_file + ".tmp"
+        with open(tmp, 'wb') as f:
+            pickle.dump({name: frame.tobytes() for name, frame in compiled.items()}, f)
+        os.replace(tmp, cache_file)
+    except OSError as e:
+        log.warning("Could not write waveform cache: %s", e)
+    return compiled
+
+
+class Emitter:
+    """Long-lived IR transmitter.
+
+    Holds one pigpio connection, the compiled remotes and the pigpio waves
+    created so far. A frame is sent as a wave_chain over small shared waves:
+    a burst wave for each distinct (mark, following space) pair, and for
+    long marks one carrier cycle per pin, looped, plus a delay-only wave for
+    the space. A button then costs a few dozen pulses instead of a pulse
+    pair per carrier cycle, and the same waves serve every button on the
+    pin. Frames whose chain would be too long, or that pigpiod refuses to
+    chain, fall back to one flat wave.
+
+    Waves stay resident in LRU order; the oldest are deleted when pigpio
+    runs out of wave memory or MAX_WAVES is reached.
+    """
+
+    def __init__(self, pi=None, carrier=CARRIER_FREQ, max_waves=MAX_WAVES, observe=None):
+        self.pi = pi
+        # observe(stage, seconds) receives build and transmit timings (see metrics.py)
+        self.observe = observe
+        self.carrier = carrier
+        self.max_waves = max_waves
+        self.remotes = {}
+        self.waves = OrderedDict()
+        # (frame key, flat) -> (chain data, wave keys it uses)
+        self.chains = {}
+        self.output_pins = set()
+
+    def connect(self):
+        if self.pi is None or not self.pi.connected:
+            # Imported here so clients of the IR service never load pigpio
+            import pigpio
+            self.pi = pigpio.pi()
+            if not self.pi.connected:
+                log.error("Failed to connect to pigpiod. Ensure 'sudo pigpiod' is running.")
+                self.pi = None
+                return False
+            self.pi.wave_clear()  # We own every wave from here on
+            self.waves.clear()
+            self.chains.clear()
+            self.output_pins.clear()
+        return True
+
+    def close(self):
+        if self.pi is not None:
+            for wid in self.waves.values():
+                self.pi.wave_delete(wid)
+            self.waves.clear()
+            self.chains.clear()
+            self.pi.stop()
+            self.pi = None
+
+    def load(self, json_file, tx_pin):
+        """Return the compiled buttons of a remote, recompiling if the file changed."""
+        key = (json_file, tx_pin)
+        try:
+            stamp = os.stat(json_file).st_mtime_ns
+        except FileNotFoundError:
+            log.error("File %s not found", json_file)
+            return None
+        cached = self.remotes.get(key)
+        if cached is None or cached[0] != stamp:
+            start = time.perf_counter()
+            compiled = compile_remote(json_file, self.carrier)
+            if compiled is None:
+                return None
+            self._observe('ir_compile', start)
+            cached = self.remotes[key] = (stamp, compiled)
+            # The file changed; drop waves and chains built from the old timings
+            for wave_key in [k for k in self.waves if k[:2] == key]:
+                self.pi.wave_delete(self.waves.pop(wave_key))
+            self.chains.clear()
+        return cached[1]
+
+    def frame(self, json_file, button, tx_pin):
+        compiled = self.load(json_file, tx_pin)
+        if compiled is None:
+            return None
+        frame = compiled.get(button)
+        if frame is None:
+            log.error("Button %r not found in %s", button, json_file)
+        return frame
+
+    def _observe(self, stage, start):
+        if self.observe is not None:
+            self.observe(stage, time.perf_counter() - start)
+
+    def evict(self, keep=()):
+        for key in self.waves:
+            if key not in keep:
+                self.pi.wave_delete(self.waves.pop(key))
+                # Chains may refer to the deleted wave
+                self.chains.clear()
+                return True
         return False
 
-    print("Connected to pigpiod successfully.")
+    def create_wave(self, key, wf, tx_pin, keep=()):
+        """Create a pigpio wave for a compiled waveform and keep it resident."""
+        if tx_pin not in self.output_pins:
+            import pigpio
+            self.pi.set_mode(tx_pin, pigpio.OUTPUT)
+            self.output_pins.add(tx_pin)
 
-    pi.set_mode(tx_pin, pigpio.OUTPUT)
-    pi.wave_clear()
+        pulses = to_pulses(wf)
+        while True:
+            if len(self.waves) >= self.max_waves:
+                self.evict(keep)
+            self.pi.wave_add_generic(pulses)
+            wid = self.pi.wave_create()
+            if wid >= 0:
+                self.waves[key] = wid
+                log.debug("Wave built with %d pulses (ID: %d)", len(pulses), wid)
+                return wid
+            # Free pigpio wave memory and try again
+            if not self.evict(keep):
+                log.error("Failed to create wave: error code %s. (Common causes: too many pulses or pigpiod "
+                          "resource issue. Try rebooting or reducing timings.)", wid)
+                return None
 
-    wf = []
-    cycle_us = 1000.0 / CARRIER_FREQ
-    on_us = int(round(cycle_us / 2.0))  # 50% duty cycle
-    off_us = int(round(cycle_us - on_us))
+    def wave(self, key, wf, tx_pin, used, keep=()):
+        """Resident wave ID for `key`, created from `wf` on first use.
 
-    for i, duration in enumerate(timings):
-        if i % 2 == 0:  # Mark: generate carrier bursts
-            cycles = int(round(duration / cycle_us))
-            for _ in range(cycles):
-                wf.append(pigpio.pulse(1 << tx_pin, 0, on_us))  # High
-                wf.append(pigpio.pulse(0, 1 << tx_pin, off_us))  # Low
-        else:  # Space: off (no change)
-            wf.append(pigpio.pulse(0, 0, duration))
+        `key` is added to `used`; waves in `used` and `keep` aren't evicted.
+        """
+        used.add(key)
+        if key in self.waves:
+            self.waves.move_to_end(key)
+            return self.waves[key]
+        return self.create_wave(key, wf, tx_pin, used | set(keep))
+
+    def segment(self, key, frame, tx_pin, flat=False, keep=None):
+        """wave_chain data that transmits one compiled frame.
+
+        The waves it uses are added to `keep` so that building the rest of a
+        chain doesn't evict them. Returns None if a wave can't be created.
+        """
+        keep = set() if keep is None else keep
+        cached = self.chains.get((key, flat))
+        if cached is not None:
+            chain, keys = cached
+            for wave_key in keys:
+                self.waves.move_to_end(wave_key)
+            keep.update(keys)
+            return chain
+
+        start = time.perf_counter()
+        used = set()
+        if flat:
+            wid = self.wave(key, flatten(frame, tx_pin, self.carrier), tx_pin, used, keep)
+            if wid is None:
+                return None
+            chain = [wid]
+        else:
+            chain = []
+            cycle = carrier_cycle(tx_pin, self.carrier)
+            for cycles, space in marks(frame):
+                if cycles <= BURST_CYCLES:
+                    if not cycles and not space:
+                        continue
+                    # The mark and the space after it, as one wave
+                    burst = cycle * cycles + (array('I', (0, 0, space)) if space else array('I'))
+                    wid = self.wave((None, tx_pin, 'burst', cycles, space), burst, tx_pin, used, keep)
+                    if wid is None:
+                        return None
+                    chain.append(wid)
+                    continue
+                wid = self.wave((None, tx_pin, 'cycle'), cycle, tx_pin, used, keep)
+                if wid is None:
+                    return None
+                while cycles > 0:
+                    loops = min(cycles, MAX_LOOP)
+                    chain += [255, 0, wid, 255, 1, loops & 255, loops >> 8]
+                    cycles -= loops
+                if space:
+                    wid = self.wave((None, None, 'space', space), array('I', (0, 0, space)), tx_pin, used, keep)
+                    if wid is None:
+                        return None
+                    chain.append(wid)
+        self._observe('ir_build', start)
+        self.chains[(key, flat)] = (chain, used)
+        keep.update(used)
+        return chain
+
+    def transmit(self, key, frame, tx_pin, tail=(), keep=None):
+        """Send a frame, plus optional chain commands after it, with one wave_chain.
+
+        Falls back to a flat wave when the chain is too long or pigpiod
+        rejects it.
+        """
+        for flat in (False, True):
+            if not flat and chain_size(frame) + len(tail) > MAX_CHAIN:
+                continue
+            chain = self.segment(key, frame, tx_pin, flat, keep)
+            if chain is None:
+                return False
+            status = self.pi.wave_chain(chain + list(tail))
+            if status >= 0:
+                return True
+            log.error("wave_chain failed: error code %s", status)
+        return False
+
+    def hold(self, json_file, button, tx_pin, period_us=None, count=None):
+        """Send a button once, then repeat it every period with a single wave_chain.
+
+        NEC frames are followed by the short NEC repeat code; other protocols
+        repeat the full frame. With count=None the chain loops until stop().
+        """
+        if not self.connect():
+            return False
+        frame = self.frame(json_file, button, tx_pin)
+        if frame is None:
+            return False
+        frame_key = (json_file, tx_pin, button)
+        if is_nec_frame(frame, self.carrier):
+            repeat_key = (None, tx_pin, 'NEC_REPEAT')
+            repeat = compile_frame(NEC_REPEAT, self.carrier)
+            period_us = max(period_us or NEC_PERIOD_US, NEC_PERIOD_US)
+        else:
+            repeat_key, repeat = frame_key, frame
+            period_us = period_us or NEC_PERIOD_US
+        frame_us = duration_us(frame, self.carrier)
+        repeat_us = duration_us(repeat, self.carrier)
 
-    print(f"Waveform built with {len(wf)} pulses.")
+        # The repeat loops after the first frame; a long one is sent flat to
+        # leave room in the chain for the frame
+        flat = chain_size(repeat) > MAX_CHAIN // 2
+        while True:
+            keep = set()
+            tail = self.segment(repeat_key, repeat, tx_pin, flat, keep)
+            if tail is None:
+                return False
+            tail = chain_delay(max(period_us - frame_us, 0)) + [255, 0] + tail
+            tail += chain_delay(max(period_us - repeat_us, 0))
+            if count is None:
+                tail += [255, 3]
+            else:
+                tail += [255, 1, count & 255, count >> 8]
+            if self.transmit(frame_key, frame, tx_pin, tail, keep):
+                return True
+            if flat:
+                return False
+            flat = True
 
-    pi.wave_add_generic(wf)
-    wid = pi.wave_create()
+    def stop(self):
+        """Stop a running hold chain."""
+        if self.pi is not None:
+            self.pi.wave_tx_stop()
 
-    if wid >= 0:
-        print(f"Wave created successfully (ID: {wid}). Sending...")
-        pi.wave_send_once(wid)
-        while pi.wave_tx_busy():
-            time.sleep(0.1)
-        print("Transmission complete.")
-        pi.wave_delete(wid)
-        pi.stop()
+    def send(self, json_file, button, tx_pin):
+        if not self.connect():
+            return False
+        frame = self.frame(json_file, button, tx_pin)
+        if frame is None:
+            return False
+        start = time.perf_counter()
+        if not self.transmit((json_file, tx_pin, button), frame, tx_pin):
+            return False
+        while self.pi.wave_tx_busy():
+            time.sleep(0.001)
+        self._observe('ir_transmit', start)
         return True
-    else:
-        print(f"Failed to create wave: error code {wid}. (Common causes: too many pulses or pigpiod resource issue. Try rebooting or reducing timings.)")
-        pi.stop()
+
+def send_ir_signal(timings, tx_pin):
+    emitter = Emitter()
+    if not emitter.connect():
+        return False
+
+    log.info("Connected to pigpiod successfully.")
+    if not emitter.transmit((None, tx_pin, 'signal'), compile_frame(timings), tx_pin):
+        emitter.close()
+        return False
+    log.info("Sending over %d waves...", len(emitter.waves))
+    while emitter.pi.wave_tx_busy():
+        time.sleep(0.1)
+    log.info("Transmission complete.")
+    emitter.close()
+    return True
+
+def request(message, path=SOCKET_PATH, timeout=5.0):
+    """Send one request to a running IR service; returns None if none is listening."""
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(timeout)
+            sock.connect(path)
+            sock.sendall((json.dumps(message) + "\n").encode())
+            reply = sock.makefile().readline()
+    except (FileNotFoundError, ConnectionRefusedError):
+        return None
+    return json.loads(reply) if reply else {"ok": False, "error": "No reply from IR service"}
+
+def ping(path=SOCKET_PATH):
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.connect(path)
+        return True
+    except OSError:
         return False
 
 def main():
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
     if len(sys.argv) != 4:
         print("Usage: python3 emitter.py <gpio_#> <json_file> <button_name>")
         return
@@ -85,13 +479,23 @@ def main():
     json_file = sys.argv[2]
     button_name = sys.argv[3]
 
-    timings = load_timings(json_file, button_name)
-    if timings:
-        success = send_ir_signal(timings, tx_pin)
-        if not success:
+    # Prefer the resident service; only drive pigpio directly when it isn't running
+    reply = request({"pin": tx_pin, "file": os.path.abspath(json_file), "button": button_name})
+    if reply is not None:
+        if reply["ok"]:
+            print("Transmission complete.")
+        else:
+            print(f"Failed to send IR signal: {reply['error']}")
+        return
+
+    emitter = Emitter()
+    try:
+        if not emitter.send(json_file, button_name, tx_pin):
             print("Failed to send IR signal.")
-    else:
-        print("Failed to load timings. No signal sent.")
+        else:
+            print("Transmission complete.")
+    finally:
+        emitter.close()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
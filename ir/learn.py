@@ -0,0 +1,202 @@
+"""Learn IR buttons from a receiver and add them to a remote.
+
+Records each button several times from an IR receiver (e.g. a TSOP38238)
+on RX_GPIO, combines the presses, detects the protocol and writes the
+result into a remote store (.irr) or JSON remote:
+
+    python3 -m ir.learn ir/tlc_tv.json Power VolumeUp [--presses 3] [--gpio 22]
+
+Edges are timed with the tick pigpiod stamps on each level change, and the
+callback only copies that tick into a preallocated array, so Python
+callback latency on the Pi Zero delays the callbacks but doesn't change
+the captured durations.
+"""
+import argparse
+import os
+import statistics
+import sys
+import threading
+from array import array
+from collections import Counter
+from datetime import datetime
+
+import pigpio
+
+from ir.protocols import Code, decode, near
+from ir.remote_store import load_buttons, save_buttons
+
+# GPIO the IR receiver's output is wired to
+RX_GPIO = int(os.environ.get("IR_RX_GPIO", "22"))
+
+# Edges kept per press; a frame plus a few repeat codes is well under this
+MAX_EDGES = 1024
+
+# Pulses shorter than this are receiver noise
+GLITCH_US = 100
+
+# Silence that ends a press (pigpio watchdog), and the space that ends a frame
+FRAME_GAP_MS = 50
+FRAME_GAP_US = 20000
+
+PRESSES = 3
+
+
+class Recorder:
+    """Collects receiver edges from a pigpio callback into a preallocated buffer."""
+
+    def __init__(self, pi, gpio=RX_GPIO, active_low=True, max_edges=MAX_EDGES):
+        self.pi = pi
+        self.gpio = gpio
+        # Most receivers pull the output low while they see a carrier
+        self.mark_level = 0 if active_low else 1
+        self.ticks = array('I', bytes(4 * max_edges))
+        self.count = 0
+        self.done = threading.Event()
+        self.callback = None
+
+    def start(self):
+        self.pi.set_mode(self.gpio, pigpio.INPUT)
+        self.pi.set_glitch_filter(self.gpio, GLITCH_US)
+        self.callback = self.pi.callback(self.gpio, pigpio.EITHER_EDGE, self._edge)
+        self.pi.set_watchdog(self.gpio, FRAME_GAP_MS)
+
+    def stop(self):
+        self.pi.set_watchdog(self.gpio, 0)
+        self.pi.set_glitch_filter(self.gpio, 0)
+        if self.callback is not None:
+            self.callback.cancel()
+            self.callback = None
+
+    def _edge(self, gpio, level, tick):
+        count = self.count
+        if level == pigpio.TIMEOUT:
+            if count:
+                self.done.set()
+        elif count < len(self.ticks) and (count or level == self.mark_level):
+            self.ticks[count] = tick
+            self.count = count + 1
+
+    def arm(self):
+        """Start recording a new press."""
+        self.done.clear()
+        self.count = 0
+
+    def wait(self, timeout=None):
+        """Wait for the armed press to end; returns its first frame's timings or None."""
+        if not self.done.wait(timeout):
+            return None
+        ticks = self.ticks
+        timings = [pigpio.tickDiff(ticks[i], ticks[i + 1]) for i in range(self.count - 1)]
+        return first_frame(timings)
+
+def first_frame(timings):
+    """Cut a capture at the first long space, dropping repeat codes after it."""
+    for i in range(1, len(timings), 2):
+        if timings[i] >= FRAME_GAP_US:
+            return timings[:i]
+    # A frame starts and ends with a mark
+    return timings if len(timings) % 2 else timings[:-1]
+
+def average(captures):
+    """Element-wise median of the captures that share the most common length."""
+    length, _ = Counter(len(capture) for capture in captures).most_common(1)[0]
+    chosen = [capture for capture in captures if len(capture) == length]
+    return [int(statistics.median(values)) for values in zip(*chosen)]
+
+def combine(captures):
+    """Protocol Code if the presses agree on one, else averaged raw timings."""
+    codes = Counter(code for code in map(decode, captures) if code is not None)
+    if codes:
+        code, votes = codes.most_common(1)[0]
+        if votes * 2 > len(captures):
+            return code
+    timings = average(captures)
+    return decode(timings) or timings
+
+def same_signal(a, b):
+    # Compare decodable captures by their code, so raw and decoded copies match
+    a = a if isinstance(a, Code) else decode(a) or a
+    b = b if isinstance(b, Code) else decode(b) or b
+    if isinstance(a, Code) or isinstance(b, Code):
+        return a == b
+    return len(a) == len(b) and all(near(x, y) for x, y in zip(a, b))
+
+def find_duplicate(buttons, value, exclude=None):
+    """Name of another button that already sends `value`, if any."""
+    for name, existing in buttons.items():
+        if name != exclude and same_signal(existing, value):
+            return name
+    return None
+
+def describe(value):
+    if isinstance(value, Code):
+        return f"{value.protocol} address 0x{value.address:04X} command 0x{value.command:X}"
+    return f"raw, {len(value)} timings"
+
+def learn_button(recorder, button, presses=PRESSES, timeout=10.0, prompt=print):
+    """Record `presses` presses of a button and combine them; None if nothing was received."""
+    captures = []
+    for i in range(presses):
+        recorder.arm()
+        prompt(f"Press {button} ({i + 1}/{presses})...")
+        timings = recorder.wait(timeout)
+        if not timings:
+            prompt(f"  nothing received for {button}")
+            continue
+        captures.append(timings)
+    if not captures:
+        return None
+    return combine(captures)
+
+def learn(pi, path, names, presses=PRESSES, gpio=RX_GPIO, remote_name=None, timeout=10.0, prompt=print):
+    """Learn buttons into the remote at `path`; returns the names that were added."""
+    if os.path.exists(path):
+        buttons, meta = load_buttons(path)
+    else:
+        buttons, meta = {}, {}
+    recorder = Recorder(pi, gpio)
+    recorder.start()
+    added = []
+    try:
+        for name in names:
+            value = learn_button(recorder, name, presses, timeout, prompt)
+            if value is None:
+                prompt(f"Skipped {name}: no signal")
+                continue
+            duplicate = find_duplicate(buttons, value, exclude=name)
+            if duplicate:
+                prompt(f"Skipped {name}: same signal as {duplicate}")
+                continue
+            buttons[name] = value
+            added.append(name)
+            prompt(f"Learned {name}: {describe(value)}")
+    finally:
+        recorder.stop()
+    if added:
+        meta["capture_time"] = datetime.now().isoformat()
+        if remote_name:
+            meta["remote_name"] = remote_name
+        save_buttons(path, buttons, meta)
+    return added
+
+def main():
+    parser = argparse.ArgumentParser(description="Learn IR buttons into a remote store or JSON remote.")
+    parser.add_argument("remote", help="Remote file to add to (.irr or .json)")
+    parser.add_argument("buttons", nargs="+", help="Button names to learn, in order")
+    parser.add_argument("--presses", type=int, default=PRESSES, help="Presses to record per button")
+    parser.add_argument("--gpio", type=int, default=RX_GPIO, help="GPIO of the IR receiver")
+    parser.add_argument("--name", help="Remote name to store")
+    args = parser.parse_args()
+
+    pi = pigpio.pi()
+    if not pi.connected:
+        print("Failed to connect to pigpiod. Ensure 'sudo pigpiod' is running.")
+        sys.exit(1)
+    try:
+        added = learn(pi, args.remote, args.buttons, args.presses, args.gpio, args.name)
+    finally:
+        pi.stop()
+    print(f"Added {len(added)} of {len(args.buttons)} buttons to {args.remote}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,253 @@
+"""Decode raw IR captures into protocol codes and regenerate clean timings.
+
+A capture is a list of alternating mark/space durations in microseconds,
+starting with a mark. decode() matches it against the known protocols
+(allowing for capture jitter) and returns a Code with the address and
+command; encode() turns a Code back into idealized timings. Captures that
+don't match any protocol are left alone and replayed raw.
+
+Check a capture file with
+    python3 -m ir.protocols ir/tlc_tv.json
+and that every protocol's codes survive encode() then decode() with
+    python3 -m ir.protocols --check
+"""
+import json
+import sys
+from collections import namedtuple
+
+# How far a captured duration may be from the protocol's nominal value
+TOLERANCE = 0.25
+
+Code = namedtuple('Code', 'protocol address command')
+
+# Pulse-distance protocols: header mark/space, bit mark, 0/1 spaces, and
+# how many bits each block of the frame has (blocks are split by GAP)
+PulseDistance = namedtuple('PulseDistance', 'header_mark header_space bit_mark zero one blocks gap')
+
+NEC = PulseDistance(9000, 4500, 560, 560, 1690, (32,), None)
+SAMSUNG32 = PulseDistance(4500, 4500, 560, 560, 1690, (32,), None)
+# Samsung soundbars: 16 bits, a 4.5ms gap, then another 20 bits
+SAMSUNG36 = PulseDistance(4500, 4500, 500, 500, 1500, (16, 20), 4500)
+
+# RC5: Manchester coded, 14 bits (2 start, toggle, 5 address, 6 command)
+RC5_HALF_BIT = 889
+
+# Numbers written into remote stores; don't renumber
+PROTOCOL_IDS = {'NEC': 1, 'SAMSUNG32': 2, 'SAMSUNG36': 3, 'RC5': 4, 'NECEXT': 5, 'SAMSUNG32EXT': 6}
+PROTOCOL_NAMES = {number: name for name, number in PROTOCOL_IDS.items()}
+
+def near(value, target, tolerance=TOLERANCE):
+    return abs(value - target) <= target * tolerance
+
+# -- pulse distance (NEC, Samsung) ---------------------------------------------
+
+def _read_bits(timings, start, count, spec):
+    """Read `count` LSB-first bits from mark/space pairs; returns (value, next index) or None."""
+    value = 0
+    for bit in range(count):
+        i = start + 2 * bit
+        if i + 1 >= len(timings) or not near(timings[i], spec.bit_mark):
+            return None
+        space = timings[i + 1]
+        if near(space, spec.one):
+            value |= 1 << bit
+        elif not near(space, spec.zero):
+            return None
+    return value, start + 2 * count
+
+def _decode_pulse_distance(timings, spec):
+    """Return the value of each block, or None if the capture doesn't fit `spec`."""
+    expected = 2 + sum(2 * bits for bits in spec.blocks) + 2 * (len(spec.blocks) - 1) + 1
+    if len(timings) != expected:
+        return None
+    if not (near(timings[0], spec.header_mark) and near(timings[1], spec.header_space)):
+        return None
+    values = []
+    i = 2
+    for n, bits in enumerate(spec.blocks):
+        if n:
+            # Gap between blocks: a bit mark followed by a long space
+            if not (near(timings[i], spec.bit_mark) and near(timings[i + 1], spec.gap)):
+                return None
+            i += 2
+        result = _read_bits(timings, i, bits, spec)
+        if result is None:
+            return None
+        value, i = result
+        values.append(value)
+    if not near(timings[i], spec.bit_mark):
+        return None
+    return values
+
+def _encode_pulse_distance(values, spec):
+    timings = [spec.header_mark, spec.header_space]
+    for n, (bits, value) in enumerate(zip(spec.blocks, values)):
+        if n:
+            timings += [spec.bit_mark, spec.gap]
+        for bit in range(bits):
+            timings += [spec.bit_mark, spec.one if value >> bit & 1 else spec.zero]
+    timings.append(spec.bit_mark)
+    return timings
+
+def _checked(value):
+    """True if the high byte of a 16-bit field is the inverse of the low byte."""
+    return value >> 8 == (value & 0xFF) ^ 0xFF
+
+def _join_checked(value):
+    # Values over 0xFF are taken as the whole field, as older stores hold them
+    return value if value > 0xFF else value | (value ^ 0xFF) << 8
+
+def decode_nec(timings, spec=NEC, name='NEC'):
+    """NEC: 8-bit address and command, each followed by its inverse.
+
+    Frames where either field lacks a valid inverse (extended addresses,
+    including ones with a 0x00 high byte) decode as NECEXT, which keeps
+    both fields as the full 16 bits sent.
+    """
+    values = _decode_pulse_distance(timings, spec)
+    if values is None:
+        return None
+    address, command = values[0] & 0xFFFF, values[0] >> 16
+    if _checked(address) and _checked(command):
+        return Code(name, address & 0xFF, command & 0xFF)
+    return Code(name + 'EXT', address, command)
+
+def encode_nec(code, spec=NEC):
+    data = _join_checked(code.address) | _join_checked(code.command) << 16
+    return _encode_pulse_distance([data], spec)
+
+def encode_necext(code, spec=NEC):
+    return _encode_pulse_distance([(code.address & 0xFFFF) | (code.command & 0xFFFF) << 16], spec)
+
+def decode_samsung32(timings):
+    # Same frame layout as NEC, with a 4.5ms/4.5ms header
+    return decode_nec(timings, SAMSUNG32, 'SAMSUNG32')
+
+def encode_samsung32(code):
+    return encode_nec(code, SAMSUNG32)
+
+def encode_samsung32ext(code):
+    return encode_necext(code, SAMSUNG32)
+
+def decode_samsung36(timings):
+    values = _decode_pulse_distance(timings, SAMSUNG36)
+    if values is None:
+        return None
+    return Code('SAMSUNG36', values[0], values[1])
+
+def encode_samsung36(code):
+    return _encode_pulse_distance([code.address, code.command], SAMSUNG36)
+
+# -- RC5 ----------------------------------------------------------------------
+
+def decode_rc5(timings):
+    # The first half of the first start bit is a space we never see
+    halves = [0]
+    level = 1
+    for duration in timings:
+        if near(duration, RC5_HALF_BIT):
+            halves.append(level)
+        elif near(duration, 2 * RC5_HALF_BIT):
+            halves += [level, level]
+        else:
+            return None
+        level ^= 1
+    if len(halves) == 27:
+        halves.append(0)  # Trailing space after a final "1" bit
+    if len(halves) != 28:
+        return None
+    bits = 0
+    for first, second in zip(halves[0::2], halves[1::2]):
+        if first == second:
+            return None
+        bits = bits << 1 | second
+    if not bits >> 13 & 1:
+        return None
+    # The second start bit is the inverted 7th command bit (RC5X)
+    command = (bits & 0x3F) | (0 if bits >> 12 & 1 else 0x40)
+    return Code('RC5', bits >> 6 & 0x1F, command)
+
+def encode_rc5(code, toggle=0):
+    field = 0 if code.command & 0x40 else 1
+    bits = 1 << 13 | field << 12 | toggle << 11 | (code.address & 0x1F) << 6 | (code.command & 0x3F)
+    halves = []
+    for shift in range(13, -1, -1):
+        halves += [0, 1] if bits >> shift & 1 else [1, 0]
+    timings = []
+    level = None
+    for half in halves[1:] if halves[0] == 0 else halves:
+        if half == level:
+            timings[-1] += RC5_HALF_BIT
+        else:
+            timings.append(RC5_HALF_BIT)
+            level = half
+    if level == 0:
+        timings.pop()  # Don't end on a space
+    return timings
+
+DECODERS = [decode_nec, decode_samsung32, decode_samsung36, decode_rc5]
+ENCODERS = {'NEC': encode_nec, 'NECEXT': encode_necext, 'SAMSUNG32': encode_samsung32,
+            'SAMSUNG32EXT': encode_samsung32ext, 'SAMSUNG36': encode_samsung36, 'RC5': encode_rc5}
+
+def decode(timings):
+    """Return the Code for a raw capture, or None if no protocol matches."""
+    for decoder in DECODERS:
+        code = decoder(timings)
+        if code is not None:
+            return code
+    return None
+
+def encode(code):
+    """Idealized timings for a Code."""
+    return ENCODERS[code.protocol](code)
+
+def clean(timings):
+    """Regenerated timings if the capture decodes, otherwise the capture unchanged."""
+    code = decode(timings)
+    return timings if code is None else encode(code)
+
+# Codes that must come back unchanged from encode() then decode()
+ROUND_TRIP = [
+    Code('NEC', 0x04, 0x08),
+    Code('NEC', 0x00, 0xFF),
+    Code('NECEXT', 0xC7EA, 0xE817),
+    Code('NECEXT', 0x0012, 0xF708),
+    Code('NECEXT', 0x00EA, 0x00EA),
+    Code('NECEXT', 0x0000, 0x0000),
+    Code('SAMSUNG32EXT', 0x0707, 0xFD02),
+    Code('SAMSUNG32EXT', 0x0012, 0x0034),
+    Code('SAMSUNG36', 0x0400, 0x0E10F),
+    Code('RC5', 0x00, 0x0C),
+    Code('RC5', 0x1F, 0x7F),
+]
+
+def check():
+    """Round-trip ROUND_TRIP through encode/decode; returns the codes that change."""
+    return [(code, decode(encode(code))) for code in ROUND_TRIP if decode(encode(code)) != code]
+
+def main():
+    if sys.argv[1:] == ["--check"]:
+        failures = check()
+        for code, decoded in failures:
+            print(f"  {code} decoded as {decoded}")
+        print(f"{len(ROUND_TRIP) - len(failures)} of {len(ROUND_TRIP)} codes round-trip")
+        sys.exit(1 if failures else 0)
+    if len(sys.argv) < 2:
+        print("Usage: python3 -m ir.protocols <remote.json> [<remote.json> ...] | --check")
+        sys.exit(1)
+    for json_file in sys.argv[1:]:
+        with open(json_file) as f:
+            buttons = json.load(f)["buttons"]
+        print(json_file)
+        for name, timings in buttons.items():
+            code = decode(timings)
+            if code is None:
+                print(f"  {name:<14} raw ({len(timings)} timings)")
+                continue
+            ideal = encode(code)
+            error = max(abs(a - b) for a, b in zip(timings, ideal))
+            print(f"  {name:<14} {code.protocol:<10} address 0x{code.address:04X}  command 0x{code.command:05X}  "
+                  f"max error {error}us")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,283 @@
+"""Compact binary store for captured IR remotes.
+
+The JSON captures keep one integer per line and have to be parsed in full
+to read a single button. A store (.irr) packs the same timings as uint16
+arrays (uint32 only for buttons with a gap over 65535us) behind a fixed-size
+index of button names sorted for binary search, and is read through mmap,
+so looking up one button touches only the index entries it compares and
+that button's data, however many buttons the file holds.
+
+Buttons that decode as a known protocol (see protocols.py) are stored as
+just their code, in the index entry itself, and read back as idealized
+timings; anything else keeps its raw timings.
+
+Layout (little-endian):
+    header   magic "IRR1", version, button count, index offset, metadata length
+    metadata JSON (remote_name, capture_time, ...)
+    index    one entry per button: name (32 bytes, NUL padded), data offset,
+             number of timings, bytes per timing, protocol id. Protocol
+             entries have 0 bytes per timing and hold the address and
+             command in place of the offset and count.
+    data     the timing arrays, 4-byte aligned
+
+Convert the existing captures with
+    python3 -m ir.remote_store ir/tlc_tv.json ir/samsung_soundbar.json
+JSON remotes are also converted on first use into CACHE_DIR (see open_remote).
+"""
+import json
+import logging
+import mmap
+import os
+import struct
+import sys
+import threading
+from array import array
+
+try:
+    from ir.protocols import Code, PROTOCOL_IDS, PROTOCOL_NAMES, decode, encode
+except ImportError:
+    # Run as a script from the ir directory
+    from protocols import Code, PROTOCOL_IDS, PROTOCOL_NAMES, decode, encode
+
+log = logging.getLogger(__name__)
+
+MAGIC = b"IRR1"
+VERSION = 1
+EXTENSION = ".irr"
+
+HEADER = struct.Struct("<4sHHII")
+ENTRY = struct.Struct("<32sIIBB2x")
+NAME_SIZE = 32
+
+# Stores converted from JSON remotes on first use live next to the waveform cache
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".wavecache")
+
+def _align(n):
+    return (n + 3) & ~3
+
+def _typed(values, width):
+    data = array("H" if width == 2 else "I", values)
+    if sys.byteorder == "big":
+        data.byteswap()
+    return data
+
+def write_store(path, buttons, meta=None):
+    """Write {button: timings or Code} (plus optional metadata) to a store file atomically."""
+    names = sorted(buttons, key=lambda name: name.encode())
+    meta_bytes = json.dumps(meta or {}).encode()
+    index_offset = _align(HEADER.size + len(meta_bytes))
+    offset = _align(index_offset + ENTRY.size * len(names))
+
+    entries, chunks = [], []
+    for name in names:
+        encoded = name.encode()
+        if len(encoded) > NAME_SIZE:
+            raise ValueError(f"Button name too long for the store: {name!r}")
+        value = buttons[name]
+        if isinstance(value, Code):
+            entries.append(ENTRY.pack(encoded, value.address, value.command, 0, PROTOCOL_IDS[value.protocol]))
+            continue
+        width = 2 if max(value, default=0) <= 0xFFFF else 4
+        data = _typed(value, width).tobytes()
+        entries.append(ENTRY.pack(encoded, offset, len(value), width, 0))
+        chunks.append(data + b"\0" * (_align(len(data)) - len(data)))
+        offset += _align(len(data))
+
+    out = bytearray(HEADER.pack(MAGIC, VERSION, len(names), index_offset, len(meta_bytes)))
+    out += meta_bytes
+    out += b"\0" * (index_offset - len(out))
+    out += b"".join(entries)
+    out += b"\0" * (_align(len(out)) - len(out))
+    out += b"".join(chunks)
+
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(out)
+    os.replace(tmp, path)
+    return path
+
+
+class RemoteStore:
+    """Read-only view of a store file; behaves like a {button: timings} mapping."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.count, self.index_offset, self.meta_len = HEADER.unpack_from(self.map, 0)
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise ValueError(f"{path} is not a version {VERSION} remote store")
+
+    @property
+    def meta(self):
+        return json.loads(self.map[HEADER.size:HEADER.size + self.meta_len])
+
+    def _entry(self, i):
+        return ENTRY.unpack_from(self.map, self.index_offset + i * ENTRY.size)
+
+    def _find(self, button):
+        key = button.encode().ljust(NAME_SIZE, b"\0")
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            entry = self._entry(mid)
+            if entry[0] < key:
+                lo = mid + 1
+            elif entry[0] > key:
+                hi = mid
+            else:
+                return entry
+        return None
+
+    def code(self, button):
+        """Protocol code of a button, or None if it is stored raw (or missing)."""
+        entry = self._find(button)
+        if entry is None or not entry[4]:
+            return None
+        return Code(PROTOCOL_NAMES[entry[4]], entry[1], entry[2])
+
+    def get(self, button, default=None):
+        """Timings of one button as an array, or `default` if it isn't stored."""
+        entry = self._find(button)
+        if entry is None:
+            return default
+        _, offset, length, width, protocol = entry
+        if protocol:
+            return array("H", encode(Code(PROTOCOL_NAMES[protocol], offset, length)))
+        data = array("H" if width == 2 else "I")
+        data.frombytes(self.map[offset:offset + length * width])
+        if sys.byteorder == "big":
+            data.byteswap()
+        return data
+
+    def __getitem__(self, button):
+        data = self.get(button)
+        if data is None:
+            raise KeyError(button)
+        return data
+
+    def __contains__(self, button):
+        return self._find(button) is not None
+
+    def __iter__(self):
+        for i in range(self.count):
+            yield self._entry(i)[0].rstrip(b"\0").decode()
+
+    def __len__(self):
+        return self.count
+
+    def keys(self):
+        return list(self)
+
+    def items(self):
+        return [(name, self[name]) for name in self]
+
+    def close(self):
+        self.map.close()
+
+
+def parse_button(value, raw=False):
+    """A JSON button: raw timings, decoded unless `raw`, or {"protocol", "address", "command"}."""
+    if isinstance(value, dict):
+        return Code(value["protocol"].upper(), value["address"], value["command"])
+    if raw:
+        return value
+    return decode(value) or value
+
+def convert(json_file, out=None, raw=False):
+    """Convert a JSON capture to a store; returns the path written.
+
+    Captures that decode as a known protocol are stored as codes unless
+    `raw` is set.
+    """
+    with open(json_file) as f:
+        data = json.load(f)
+    meta = {key: value for key, value in data.items() if key != "buttons"}
+    buttons = {name: parse_button(value, raw) for name, value in data["buttons"].items()}
+    if out is None:
+        out = os.path.splitext(json_file)[0] + EXTENSION
+    return write_store(out, buttons, meta)
+
+def load_buttons(path):
+    """All buttons of a store or JSON remote as ({name: Code or timings}, metadata)."""
+    if path.endswith(EXTENSION):
+        store = RemoteStore(path)
+        try:
+            return {name: store.code(name) or list(store[name]) for name in store}, store.meta
+        finally:
+            store.close()
+    with open(path) as f:
+        data = json.load(f)
+    meta = {key: value for key, value in data.items() if key != "buttons"}
+    return {name: parse_button(value, raw=True) for name, value in data["buttons"].items()}, meta
+
+def save_buttons(path, buttons, meta=None):
+    """Write buttons to a store, or to a JSON remote if `path` ends in .json."""
+    if path.endswith(EXTENSION):
+        return write_store(path, buttons, meta)
+    data = dict(meta or {})
+    data["buttons"] = {name: value._asdict() if isinstance(value, Code) else list(value)
+                       for name, value in buttons.items()}
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(data, f, indent=4)
+    os.replace(tmp, path)
+    return path
+
+# Stores stay mapped once opened: path -> (mtime, RemoteStore)
+_stores = {}
+_stores_lock = threading.Lock()
+
+def _mapped(path):
+    """The mapped store for `path`, remapped (and the old mapping closed) when the file changes."""
+    stamp = os.stat(path).st_mtime_ns
+    with _stores_lock:
+        cached = _stores.get(path)
+        if cached is None or cached[0] != stamp:
+            if cached is not None:
+                cached[1].close()
+            cached = _stores[path] = (stamp, RemoteStore(path))
+        return cached[1]
+
+def open_remote(path, cache_dir=CACHE_DIR):
+    """Open a remote (.irr store or JSON capture) as a {button: timings} mapping.
+
+    A JSON capture is converted into cache_dir the first time it is opened
+    and again whenever the JSON is newer than its converted copy. Stores
+    stay mapped, so later lookups don't reopen the file.
+    """
+    if path.endswith(EXTENSION):
+        return _mapped(path)
+    stamp = os.stat(path).st_mtime_ns
+    converted = os.path.join(cache_dir, os.path.basename(path) + EXTENSION)
+    try:
+        if os.stat(converted).st_mtime_ns >= stamp:
+            return _mapped(converted)
+    except (OSError, ValueError):
+        pass
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        return _mapped(convert(path, converted))
+    except OSError as e:
+        log.warning("Could not write remote store: %s", e)
+        with open(path) as f:
+            buttons = json.load(f)["buttons"]
+        return {name: encode(parse_button(value, raw=True)) if isinstance(value, dict) else value
+                for name, value in buttons.items()}
+
+def main():
+    if len(sys.argv) < 2:
+        print("Usage: python3 -m ir.remote_store [--raw] <remote.json> [<remote.json> ...]")
+        sys.exit(1)
+    raw = "--raw" in sys.argv[1:]
+    for json_file in [arg for arg in sys.argv[1:] if arg != "--raw"]:
+        try:
+            out = convert(json_file, raw=raw)
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Error converting {json_file}: {e}")
+            continue
+        print(f"{json_file} -> {out} ({os.path.getsize(json_file)} -> {os.path.getsize(out)} bytes)")
+
+if __name__ == "__main__":
+    main()
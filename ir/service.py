@@ -0,0 +1,169 @@
+"""Resident IR service.
+
+Keeps one pigpio connection and every remote definition compiled, and
+accepts send requests either in-process or over a Unix socket so that
+`emitter.py` and cron jobs don't each pay for an interpreter and a new
+pigpio connection. Run standalone with `python3 -m ir.service`, or let the
+web app host it.
+
+Socket protocol: one JSON object per line, e.g.
+    {"remote": "tv", "button": "VolumeUp"}
+    {"pin": 17, "file": "/path/to/remote.json", "button": "Power"}
+answered with {"ok": true} or {"ok": false, "error": "..."}.
+"""
+import json
+import logging
+import os
+import socketserver
+import sys
+import threading
+import time
+
+from ir.emitter import Emitter, SOCKET_PATH, ping
+
+log = logging.getLogger(__name__)
+
+# A hold always lets the first frame finish, even for a quick tap
+MIN_HOLD_SECONDS = 0.11
+
+IR_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Remotes known by name: name -> (GPIO pin, remote JSON)
+REMOTES = {
+    'tv': (17, os.path.join(IR_DIR, "tlc_tv.json")),
+    'soundbar': (27, os.path.join(IR_DIR, "samsung_soundbar.json")),
+}
+
+
+class IRService:
+    """Thread-safe wrapper around one long-lived Emitter."""
+
+    def __init__(self, pi=None, remotes=REMOTES, observe=None):
+        self.emitter = Emitter(pi=pi, observe=observe)
+        self.remotes = remotes
+        self.lock = threading.Lock()
+        self.server = None
+        self.holding = False
+        self.holder = None
+        self.hold_started = 0.0
+
+    def preload(self, remotes=None):
+        """Connect to pigpiod and compile every known remote (or the given ones) up front."""
+        with self.lock:
+            if not self.emitter.connect():
+                return False
+            for pin, json_file in (remotes or self.remotes).values():
+                self.emitter.load(json_file, pin)
+            return True
+
+    def connected(self):
+        pi = self.emitter.pi
+        return pi is not None and pi.connected
+
+    def send_file(self, json_file, button, tx_pin):
+        with self.lock:
+            self._stop_hold()
+            return self.emitter.send(json_file, button, tx_pin)
+
+    def send(self, remote, button):
+        if remote not in self.remotes:
+            log.error("Unknown remote %r", remote)
+            return False
+        pin, json_file = self.remotes[remote]
+        return self.send_file(json_file, button, pin)
+
+    def hold(self, remote, button, period_us=None):
+        """Start repeating a button until release() is called."""
+        if remote not in self.remotes:
+            log.error("Unknown remote %r", remote)
+            return False
+        pin, json_file = self.remotes[remote]
+        return self.hold_file(json_file, button, pin, period_us)
+
+    def hold_file(self, json_file, button, tx_pin, period_us=None, owner=None):
+        """Start a hold on behalf of `owner` (e.g. a room's engine).
+
+        pigpio runs one chain at a time, so a new hold replaces any other.
+        """
+        with self.lock:
+            self._stop_hold()
+            self.holding = self.emitter.hold(json_file, button, tx_pin, period_us=period_us)
+            self.holder = owner if self.holding else None
+            self.hold_started = time.monotonic()
+            return self.holding
+
+    def release(self, owner=None):
+        """Stop the running hold, unless it was started by another owner."""
+        with self.lock:
+            if owner is not None and self.holder is not owner:
+                return
+            self._stop_hold()
+
+    def _stop_hold(self):
+        if self.holding:
+            remaining = self.hold_started + MIN_HOLD_SECONDS - time.monotonic()
+            if remaining > 0:
+                time.sleep(remaining)
+            self.emitter.stop()
+            self.holding = False
+            self.holder = None
+
+    def handle(self, request):
+        """Handle one decoded socket request."""
+        if "remote" in request:
+            ok = self.send(request["remote"], request["button"])
+        else:
+            ok = self.send_file(request["file"], request["button"], int(request["pin"]))
+        return {"ok": True} if ok else {"ok": False, "error": "IR send failed"}
+
+    def serve(self, path=SOCKET_PATH, background=False):
+        """Accept requests on a Unix socket."""
+        if os.path.exists(path):
+            if ping(path):
+                raise RuntimeError(f"IR service already running on {path}")
+            os.unlink(path)  # Stale socket from a previous run
+        service = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                for line in self.rfile:
+                    try:
+                        reply = service.handle(json.loads(line))
+                    except (ValueError, KeyError) as e:
+                        reply = {"ok": False, "error": f"Bad request: {e}"}
+                    self.wfile.write((json.dumps(reply) + "\n").encode())
+
+        self.server = socketserver.ThreadingUnixStreamServer(path, Handler)
+        self.server.daemon_threads = True
+        if background:
+            threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        else:
+            self.server.serve_forever()
+
+    def close(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            try:
+                os.unlink(self.server.server_address)
+            except OSError:
+                pass
+            self.server = None
+        with self.lock:
+            self.emitter.close()
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    service = IRService()
+    if not service.preload():
+        sys.exit(1)
+    print(f"IR service listening on {SOCKET_PATH}")
+    try:
+        service.serve()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.close()
+
+if __name__ == "__main__":
+    main()
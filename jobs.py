@@ -0,0 +1,214 @@
+"""Asynchronous command queue for the web app.
+
+Each output channel (HID, ADB, IR, system) of each room has one worker
+thread, so channels and rooms run in parallel while commands on the same
+channel stay strictly in submission order. Requests get a job ID back immediately and can poll
+/jobs/<id>. Jobs that span several channels or contain SLEEP= steps, and
+named macros, are compiled into a plan (see macros.py) and run by a separate
+macro worker that feeds each step to its channel, so a long macro never
+holds a request thread.
+"""
+import itertools
+import threading
+import time
+from collections import OrderedDict, deque
+
+import macros
+import metrics
+import registry
+from engine import parse_commands
+
+# How many finished jobs to remember for /jobs/<id>
+MAX_JOBS = 200
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+ERROR = 'error'
+
+
+class Job:
+    def __init__(self, job_id, command, steps, channel, delay=0.0, ref=None, plan=None, room=None):
+        self.id = job_id
+        self.ref = ref  # client-chosen tag echoed back in events
+        self.command = command
+        self.steps = steps
+        self.channel = channel
+        self.room = room
+        self.plan = plan
+        self.delay = delay
+        self.status = QUEUED
+        self.output = []
+        self.coalesced = 0
+        self.merged_refs = []  # refs of the presses folded into this job
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.done = threading.Event()
+
+    def as_json(self):
+        return {
+            'id': self.id,
+            'ref': self.ref,
+            'command': self.command,
+            'channel': self.channel,
+            'room': self.room,
+            'status': self.status,
+            'output': "\n".join(self.output),
+            'coalesced': self.coalesced,
+            'merged_refs': self.merged_refs,
+            'created': self.created,
+            'started': self.started,
+            'finished': self.finished,
+        }
+
+
+class Channel:
+    """A FIFO of jobs served by a single worker thread."""
+
+    def __init__(self, name, run, room=None):
+        self.name = name
+        self.run = run
+        self.pending = deque()
+        self.condition = threading.Condition()
+        thread_name = f"jobs-{room}-{name}" if room else f"jobs-{name}"
+        self.thread = threading.Thread(target=self._work, name=thread_name, daemon=True)
+        self.thread.start()
+
+    def put(self, job, coalesce=False):
+        """Queue a job.
+
+        With coalesce, a job identical to the one waiting at the back of the
+        queue is folded into it; the waiting job then runs once per press,
+        back to back, instead of as separate jobs. The folded job's ref is
+        kept in merged_refs so its result can still be reported.
+        """
+        with self.condition:
+            last = self.pending[-1] if self.pending else None
+            if coalesce and last is not None and last.id is not None and last.command == job.command:
+                last.coalesced += 1
+                if job.ref is not None:
+                    last.merged_refs.append(job.ref)
+                return last
+            self.pending.append(job)
+            self.condition.notify()
+            return job
+
+    def _work(self):
+        while True:
+            with self.condition:
+                while not self.pending:
+                    self.condition.wait()
+                job = self.pending.popleft()
+            self.run(job)
+
+
+class JobQueue:
+    """Job queues for every room of a DevicePool (see devices.py)."""
+
+    def __init__(self, pool):
+        self.pool = pool
+        self.jobs = OrderedDict()
+        self.lock = threading.Lock()
+        self.ids = itertools.count(1)
+        self.listeners = []
+        # (room, channel name) -> Channel
+        self.channels = {}
+        for room, _ in pool.items():
+            for name in ('hid', 'adb', 'ir', 'system'):
+                self.channels[room, name] = Channel(name, self._run_job, room)
+            self.channels[room, 'macro'] = Channel('macro', self._run_macro, room)
+
+    def submit(self, command_string, coalesce=False, delay=0.0, ref=None, room=None):
+        """Queue a command string and return its Job without waiting for it.
+
+        Raises KeyError for a room that isn't in the inventory.
+        """
+        room = self._room(room)
+        steps = parse_commands(command_string)
+        channels = {registry.channel_for(step) for step in steps}
+        if len(channels) == 1 and None not in channels:
+            channel = channels.pop()
+        else:
+            channel = 'macro'
+        job = Job(next(self.ids), command_string, steps, channel, delay, ref, room=room)
+        # Only single navigation-style presses are worth folding together
+        coalesce = coalesce and len(steps) == 1 and channel != 'macro' and self._repeatable(steps[0])
+        queued = self.channels[room, channel].put(job, coalesce=coalesce)
+        if queued is job:
+            self._remember(job)
+        return queued
+
+    def submit_plan(self, plan, ref=None, room=None):
+        """Queue a compiled macro on the room's macro worker."""
+        room = self._room(room)
+        job = Job(next(self.ids), plan.name, plan.commands(), 'macro', ref=ref, plan=plan, room=room)
+        self._remember(job)
+        return self.channels[room, 'macro'].put(job)
+
+    def depths(self):
+        """Number of jobs waiting on each channel, per room."""
+        depths = {}
+        for (room, name), channel in self.channels.items():
+            depths.setdefault(room, {})[name] = len(channel.pending)
+        return depths
+
+    def _room(self, room):
+        room = room or self.pool.default
+        if room not in self.pool.engines:
+            raise KeyError(room)
+        return room
+
+    def get(self, job_id):
+        with self.lock:
+            return self.jobs.get(job_id)
+
+    def _repeatable(self, step):
+        entry, _ = registry.lookup(step)
+        return entry is not None and entry.repeat
+
+    def _remember(self, job):
+        with self.lock:
+            self.jobs[job.id] = job
+            while len(self.jobs) > MAX_JOBS:
+                self.jobs.popitem(last=False)
+
+    def _start(self, job):
+        job.status = RUNNING
+        job.started = time.time()
+        metrics.observe('queue_wait', job.started - job.created, job.channel)
+
+    def _finish(self, job, ok):
+        job.status = DONE if ok else ERROR
+        job.finished = time.time()
+        job.done.set()
+        if job.id is not None:
+            for listener in list(self.listeners):
+                listener(job)
+
+    def _run_job(self, job):
+        """Run every step of a single-channel job on the current channel worker."""
+        self._start(job)
+        ok = True
+        for _ in range(job.coalesced + 1):
+            for step in job.steps:
+                step_ok, output = self.pool.get(job.room).run_command(step, job.delay)
+                job.output.extend(output)
+                ok = ok and step_ok
+                time.sleep(job.delay)
+        self._finish(job, ok)
+
+    def _run_macro(self, job):
+        """Run a compiled plan, handing each step to its channel's worker."""
+        self._start(job)
+        plan = job.plan or macros.compile_plan(job.steps)
+        ok, output = plan.run(lambda step: self._run_on_channel(step, job.delay, job.room))
+        job.output.extend(output)
+        self._finish(job, ok)
+
+    def _run_on_channel(self, step, delay, room):
+        """Queue one step behind whatever its channel is already doing and wait for it."""
+        sub = Job(None, step, [step], registry.channel_for(step), delay, room=room)
+        self.channels[room, sub.channel].put(sub)
+        sub.done.wait()
+        return sub.status == DONE, sub.output
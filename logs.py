@@ -0,0 +1,89 @@
+"""Logging for the web app that keeps SD card writes off the request path.
+
+Records go onto an in-memory queue and a background listener thread
+formats them and writes them to a rotating log file, so logging a command
+never waits on the card. The newest records are also kept in a ring buffer
+for the /logs endpoint. Hot paths log at DEBUG and check isEnabledFor()
+first, so they cost nothing at the default INFO level.
+
+Settings (environment):
+    LOG_FILE          log file path (default app.log)
+    LOG_LEVEL         DEBUG, INFO, WARNING... (default INFO)
+    LOG_MAX_BYTES     rotate when the file reaches this size (default 1 MB)
+    LOG_BACKUPS       rotated files to keep (default 3)
+    LOG_ROTATE_WHEN   rotate by time instead, e.g. "midnight" (default unset)
+    LOG_RING          records kept in memory for /logs, 0 to disable (default 500)
+"""
+import atexit
+import logging
+import logging.handlers
+import os
+import queue
+from collections import deque
+
+LOG_FILE = os.environ.get("LOG_FILE", "app.log")
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO").upper()
+LOG_MAX_BYTES = int(os.environ.get("LOG_MAX_BYTES", str(1024 * 1024)))
+LOG_BACKUPS = int(os.environ.get("LOG_BACKUPS", "3"))
+LOG_ROTATE_WHEN = os.environ.get("LOG_ROTATE_WHEN")
+LOG_RING = int(os.environ.get("LOG_RING", "500"))
+
+FORMAT = '%(asctime)s %(levelname)s: %(message)s'
+
+
+class RingBuffer(logging.Handler):
+    """Keeps the newest records in memory."""
+
+    def __init__(self, size=LOG_RING):
+        super().__init__()
+        self.records = deque(maxlen=size)
+
+    def emit(self, record):
+        entry = {
+            'time': record.created,
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        self.records.append(entry)  # handle() already holds the handler lock
+
+    def recent(self, limit=100, level=logging.NOTSET):
+        records = [r for r in list(self.records) if logging.getLevelName(r['level']) >= level]
+        return records[-limit:]
+
+
+ring = None
+listener = None
+
+def file_handler(path=LOG_FILE):
+    if LOG_ROTATE_WHEN:
+        handler = logging.handlers.TimedRotatingFileHandler(path, when=LOG_ROTATE_WHEN, backupCount=LOG_BACKUPS)
+    else:
+        handler = logging.handlers.RotatingFileHandler(path, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUPS)
+    handler.setFormatter(logging.Formatter(FORMAT))
+    return handler
+
+def setup(path=LOG_FILE, level=LOG_LEVEL):
+    """Route the root logger through a queue to the file and ring buffer (once)."""
+    global ring, listener
+    if listener is not None:
+        return listener
+    handlers = [file_handler(path)]
+    if LOG_RING > 0:
+        ring = RingBuffer(LOG_RING)
+        handlers.append(ring)
+    log_queue = queue.SimpleQueue()
+    root = logging.getLogger()
+    root.setLevel(level)
+    root.addHandler(logging.handlers.QueueHandler(log_queue))
+    listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    # Flush what's still queued on shutdown
+    atexit.register(listener.stop)
+    return listener
+
+def recent(limit=100, level=logging.NOTSET):
+    """Newest records from the ring buffer, oldest first."""
+    if ring is None:
+        return []
+    return ring.recent(limit, level)
@@ -0,0 +1,199 @@
+"""Named command macros compiled into timed execution plans.
+
+A macro is a list of commands from macros.json, e.g. "movie night" =
+TVPOWER, SOUNDBARON, SLEEP=8, NETFLIX. Each macro is compiled once into a
+Plan in which every step has a start offset from the beginning of the run
+and a list of earlier steps it has to wait for:
+
+- steps for the same device (the Firestick, the TV, the soundbar) keep
+  their order;
+- steps for different devices between two SLEEPs start together;
+- SLEEP=<seconds> moves the start offset of everything after it and waits
+  for everything before it. Offsets are absolute deadlines, so a slow step
+  makes the next step late but doesn't push the rest of the macro back.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from collections import namedtuple
+
+import registry
+from engine import parse_commands
+
+log = logging.getLogger(__name__)
+
+MACROS_FILE = os.environ.get("MACROS_FILE", os.path.join(os.path.dirname(os.path.abspath(__file__)), "macros.json"))
+
+# Device each command kind talks to; IR and ENSURE commands name their device
+DEVICES = {
+    registry.ADB_KEY: 'firestick',
+    registry.ADB_INTENT: 'firestick',
+    registry.HID_KEY: 'firestick',
+    registry.SYSTEM: 'system',
+}
+
+# at: seconds after the start of the run; after: indexes of steps that must finish first
+Step = namedtuple('Step', 'index command channel device at after')
+
+def device_for(command):
+    """Device a command acts on; text that isn't a command is typed on the Firestick."""
+    entry, value = registry.lookup(command)
+    if entry is None:
+        return 'firestick'
+    if entry.kind in (registry.IR, registry.ENSURE):
+        return value[0]
+    return DEVICES[entry.kind]
+
+
+class Plan:
+    """A compiled macro: steps with start offsets and dependencies."""
+
+    def __init__(self, steps, duration, name=None, description=''):
+        self.steps = steps
+        self.duration = duration
+        self.name = name
+        self.description = description
+
+    def commands(self):
+        return [step.command for step in self.steps]
+
+    def timeline(self):
+        """Planned schedule, one line per step (used for dry runs)."""
+        title = f"Macro '{self.name}'" if self.name else "Plan"
+        lines = [f"{title}: {len(self.steps)} steps, {self.duration:.3f}s of waits"]
+        for step in self.steps:
+            after = f"  after {', '.join(str(i + 1) for i in step.after)}" if step.after else ""
+            lines.append(f"  {step.index + 1:>2}  +{step.at:7.3f}s  {step.device:<10} {step.channel:<7} "
+                         f"{step.command}{after}")
+        return "\n".join(lines)
+
+    def as_json(self):
+        return {
+            'name': self.name,
+            'description': self.description,
+            'duration': self.duration,
+            'steps': [step._asdict() for step in self.steps],
+        }
+
+    def run(self, run_step):
+        """Run the plan; `run_step(command)` returns (success, output lines).
+
+        Each device gets one thread that takes its steps in order, waits for
+        the steps they depend on and then for their deadline on the
+        monotonic clock. Returns (success, output) with output in step order.
+        """
+        done = [threading.Event() for _ in self.steps]
+        results = [None] * len(self.steps)
+        lanes = {}
+        for step in self.steps:
+            lanes.setdefault(step.device, []).append(step)
+
+        def work(steps):
+            for step in steps:
+                for index in step.after:
+                    done[index].wait()
+                remaining = start + step.at - time.monotonic()
+                if remaining > 0:
+                    time.sleep(remaining)
+                try:
+                    results[step.index] = run_step(step.command)
+                except Exception as e:
+                    results[step.index] = (False, [f"Error executing '{step.command}': {e}"])
+                done[step.index].set()
+
+        start = time.monotonic()
+        threads = [threading.Thread(target=work, args=(steps,), name=f"macro-{device}", daemon=True)
+                   for device, steps in lanes.items()]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        # Trailing SLEEPs still count towards the macro's length
+        remaining = start + self.duration - time.monotonic()
+        if remaining > 0:
+            time.sleep(remaining)
+
+        output = []
+        for ok, lines in results:
+            output.extend(lines)
+        return all(ok for ok, _ in results), output
+
+
+def compile_plan(commands, name=None, description=''):
+    """Compile a list of parsed commands into a Plan."""
+    steps = []
+    offset = 0.0
+    last = {}  # device -> index of its most recent step
+    barrier = ()
+    for command in commands:
+        entry, value = registry.lookup(command)
+        if entry is not None and entry.kind == registry.SLEEP:
+            offset += value
+            # Each device's steps are chained, so its last step covers all of them
+            barrier = tuple(sorted(last.values()))
+            continue
+        device = device_for(command)
+        after = set(barrier)
+        if device in last:
+            after.add(last[device])
+        step = Step(len(steps), command, registry.channel_for(command), device, offset, tuple(sorted(after)))
+        last[device] = step.index
+        steps.append(step)
+    return Plan(steps, offset, name=name, description=description)
+
+
+class MacroStore:
+    """Macros from the config file, compiled once and recompiled when it changes."""
+
+    def __init__(self, path=MACROS_FILE):
+        self.path = path
+        self.mtime = None
+        self.plans = {}
+        self.error = None
+        self.lock = threading.Lock()
+
+    def load(self):
+        """Return {name: Plan}, reloading the file only if it was modified."""
+        with self.lock:
+            try:
+                mtime = os.stat(self.path).st_mtime
+            except OSError:
+                self.mtime, self.plans = None, {}
+                return self.plans
+            if mtime != self.mtime:
+                try:
+                    self.plans = self._compile()
+                    self.error = None
+                except (OSError, ValueError, KeyError, TypeError) as e:
+                    self.plans = {}
+                    self.error = f"Error loading {self.path}: {e}"
+                    log.error(self.error)
+                self.mtime = mtime
+            return self.plans
+
+    def _compile(self):
+        with open(self.path) as f:
+            config = json.load(f)
+        plans = {}
+        for name, spec in config.items():
+            # Either a list/string of steps or {"description": ..., "steps": ...}
+            if isinstance(spec, dict):
+                description, steps = spec.get('description', ''), spec['steps']
+            else:
+                description, steps = '', spec
+            if isinstance(steps, str):
+                steps = parse_commands(steps)
+            plans[name] = compile_plan(steps, name=name, description=description)
+        return plans
+
+    def get(self, name):
+        return self.load().get(name)
+
+    def as_json(self):
+        """Macro list for the /macros endpoint."""
+        return {
+            'macros': [plan.as_json() for plan in self.load().values()],
+            'error': self.error,
+        }
@@ -0,0 +1,117 @@
+"""Latency histograms for every stage of a command.
+
+Each stage (queue wait, dispatch, ADB round trip, HID write, IR wave build
+and transmit) records its duration into a fixed-bucket histogram: one
+bisect and a few integer adds per observation, and memory that doesn't
+grow with traffic. The web app serves them at /metrics in Prometheus text
+format and as a JSON summary at /metrics/summary.
+"""
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+# Bucket upper bounds in seconds, from sub-millisecond HID writes to slow reboots
+BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0,
+           10.0)
+
+METRIC = "remote_stage_seconds"
+
+
+class Histogram:
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # Last slot is +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+        self.lock = threading.Lock()
+
+    def observe(self, seconds):
+        index = bisect.bisect_left(self.buckets, seconds)
+        with self.lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.sum += seconds
+            if seconds > self.max:
+                self.max = seconds
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-th quantile (the max for the last bucket)."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def summary(self):
+        return {
+            'count': self.count,
+            'mean_ms': round(self.sum / self.count * 1000, 3) if self.count else 0.0,
+            'p50_ms': round(self.quantile(0.5) * 1000, 3),
+            'p95_ms': round(self.quantile(0.95) * 1000, 3),
+            'p99_ms': round(self.quantile(0.99) * 1000, 3),
+            'max_ms': round(self.max * 1000, 3),
+        }
+
+
+# (stage, channel) -> Histogram
+HISTOGRAMS = {}
+_lock = threading.Lock()
+
+def histogram(stage, channel=None):
+    key = (stage, channel)
+    found = HISTOGRAMS.get(key)
+    if found is None:
+        with _lock:
+            found = HISTOGRAMS.setdefault(key, Histogram())
+    return found
+
+def observe(stage, seconds, channel=None):
+    histogram(stage, channel).observe(seconds)
+
+@contextmanager
+def timed(stage, channel=None):
+    """Record how long the block takes, even if it raises."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(stage, time.perf_counter() - start, channel)
+
+def _labels(stage, channel, **extra):
+    labels = {'stage': stage}
+    if channel:
+        labels['channel'] = channel
+    labels.update(extra)
+    return "{" + ",".join(f'{key}="{value}"' for key, value in labels.items()) + "}"
+
+def prometheus():
+    """All histograms in Prometheus text exposition format."""
+    lines = [f"# HELP {METRIC} Time spent in each stage of a remote command.", f"# TYPE {METRIC} histogram"]
+    for (stage, channel), hist in sorted(HISTOGRAMS.items(), key=lambda item: (item[0][0], item[0][1] or '')):
+        with hist.lock:
+            counts, total, count = list(hist.counts), hist.sum, hist.count
+        cumulative = 0
+        for bound, bucket in zip(hist.buckets, counts):
+            cumulative += bucket
+            lines.append(f"{METRIC}_bucket{_labels(stage, channel, le=f'{bound:g}')} {cumulative}")
+        lines.append(f"{METRIC}_bucket{_labels(stage, channel, le='+Inf')} {count}")
+        lines.append(f"{METRIC}_sum{_labels(stage, channel)} {total:.6f}")
+        lines.append(f"{METRIC}_count{_labels(stage, channel)} {count}")
+    return "\n".join(lines) + "\n"
+
+def summary():
+    """Per-stage count, mean and percentiles in milliseconds."""
+    return [
+        dict(stage=stage, channel=channel, **hist.summary())
+        for (stage, channel), hist in sorted(HISTOGRAMS.items(), key=lambda item: (item[0][0], item[0][1] or ''))
+    ]
+
+def reset():
+    with _lock:
+        HISTOGRAMS.clear()
@@ -0,0 +1,147 @@
+"""Declarative table of every command the remote understands.
+
+The engine dispatch, `send_keystrokes.py -commands`, the /commands endpoint
+and the web UI button map are all generated from COMMANDS, so adding a
+button means adding one line here.
+"""
+import re
+from collections import namedtuple
+
+# Command kinds
+ADB_KEY = 'adb_key'        # value: Android keyevent code
+ADB_INTENT = 'adb_intent'  # value: (component, action or None)
+HID_KEY = 'hid_key'        # value: USB HID usage ID
+IR = 'ir'                  # value: (ir device, button name in the remote JSON)
+SYSTEM = 'system'          # value: engine action name
+SLEEP = 'sleep'            # value: seconds, parsed from SLEEP=<seconds>
+ENSURE = 'ensure'          # value: (device, state field, wanted value, command that changes it)
+
+# Output channel each kind runs on. Channels work in parallel with each other
+# but every channel runs its own commands strictly in order.
+# ENSURE commands run on the channel of the command they send.
+CHANNELS = {ADB_KEY: 'adb', ADB_INTENT: 'adb', HID_KEY: 'hid', IR: 'ir', SYSTEM: 'system', SLEEP: None}
+
+# repeat: the command may be held down (press/release) to auto-repeat
+Command = namedtuple('Command', 'name kind value group button aliases repeat', defaults=(None, (), False))
+
+COMMANDS = [
+    # Firestick navigation (HID keyboard)
+    Command('UP', HID_KEY, 0x52, 'Navigation', 'FireUp', repeat=True),
+    Command('DOWN', HID_KEY, 0x51, 'Navigation', 'FireDown', repeat=True),
+    Command('LEFT', HID_KEY, 0x50, 'Navigation', 'FireLeft', repeat=True),
+    Command('RIGHT', HID_KEY, 0x4F, 'Navigation', 'FireRight', repeat=True),
+    Command('ENTER', HID_KEY, 0x28, 'Navigation', 'FireSelect'),
+    Command('ESC', HID_KEY, 0x29, 'Navigation', 'FireBack'),
+
+    # Firestick keyevents (ADB)
+    Command('HOME', ADB_KEY, 3, 'Firestick', 'FireHome'),
+    Command('MENU', ADB_KEY, 82, 'Firestick', 'FireMenu'),
+    Command('PLAYPAUSE', ADB_KEY, 85, 'Firestick', 'FirePlayPause'),
+    Command('REWIND', ADB_KEY, 89, 'Firestick', 'FireRewind', repeat=True),
+    Command('FASTFORWARD', ADB_KEY, 90, 'Firestick', 'FireFastForward', repeat=True),
+    Command('FIRESLEEP', ADB_KEY, 223, 'Firestick', 'FireSleep'),
+    Command('FIREWAKE', ADB_KEY, 224, 'Firestick', 'FireWake', aliases=('FIREWAKEUP',)),
+    Command('FIREPOWER', ADB_KEY, 26, 'Firestick'),
+    Command('FIREVOLUP', ADB_KEY, 24, 'Firestick', repeat=True),
+    Command('FIREVOLDOWN', ADB_KEY, 25, 'Firestick', repeat=True),
+    Command('FIREMUTE', ADB_KEY, 164, 'Firestick'),
+    Command('FIRESETTINGS', ADB_KEY, 176, 'Firestick'),
+
+    # App launchers (ADB intents)
+    Command('PLEX', ADB_INTENT, ('com.plexapp.android/com.plexapp.plex.activities.SplashActivity', None), 'Apps', 'Plex'),
+    Command('YOUTUBE', ADB_INTENT, ('com.amazon.firetv.youtube/dev.cobalt.app.MainActivity', None), 'Apps', 'YouTube'),
+    Command('PRIME', ADB_INTENT, ('com.amazon.firebat/com.amazon.firebatcore.deeplink.DeepLinkRoutingActivity',
+                                  'com.amazon.firebat.action.YAC_LAUNCH'), 'Apps', 'Prime'),
+    Command('NETFLIX', ADB_INTENT, ('com.netflix.ninja/.MainActivity', None), 'Apps', 'Netflix'),
+    Command('HULU', ADB_INTENT, ('com.hulu.plus/.SplashActivity', None), 'Apps', 'Hulu'),
+    Command('HBO', ADB_INTENT, ('com.hbo.hbonow/com.wbd.beam.BeamActivity', None), 'Apps', 'HBO'),
+    Command('DISCOVERYPLUS', ADB_INTENT, ('com.discovery.discoveryplus.firetv/com.wbd.beam.BeamActivity', None), 'Apps', 'DiscoveryPlus'),
+    Command('PARAMOUNTPLUS', ADB_INTENT, ('com.cbs.ott/com.paramount.android.pplus.features.splash.tv.SplashMediatorActivity', None),
+            'Apps', 'ParamountPlus'),
+    Command('APPLETV', ADB_INTENT, ('com.apple.atve.amazon.appletv/.MainActivity', None), 'Apps', 'AppleTV'),
+
+    # Soundbar (IR)
+    Command('SOUNDBARON', IR, ('soundbar', 'Power'), 'Soundbar', 'SoundbarOn'),
+    Command('SOUNDBARVOLMUTE', IR, ('soundbar', 'Mute'), 'Soundbar', 'SoundbarVolMute'),
+    Command('SOUNDBARINPUT', IR, ('soundbar', 'Input'), 'Soundbar', 'SoundbarInput'),
+    Command('SOUNDBARVOLUP', IR, ('soundbar', 'VolumeUp'), 'Soundbar', 'SoundbarVolUp', repeat=True),
+    Command('SOUNDBARVOLDOWN', IR, ('soundbar', 'VolumeDown'), 'Soundbar', 'SoundbarVolDown', repeat=True),
+    Command('SOUNDBARSUBVOLUP', IR, ('soundbar', 'SubVolUp'), 'Soundbar', 'SoundbarSubVolUp', repeat=True),
+    Command('SOUNDBARSUBVOLDOWN', IR, ('soundbar', 'SubVolDown'), 'Soundbar', 'SoundbarSubVolDown', repeat=True),
+
+    # TV (IR)
+    Command('TVPOWER', IR, ('tv', 'Power'), 'TV', 'TVPower'),
+    # No Input capture in tlc_tv.json yet; give it a button once there is one
+    Command('TVINPUT', IR, ('tv', 'Input'), 'TV', None),
+    Command('TVUP', IR, ('tv', 'Up'), 'TV', 'TVUp', repeat=True),
+    Command('TVDOWN', IR, ('tv', 'Down'), 'TV', 'TVDown', repeat=True),
+    Command('TVLEFT', IR, ('tv', 'Left'), 'TV', 'TVLeft', repeat=True),
+    Command('TVRIGHT', IR, ('tv', 'Right'), 'TV', 'TVRight', repeat=True),
+    Command('TVSELECT', IR, ('tv', 'Select'), 'TV', 'TVSelect'),
+    Command('TVBACK', IR, ('tv', 'Return'), 'TV', 'TVBack'),
+    Command('TVMENU', IR, ('tv', 'Home'), 'TV', 'TVMenu'),
+    Command('TVSETTINGS', IR, ('tv', 'Menu'), 'TV'),
+    Command('TVMUTE', IR, ('tv', 'VolumeMute'), 'TV', 'TVVolMute', aliases=('TVVOLMUTE',)),
+    Command('TVVOLUP', IR, ('tv', 'VolumeUp'), 'TV', 'TVVolUp', repeat=True),
+    Command('TVVOLDOWN', IR, ('tv', 'VolumeDown'), 'TV', 'TVVolDown', repeat=True),
+
+    # Idempotent state changes: only send the command if the state cache
+    # (state.py) doesn't already show the wanted value
+    Command('ENSURETVON', ENSURE, ('tv', 'power', True, 'TVPOWER'), 'State'),
+    Command('ENSURETVOFF', ENSURE, ('tv', 'power', False, 'TVPOWER'), 'State'),
+    Command('ENSURETVUNMUTED', ENSURE, ('tv', 'mute', False, 'TVMUTE'), 'State'),
+    Command('ENSURESOUNDBARON', ENSURE, ('soundbar', 'power', True, 'SOUNDBARON'), 'State'),
+    Command('ENSURESOUNDBAROFF', ENSURE, ('soundbar', 'power', False, 'SOUNDBARON'), 'State'),
+    Command('ENSURESOUNDBARUNMUTED', ENSURE, ('soundbar', 'mute', False, 'SOUNDBARVOLMUTE'), 'State'),
+    Command('ENSUREFIREON', ENSURE, ('firestick', 'power', True, 'FIREWAKE'), 'State'),
+    Command('ENSUREFIREOFF', ENSURE, ('firestick', 'power', False, 'FIRESLEEP'), 'State'),
+
+    # System
+    Command('FIREREBOOT', SYSTEM, 'reboot_firestick', 'System', 'FireReboot'),
+    Command('RPIREBOOT', SYSTEM, 'reboot_pi', 'System', 'RpiReboot'),
+]
+
+# Built once at import: every name and alias maps straight to its entry
+REGISTRY = {}
+for _command in COMMANDS:
+    REGISTRY[_command.name] = _command
+    for _alias in _command.aliases:
+        REGISTRY[_alias] = _command
+
+SLEEP_RE = re.compile(r'SLEEP=(\d*\.?\d+)$', re.IGNORECASE)
+SLEEP_COMMAND = Command('SLEEP', SLEEP, None, 'Timing')
+
+def lookup(command):
+    """Return (entry, argument) for a command, or (None, None) for text to type."""
+    entry = REGISTRY.get(command.upper())
+    if entry is not None:
+        return entry, entry.value
+    sleep_match = SLEEP_RE.match(command)
+    if sleep_match:
+        return SLEEP_COMMAND, float(sleep_match.group(1))
+    return None, None
+
+def channel_for(command):
+    """Channel a command runs on; anything not in the registry is typed over HID."""
+    entry, value = lookup(command)
+    if entry is None:
+        return 'hid'
+    if entry.kind == ENSURE:
+        return channel_for(value[3])
+    return CHANNELS[entry.kind]
+
+def button_map():
+    """Map web UI button ids to command names."""
+    return {c.button: c.name for c in COMMANDS if c.button}
+
+def as_json():
+    """Registry contents for the /commands endpoint."""
+    return {
+        'commands': [
+            {'name': c.name, 'kind': c.kind, 'group': c.group, 'button': c.button, 'aliases': list(c.aliases),
+             'repeat': c.repeat}
+            for c in COMMANDS
+        ],
+        'buttons': button_map(),
+        'repeat': [c.name for c in COMMANDS if c.repeat],
+    }
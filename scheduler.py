@@ -0,0 +1,348 @@
+"""Automations: command sequences run on a schedule or when a device changes state.
+
+automations.json (see automations.example.json) names each automation,
+what it runs and when:
+
+    {
+        "lights out": {"cron": "30 1 * * *", "macro": "all off"},
+        "soundbar follows firestick": {
+            "when": {"device": "firestick", "field": "power", "to": false},
+            "after": 30,
+            "steps": ["ENSURESOUNDBAROFF"]
+        }
+    }
+
+- "cron" is minute, hour, day of month, month and day of week in local
+  time, with *, lists, ranges and /steps, or @hourly, @daily, @weekly,
+  @monthly, @yearly. As in cron, when both day fields are restricted a day
+  matching either one runs.
+- "when" fires as a state field changes from another known value to "to";
+  the first value seen after startup doesn't count. With "after", the run
+  waits that many seconds and is dropped if the field has changed again.
+- "steps" (a list or a command string) or "macro" (a name from
+  macros.json) is what runs.
+- "room" picks the room, which must be in devices.json. Without it
+  scheduled runs use the default room and state triggers run in the room
+  whose device changed.
+
+ENSURE steps for the TV and soundbar only send their power or mute toggle
+when that field is known (see state.py), so an unattended "all off" never
+switches on something that was already off.
+
+Runs are compiled into plans and queued on the room's macro worker (see
+jobs.py), so they go out over the HID gadget, ADB shell and IR service the
+web app already has open. One thread waits on a single heap of deadlines for
+every automation. It wakes at least every MAX_SLEEP seconds to reload the
+file and to notice the wall clock jumping (NTP setting the time on a Pi
+without a real-time clock), which reschedules everything. A scheduled run
+found more than MISFIRE_GRACE seconds late is skipped.
+"""
+import heapq
+import itertools
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+from engine import parse_commands
+from macros import compile_plan
+import metrics
+
+AUTOMATIONS_FILE = os.environ.get("AUTOMATIONS_FILE",
+                                  os.path.join(os.path.dirname(os.path.abspath(__file__)), "automations.json"))
+
+MISFIRE_GRACE = 60.0
+MAX_SLEEP = 30.0
+
+log = logging.getLogger(__name__)
+
+ALIASES = {
+    '@yearly': '0 0 1 1 *',
+    '@annually': '0 0 1 1 *',
+    '@monthly': '0 0 1 * *',
+    '@weekly': '0 0 * * 0',
+    '@daily': '0 0 * * *',
+    '@midnight': '0 0 * * *',
+    '@hourly': '0 * * * *',
+}
+
+MONTHS = {name: number for number, name in enumerate(
+    ('jan', 'feb', 'mar', 'apr', 'may', 'jun', 'jul', 'aug', 'sep', 'oct', 'nov', 'dec'), 1)}
+WEEKDAYS = {name: number for number, name in enumerate(('sun', 'mon', 'tue', 'wed', 'thu', 'fri', 'sat'))}
+
+# (low, high, names) for minute, hour, day of month, month, day of week (7 is Sunday too)
+FIELDS = ((0, 59, {}), (0, 23, {}), (1, 31, {}), (1, 12, MONTHS), (0, 7, WEEKDAYS))
+
+def parse_field(text, low, high, names):
+    """Set of values matched by one cron field, e.g. '1-5', '*/15' or 'mon,wed'."""
+    values = set()
+    for part in text.lower().split(','):
+        part, slash, step = part.partition('/')
+        step = int(step) if slash else 1
+        if part == '*':
+            start, end = low, high
+        else:
+            first, dash, last = part.partition('-')
+            start = names[first] if first in names else int(first)
+            end = (names[last] if last in names else int(last)) if dash else (high if slash else start)
+        if not low <= start <= end <= high or step < 1:
+            raise ValueError(f"'{text}' is outside {low}-{high}")
+        values.update(range(start, end + 1, step))
+    return values
+
+
+class Cron:
+    """A parsed five-field cron expression."""
+
+    def __init__(self, expression):
+        self.expression = expression
+        fields = ALIASES.get(expression.strip().lower(), expression).split()
+        if len(fields) != 5:
+            raise ValueError(f"Cron expression '{expression}' needs five fields")
+        (self.minutes, self.hours, self.days, self.months, weekdays) = (
+            parse_field(text, *spec) for text, spec in zip(fields, FIELDS))
+        self.weekdays = {day % 7 for day in weekdays}
+        self.any_day = fields[2].startswith('*') or fields[4].startswith('*')
+        self.next(time.time())  # Raises for dates that never come, like 31 2 *
+
+    def day_matches(self, moment):
+        day = moment.day in self.days
+        weekday = moment.isoweekday() % 7 in self.weekdays
+        return (day and weekday) if self.any_day else (day or weekday)
+
+    def next(self, after):
+        """First matching minute after the timestamp `after`, as a timestamp."""
+        moment = datetime.fromtimestamp(after).replace(second=0, microsecond=0) + timedelta(minutes=1)
+        # Leap days can be four years away; anything rarer never comes
+        limit = moment + timedelta(days=5 * 366)
+        while moment < limit:
+            if moment.month not in self.months:
+                moment = (moment.replace(day=1, hour=0, minute=0) + timedelta(days=32)).replace(day=1)
+            elif not self.day_matches(moment):
+                moment = moment.replace(hour=0, minute=0) + timedelta(days=1)
+            elif moment.hour not in self.hours:
+                moment = moment.replace(minute=0) + timedelta(hours=1)
+            elif moment.minute not in self.minutes:
+                moment += timedelta(minutes=1)
+            else:
+                return moment.timestamp()
+        raise ValueError(f"Cron expression '{self.expression}' never matches")
+
+
+class Automation:
+    def __init__(self, name, spec):
+        self.name = name
+        self.description = spec.get('description', '')
+        self.room = spec.get('room')
+        self.cron = Cron(spec['cron']) if 'cron' in spec else None
+        when = spec.get('when')
+        self.when = (when['device'], when['field'], when['to']) if when is not None else None
+        self.after = float(spec.get('after', 0))
+        if self.cron is None and self.when is None:
+            raise ValueError(f"Automation '{name}' needs a cron schedule or a when trigger")
+        self.macro = spec.get('macro')
+        steps = spec.get('steps')
+        if (steps is None) == (self.macro is None):
+            raise ValueError(f"Automation '{name}' needs either steps or a macro")
+        if isinstance(steps, str):
+            steps = parse_commands(steps)
+        self.plan = compile_plan(steps, name=name, description=self.description) if steps is not None else None
+        self.next_run = None
+        self.last_run = None
+        self.last_job = None
+
+    def as_json(self):
+        return {
+            'name': self.name,
+            'description': self.description,
+            'room': self.room,
+            'cron': self.cron.expression if self.cron else None,
+            'when': dict(zip(('device', 'field', 'to'), self.when)) if self.when else None,
+            'after': self.after,
+            'macro': self.macro,
+            'steps': self.plan.commands() if self.plan else None,
+            'next_run': self.next_run,
+            'last_run': self.last_run,
+            'last_job': self.last_job,
+        }
+
+
+class Scheduler:
+    """Runs automations.json on a JobQueue (see jobs.py), reloading it when it changes."""
+
+    def __init__(self, jobs, pool, macro_store=None, path=AUTOMATIONS_FILE):
+        self.jobs = jobs
+        self.pool = pool
+        self.macro_store = macro_store
+        self.path = path
+        self.automations = {}
+        self.mtime = None
+        self.error = None
+        # (due timestamp, sequence, automation name, room, 'cron' or 'state', generation)
+        self.heap = []
+        self.sequence = itertools.count()
+        # Bumped on every reschedule; entries from an older generation are dropped
+        self.generation = 0
+        self.clock_offset = time.time() - time.monotonic()
+        self.previous = {}  # room -> last state snapshot seen
+        self.condition = threading.Condition()
+        self.reload_lock = threading.Lock()
+        self.stopping = False
+        self.thread = None
+
+    def start(self):
+        """Load the automations, follow every room's state and start the timer thread."""
+        self.reload()
+        for room, engine in self.pool.items():
+            self.previous[room] = engine.state.snapshot()
+            engine.state.listeners.append(lambda state, room=room: self.state_changed(room, state))
+        self.thread = threading.Thread(target=self._run, name="scheduler", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        with self.condition:
+            self.stopping = True
+            self.condition.notify()
+
+    def reload(self):
+        """Reload automations.json if it changed; returns True if it did."""
+        with self.reload_lock:
+            try:
+                mtime = os.stat(self.path).st_mtime
+            except OSError:
+                mtime = None
+            if mtime == self.mtime:
+                return False
+            automations, error = {}, None
+            if mtime is not None:
+                try:
+                    automations = self._load()
+                except (OSError, ValueError, KeyError, TypeError) as e:
+                    error = f"Error loading {self.path}: {e}"
+                    log.error(error)
+            with self.condition:
+                self.mtime, self.error, self.automations = mtime, error, automations
+                self._reschedule()
+        log.info("Loaded %d automations from %s", len(automations), self.path)
+        return True
+
+    def _load(self):
+        with open(self.path) as f:
+            config = json.load(f)
+        fields = self.pool.get().state.snapshot()
+        automations = {}
+        for name, spec in config.items():
+            automation = Automation(name, spec)
+            if automation.when is not None:
+                device, field, _ = automation.when
+                if field not in fields.get(device, {}):
+                    raise KeyError(f"{device}.{field} in automation '{name}'")
+            if automation.room is not None and automation.room not in self.pool.engines:
+                raise KeyError(f"room '{automation.room}' in automation '{name}'")
+            automations[name] = automation
+        return automations
+
+    def _push(self, due, name, room, reason):
+        heapq.heappush(self.heap, (due, next(self.sequence), name, room, reason, self.generation))
+
+    def _reschedule(self):
+        """Start a new generation: next cron runs from now, pending state triggers kept."""
+        self.generation += 1
+        pending = [entry for entry in self.heap if entry[4] == 'state' and entry[2] in self.automations]
+        self.heap = []
+        for due, _, name, room, reason, _ in pending:
+            self._push(due, name, room, reason)
+        now = time.time()
+        for automation in self.automations.values():
+            if automation.cron is not None:
+                automation.next_run = automation.cron.next(now)
+                self._push(automation.next_run, automation.name, automation.room, 'cron')
+        self.condition.notify()
+
+    def state_changed(self, room, state):
+        """DeviceState listener: queue the automations this change triggers."""
+        now = time.time()
+        with self.condition:
+            previous, self.previous[room] = self.previous.get(room, {}), state
+            for automation in self.automations.values():
+                if automation.when is None or automation.room not in (None, room):
+                    continue
+                device, field, wanted = automation.when
+                before = previous.get(device, {}).get(field)
+                if before is not None and before != wanted and state[device][field] == wanted:
+                    self._push(now + automation.after, automation.name, room, 'state')
+            self.condition.notify()
+
+    def _run(self):
+        while True:
+            with self.condition:
+                if self.stopping:
+                    return
+                entry = None
+                now = time.time()
+                offset = now - time.monotonic()
+                if abs(offset - self.clock_offset) > MISFIRE_GRACE:
+                    log.info("Clock moved by %.0fs, rescheduling automations", offset - self.clock_offset)
+                    self.clock_offset = offset
+                    self._reschedule()
+                elif self.heap and self.heap[0][0] <= now:
+                    entry = heapq.heappop(self.heap)
+                else:
+                    self.condition.wait(min(self.heap[0][0] - now, MAX_SLEEP) if self.heap else MAX_SLEEP)
+            if entry is None:
+                self.reload()
+            else:
+                self._fire(*entry)
+
+    def _fire(self, due, _, name, room, reason, generation):
+        with self.condition:
+            automation = self.automations.get(name)
+            if automation is None or generation != self.generation:
+                return
+            late = time.time() - due
+            if reason == 'cron':
+                automation.next_run = automation.cron.next(time.time())
+                self._push(automation.next_run, name, automation.room, 'cron')
+        if reason == 'cron':
+            if late > MISFIRE_GRACE:
+                log.warning("Skipped automation '%s', %.0fs late", name, late)
+                return
+            metrics.observe('schedule_lateness', late)
+        elif automation.after:
+            device, field, wanted = automation.when
+            if self.pool.get(room).state.get(device, field) != wanted:
+                log.info("Dropped automation '%s': %s %s changed again", name, device, field)
+                return
+        self.run(name, room)
+
+    def run(self, name, room=None):
+        """Queue an automation now; returns its Job, or None if it can't run.
+
+        Raises KeyError for an unknown automation.
+        """
+        automation = self.automations[name]
+        plan = automation.plan
+        if plan is None:
+            plan = self.macro_store.get(automation.macro) if self.macro_store is not None else None
+            if plan is None:
+                log.error("Automation '%s' runs unknown macro '%s'", name, automation.macro)
+                return None
+        try:
+            job = self.jobs.submit_plan(plan, ref=f"automation:{name}", room=automation.room or room)
+        except KeyError:
+            log.error("Automation '%s' names unknown room '%s'", name, automation.room or room)
+            return None
+        automation.last_run = time.time()
+        automation.last_job = job.id
+        log.info('Automation: %s | Job: %s | Room: %s', name, job.id, job.room)
+        return job
+
+    def as_json(self):
+        """Automation list for the /automations endpoint."""
+        self.reload()
+        return {
+            'automations': [automation.as_json() for automation in self.automations.values()],
+            'error': self.error,
+        }
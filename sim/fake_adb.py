@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""Stand-in for the adb binary used when running off the Pi.
+
+Every command is appended to the file named by FAKE_ADB_LOG (if set) and
+FAKE_ADB_LATENCY seconds are slept per command to mimic the network hop.
+`adb shell` with no arguments behaves like the persistent session used by
+adb.AdbShell; FAKE_ADB_DROP_AFTER closes it after that many commands so
+reconnects can be exercised, and FAKE_ADB_ECHO=1 echoes every input line
+back first, like a shell on a PTY.
+
+Several Firesticks can be faked at once: every logged line starts with the
+`-s` serial (or the address given to `connect`), and addresses listed in
+FAKE_ADB_OFFLINE (comma-separated) refuse to connect.
+
+The shell also keeps a little device state: keyevents 26/223/224 change
+the power state and `am start -n` the foreground app, and `dumpsys power`
+and `dumpsys window` report them the way a Firestick does.
+
+Every `input` call sleeps FAKE_ADB_INPUT_LATENCY more seconds, like the
+real tool starting up on the device. What `input text` and the ENTER/TAB
+keyevents type is appended to FAKE_ADB_TYPED (if set) after undoing the
+%s escaping, so text entry can be checked end to end.
+"""
+import os
+import shlex
+import sys
+import time
+
+LOG = os.environ.get("FAKE_ADB_LOG")
+LATENCY = float(os.environ.get("FAKE_ADB_LATENCY", "0"))
+DROP_AFTER = int(os.environ.get("FAKE_ADB_DROP_AFTER", "0"))
+ECHO = os.environ.get("FAKE_ADB_ECHO") == "1"
+OFFLINE = set(filter(None, os.environ.get("FAKE_ADB_OFFLINE", "").split(",")))
+INPUT_LATENCY = float(os.environ.get("FAKE_ADB_INPUT_LATENCY", "0"))
+TYPED = os.environ.get("FAKE_ADB_TYPED")
+
+serial = None
+
+def record(line):
+    if LOG:
+        with open(LOG, "a") as f:
+            f.write(f"{serial or '-'} {line}\n")
+
+# Power state and foreground app of the pretend Firestick
+device = {'awake': True, 'app': 'com.amazon.tv.launcher/.ui.HomeActivity_vNext'}
+
+def split_commands(command):
+    """Words of each command in a `;` or `&&` separated line, honouring quotes."""
+    lexer = shlex.shlex(command, posix=True, punctuation_chars=True)
+    lexer.whitespace_split = True
+    words = []
+    for token in lexer:
+        if token in (';', '&&'):
+            yield words
+            words = []
+        else:
+            words.append(token)
+    yield words
+
+def record_typed(words):
+    if words[1:2] == ['text'] and len(words) > 2:
+        text = words[2].replace('%s', ' ')
+    elif words[1:2] == ['keyevent'] and len(words) > 2:
+        text = {'66': '\n', '61': '\t'}.get(words[2], '')
+    else:
+        return
+    with open(TYPED, "a") as f:
+        f.write(text)
+
+def run_shell_command(command):
+    """Output of one shell command against the pretend device."""
+    output = []
+    for words in split_commands(command):
+        if words[:1] == ['input']:
+            time.sleep(INPUT_LATENCY)
+            if TYPED:
+                record_typed(words)
+        if words[:2] == ['input', 'keyevent'] and len(words) > 2:
+            key = words[2]
+            if key == '223':
+                device['awake'] = False
+            elif key == '224':
+                device['awake'] = True
+            elif key == '26':
+                device['awake'] = not device['awake']
+        elif words[:2] == ['am', 'start'] and '-n' in words:
+            device['app'] = words[words.index('-n') + 1]
+            device['awake'] = True
+        elif words[:2] == ['dumpsys', 'power']:
+            output.append(f"  mWakefulness={'Awake' if device['awake'] else 'Asleep'}")
+        elif words[:2] == ['dumpsys', 'window']:
+            output.append(f"  mCurrentFocus=Window{{1f2e3d u0 {device['app']}}}")
+    return output
+
+def interactive_shell():
+    """Read commands from stdin and answer each with its completion marker."""
+    handled = 0
+    for line in sys.stdin:
+        line = line.rstrip("\n")
+        if ECHO:
+            sys.stdout.write(line + "\n")
+        # adb.AdbShell ends each line with `; printf FORMAT ARGS... $?`
+        command, _, trailer = line.rpartition("; printf ")
+        if not command:
+            command, trailer = line, ""
+        time.sleep(LATENCY)
+        record("shell " + command)
+        for output in run_shell_command(command):
+            sys.stdout.write(output + "\n")
+        if trailer:
+            form, *args = shlex.split(trailer)
+            sys.stdout.write(form.replace("\\n", "\n") % tuple("0" if arg == "$?" else arg for arg in args))
+        sys.stdout.flush()
+        handled += 1
+        if DROP_AFTER and handled >= DROP_AFTER:
+            # Hang up straight away, the way a dropped connection does
+            os.close(sys.stdout.fileno())
+            os.close(sys.stderr.fileno())
+            break
+    return 0
+
+def main():
+    global serial
+    args = sys.argv[1:]
+    if len(args) >= 2 and args[0] == "-s":
+        serial, args = args[1], args[2:]
+    if not args:
+        print("Usage: adb <command>")
+        return 1
+
+    if args == ["shell"]:
+        return interactive_shell()
+
+    if args[0] == "connect" and len(args) > 1:
+        serial = serial or args[1]
+    time.sleep(LATENCY)
+    record(" ".join(args))
+    if args[0] == "connect":
+        address = args[1] if len(args) > 1 else 'device'
+        if address in OFFLINE or address.split(':')[0] in OFFLINE:
+            print(f"failed to connect to {address}")
+            return 1
+        print(f"connected to {address}")
+    elif args[0] == "devices":
+        print("List of devices attached")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,345 @@
+"""Minimal stand-in for the pigpio module so IR code can run off the Pi.
+
+Install it with `sys.modules['pigpio'] = fake_pigpio` before importing the
+emitter. Waves are kept in memory and the pigpio pulse and wave limits are
+enforced so resource problems show up the same way they do on the Pi.
+
+Edge callbacks are fed by replay(), which plays a recorded stream of
+(level, tick) edges into them from a thread, the way pigpiod reports them.
+
+Waveforms are also checked for mistakes the real daemon would silently
+transmit: a pulse that switches a GPIO on and off at once, negative or
+fractional delays, and sending on a GPIO that was never set to OUTPUT.
+These raise WaveformError unless FAKE_PIGPIO_STRICT=0. wave_timings() and
+wave_carrier() read a created wave back as mark/space durations and carrier
+frequency, so pulse timing can be compared with the capture it came from;
+chain_timings() and chain_carrier() do the same for wave_chain data, with
+its loops and delays expanded.
+"""
+import os
+import statistics
+import threading
+import time
+
+OUTPUT = 1
+INPUT = 0
+
+RISING_EDGE = 0
+FALLING_EDGE = 1
+EITHER_EDGE = 2
+TIMEOUT = 2  # Callback level reported by a watchdog
+
+# Same limits pigpiod reports via wave_get_max_pulses()/wave_get_max_cbs()
+MAX_PULSES = 12000
+MAX_CBS = 25016
+MAX_WAVES = 250
+
+PI_TOO_MANY_PULSES = -36
+PI_TOO_MANY_CBS = -69
+PI_NO_WAVEFORM_ID = -66
+PI_BAD_WAVE_ID = -66
+PI_CHAIN_LOOP_CNT = -114
+PI_BAD_CHAIN_LOOP = -115
+PI_BAD_CHAIN_CMD = -116
+PI_CHAIN_COUNTER = -117
+PI_CHAIN_TOO_BIG = -119
+
+# wave_chain limits: bytes of chain data and loop counters
+MAX_CHAIN = 600
+MAX_CHAIN_LOOPS = 20
+
+STRICT = os.environ.get("FAKE_PIGPIO_STRICT", "1") != "0"
+
+
+class WaveformError(ValueError):
+    pass
+
+def gpios(mask):
+    return [gpio for gpio in range(32) if mask >> gpio & 1]
+
+
+def tickDiff(t1, t2):
+    return (t2 - t1) & 0xFFFFFFFF
+
+def edges_from_timings(timings, start_tick=0, active_low=True):
+    """Edge stream a receiver produces for mark/space timings."""
+    mark, idle = (0, 1) if active_low else (1, 0)
+    edges = []
+    tick = start_tick
+    for i, duration in enumerate(timings):
+        edges.append((mark if i % 2 == 0 else idle, tick & 0xFFFFFFFF))
+        tick += duration
+    edges.append((idle, tick & 0xFFFFFFFF))
+    return edges
+
+
+class _callback:
+    def __init__(self, callbacks, gpio, edge, func):
+        self.callbacks = callbacks
+        self.entry = (gpio, edge, func)
+        callbacks.append(self.entry)
+
+    def cancel(self):
+        if self.entry in self.callbacks:
+            self.callbacks.remove(self.entry)
+
+
+class pulse:
+    def __init__(self, gpio_on, gpio_off, delay):
+        self.gpio_on = gpio_on
+        self.gpio_off = gpio_off
+        self.delay = delay
+
+
+class pi:
+    def __init__(self, host=None, port=None, strict=STRICT):
+        self.connected = True
+        self.strict = strict
+        self.modes = {}
+        self.pending = []
+        self.waves = {}
+        self.sent = []
+        self.chains = []
+        self.chaining = False
+        self.stats = {'add_generic': 0, 'create': 0, 'delete': 0, 'send': 0, 'chain': 0}
+        self.callbacks = []
+        self.watchdogs = {}
+        self.glitch_filters = {}
+
+    def set_mode(self, gpio, mode):
+        self.modes[gpio] = mode
+
+    def wave_clear(self):
+        self.pending = []
+        self.waves = {}
+
+    def _invalid(self, message):
+        if self.strict:
+            raise WaveformError(message)
+
+    def wave_add_generic(self, pulses):
+        self.stats['add_generic'] += 1
+        for p in pulses:
+            if p.gpio_on & p.gpio_off:
+                self._invalid(f"Pulse switches GPIO {gpios(p.gpio_on & p.gpio_off)} on and off at once")
+            if (p.gpio_on | p.gpio_off) >> 32:
+                self._invalid(f"Pulse mask {p.gpio_on | p.gpio_off:#x} is beyond GPIO 31")
+            if p.delay < 0 or p.delay != int(p.delay):
+                self._invalid(f"Pulse delay {p.delay!r} is not a whole number of microseconds")
+        self.pending.extend((p.gpio_on, p.gpio_off, p.delay) for p in pulses)
+        return len(self.pending)
+
+    def _check_outputs(self, wid):
+        mask = 0
+        for on, off, _ in self.waves[wid]:
+            mask |= on | off
+        for gpio in gpios(mask):
+            if self.modes.get(gpio) != OUTPUT:
+                self._invalid(f"Wave {wid} drives GPIO {gpio}, which is not set to OUTPUT")
+
+    def wave_timings(self, wid, gpio):
+        """Mark/space durations (us) of a wave on one GPIO, carrier bursts merged into marks.
+
+        A burst ends when the GPIO stays low for more than two carrier
+        periods; its length is its number of cycles times the carrier period.
+        """
+        return self._timings(self.waves[wid], gpio)
+
+    def wave_carrier_period(self, wid, gpio):
+        """Median time between rising edges inside bursts, in microseconds."""
+        return self._carrier_period(self.waves[wid], gpio)
+
+    def wave_carrier(self, wid, gpio):
+        """Carrier frequency of a wave in kHz."""
+        period = self.wave_carrier_period(wid, gpio)
+        return 1000.0 / period if period else None
+
+    def chain_pulses(self, data):
+        """The pulses a wave_chain transmits; a loop forever runs once."""
+        pulses, _ = self._expand(list(data), 0)
+        return pulses
+
+    def _expand(self, data, i):
+        """Pulses from data[i] up to the end of the current loop, and where it ends."""
+        pulses = []
+        while i < len(data):
+            if data[i] != 255:
+                pulses.extend(self.waves[data[i]])
+                i += 1
+            elif data[i + 1] == 0:
+                inner, i = self._expand(data, i + 2)
+                loops = data[i + 2] + 256 * data[i + 3] if data[i + 1] == 1 else 1
+                pulses.extend(inner * loops)
+                i += 4 if data[i + 1] == 1 else 2
+            elif data[i + 1] == 2:
+                pulses.append((0, 0, data[i + 2] + 256 * data[i + 3]))
+                i += 4
+            else:  # Loop end or loop forever: the caller repeats what we return
+                return pulses, i
+        return pulses, i
+
+    def chain_timings(self, data, gpio):
+        return self._timings(self.chain_pulses(data), gpio)
+
+    def chain_carrier(self, data, gpio):
+        period = self._carrier_period(self.chain_pulses(data), gpio)
+        return 1000.0 / period if period else None
+
+    def _timings(self, pulses, gpio):
+        rises = []
+        level, tick = 0, 0
+        bit = 1 << gpio
+        for on, off, delay in pulses:
+            if on & bit and not level:
+                level = 1
+                rises.append(tick)
+            elif off & bit:
+                level = 0
+            tick += delay
+        if not rises:
+            return []
+        period = self._carrier_period(pulses, gpio) or 1
+        timings = []
+        start = previous = rises[0]
+        cycles = 1
+        for rise in rises[1:] + [None]:
+            if rise is not None and rise - previous <= 2 * period:
+                cycles += 1
+                previous = rise
+                continue
+            mark = round(cycles * period)
+            timings.append(mark)
+            if rise is not None:
+                timings.append(rise - start - mark)
+                start = previous = rise
+                cycles = 1
+        return timings
+
+    def _carrier_period(self, pulses, gpio):
+        bit = 1 << gpio
+        rises, tick = [], 0
+        for on, _, delay in pulses:
+            if on & bit:
+                rises.append(tick)
+            tick += delay
+        gaps = [b - a for a, b in zip(rises, rises[1:])]
+        if not gaps:
+            return None
+        short = min(gaps)
+        return statistics.median(gap for gap in gaps if gap <= 2 * short)
+
+    def wave_create(self):
+        self.stats['create'] += 1
+        if len(self.pending) > MAX_PULSES:
+            self.pending = []
+            return PI_TOO_MANY_PULSES
+        used = sum(len(w) for w in self.waves.values())
+        if used + len(self.pending) > MAX_CBS // 2:
+            self.pending = []
+            return PI_TOO_MANY_CBS
+        free = [wid for wid in range(MAX_WAVES) if wid not in self.waves]
+        if not free:
+            self.pending = []
+            return PI_NO_WAVEFORM_ID
+        wid = free[0]
+        self.waves[wid] = self.pending
+        self.pending = []
+        return wid
+
+    def wave_delete(self, wid):
+        self.stats['delete'] += 1
+        if self.waves.pop(wid, None) is None:
+            return PI_BAD_WAVE_ID
+        return 0
+
+    def wave_send_once(self, wid):
+        self.stats['send'] += 1
+        if wid not in self.waves:
+            return PI_BAD_WAVE_ID
+        self._check_outputs(wid)
+        self.sent.append(wid)
+        return len(self.waves[wid])
+
+    def wave_chain(self, data):
+        self.stats['chain'] += 1
+        if len(data) > MAX_CHAIN:
+            return PI_CHAIN_TOO_BIG
+        i, depth, loops = 0, 0, 0
+        while i < len(data):
+            if data[i] != 255:
+                if data[i] not in self.waves:
+                    return PI_BAD_WAVE_ID
+                self._check_outputs(data[i])
+                i += 1
+                continue
+            command = data[i + 1] if i + 1 < len(data) else None
+            if command == 0:
+                depth += 1
+            elif command == 1:
+                count = data[i + 2] + 256 * data[i + 3] if i + 3 < len(data) else 0
+                if depth == 0:
+                    return PI_BAD_CHAIN_LOOP
+                if not count:
+                    return PI_CHAIN_LOOP_CNT
+                depth -= 1
+                loops += 1
+            elif command == 3:
+                if i + 2 != len(data):
+                    return PI_BAD_CHAIN_CMD  # Loop forever has to come last
+            elif command != 2:
+                return PI_BAD_CHAIN_CMD
+            i += 4 if command in (1, 2) else 2
+        if loops > MAX_CHAIN_LOOPS:
+            return PI_CHAIN_COUNTER
+        self.chains.append(list(data))
+        self.chaining = list(data[-2:]) == [255, 3]
+        return 0
+
+    def wave_tx_stop(self):
+        self.chaining = False
+        return 0
+
+    def wave_tx_busy(self):
+        return 1 if self.chaining else 0
+
+    def callback(self, gpio, edge=RISING_EDGE, func=None):
+        return _callback(self.callbacks, gpio, edge, func)
+
+    def set_watchdog(self, gpio, timeout_ms):
+        self.watchdogs[gpio] = timeout_ms
+        return 0
+
+    def set_glitch_filter(self, gpio, steady_us):
+        self.glitch_filters[gpio] = steady_us
+        return 0
+
+    def _notify(self, gpio, level, tick):
+        for cb_gpio, edge, func in list(self.callbacks):
+            if cb_gpio != gpio:
+                continue
+            if level == TIMEOUT or edge == EITHER_EDGE or edge == (FALLING_EDGE if level == 0 else RISING_EDGE):
+                func(gpio, level, tick)
+
+    def replay(self, gpio, edges, latency=0.0, background=True):
+        """Feed (level, tick) edges to the callbacks on `gpio`, then fire its watchdog.
+
+        `latency` seconds are slept before every callback, like a busy
+        Python callback thread; ticks are unaffected, as with pigpiod.
+        """
+        def run():
+            for level, tick in edges:
+                if latency:
+                    time.sleep(latency)
+                self._notify(gpio, level, tick)
+            if self.watchdogs.get(gpio):
+                time.sleep(self.watchdogs[gpio] / 1000.0)
+                self._notify(gpio, TIMEOUT, edges[-1][1] if edges else 0)
+        if not background:
+            run()
+            return None
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+        return thread
+
+    def stop(self):
+        self.connected = False
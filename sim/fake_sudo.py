@@ -0,0 +1,19 @@
+#!/usr/bin/env python3
+"""Stand-in for sudo: records the command instead of running it.
+
+Set SUDO to this script so RPIREBOOT and starting pigpiod are harmless off
+the Pi. Commands are appended to FAKE_SUDO_LOG (if set).
+"""
+import os
+import sys
+
+LOG = os.environ.get("FAKE_SUDO_LOG")
+
+def main():
+    if LOG:
+        with open(LOG, "a") as f:
+            f.write(" ".join(sys.argv[1:]) + "\n")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,150 @@
+"""Stand-in for /dev/hidg0 that decodes the reports back into keystrokes.
+
+The sink is the master side of a pty (or a FIFO); point HID_DEVICE, or a
+HidWriter, at `sink.path`. A reader thread splits what arrives into 8-byte
+reports, records when each one came in, and turns every new key press back
+into the character it types in the chosen layout. Keys that don't type a
+character show up by name, e.g. <UP>. This makes typing correctness
+(layout, shift handling, dropped reports) and report pacing checkable off
+the Pi.
+
+    python3 sim/hid_sink.py [--layout us] [--fifo]
+
+prints the path to use and echoes keystrokes as they arrive.
+"""
+import argparse
+import os
+import pty
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import tty
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+import hid
+
+REPORT_SIZE = 8
+
+def key_names(layout):
+    """(modifier, keycode) -> what the key types, for decoding reports."""
+    names = {(modifier, keycode): char for char, (modifier, keycode) in hid.LAYOUTS[layout].keys.items()}
+    for name, keycode in hid.KEYCODES.items():
+        if len(name) > 1:
+            names.setdefault((0, keycode), f"<{name}>")
+    return names
+
+
+class HidSink:
+    def __init__(self, layout=hid.LAYOUT, fifo=False, echo=False):
+        self.names = key_names(layout)
+        self.echo = echo
+        self.keys = []      # (arrival time, decoded key)
+        self.arrivals = []  # arrival time of every report
+        self.unknown = []   # reports that don't decode in this layout
+        self.condition = threading.Condition()
+        self._pressed = 0
+        if fifo:
+            self.path = os.path.join(tempfile.mkdtemp(), "hidg0")
+            os.mkfifo(self.path)
+            # Opening read-write keeps the FIFO open while writers come and go
+            self.fd = os.open(self.path, os.O_RDWR)
+            self._slave = None
+        else:
+            self.fd, self._slave = pty.openpty()
+            tty.setraw(self._slave)
+            self.path = os.ttyname(self._slave)
+        self.thread = threading.Thread(target=self._read, name="hid-sink", daemon=True)
+        self.thread.start()
+
+    def _read(self):
+        buffer = b''
+        while True:
+            try:
+                data = os.read(self.fd, 4096)
+            except OSError:
+                return
+            if not data:
+                return
+            now = time.monotonic()
+            buffer += data
+            while len(buffer) >= REPORT_SIZE:
+                self._report(buffer[:REPORT_SIZE], now)
+                buffer = buffer[REPORT_SIZE:]
+
+    def _report(self, report, now):
+        modifier, keycode = report[0], report[2]
+        with self.condition:
+            self.arrivals.append(now)
+            # A key counts once when it goes down; holding it or lifting it adds nothing
+            if keycode and keycode != self._pressed:
+                key = self.names.get((modifier, keycode))
+                if key is None:
+                    self.unknown.append(report)
+                    key = f"<0x{keycode:02x}/{modifier:02x}>"
+                self.keys.append((now, key))
+                if self.echo:
+                    print(key, end='', flush=True)
+            self._pressed = keycode
+            self.condition.notify_all()
+
+    def text(self):
+        """Everything typed so far, keys without a character by name."""
+        with self.condition:
+            return ''.join(key for _, key in self.keys)
+
+    def wait_for_reports(self, count, timeout=5.0):
+        """Wait until `count` reports have arrived in total; returns False on timeout."""
+        with self.condition:
+            return self.condition.wait_for(lambda: len(self.arrivals) >= count, timeout)
+
+    def intervals(self):
+        """Seconds between consecutive reports, for checking the pacing."""
+        with self.condition:
+            arrivals = list(self.arrivals)
+        return [b - a for a, b in zip(arrivals, arrivals[1:])]
+
+    def pacing(self):
+        """Median and minimum gap between reports, in milliseconds.
+
+        Reports that arrive in one read share a timestamp, so the minimum can
+        be 0 when the reader thread falls behind; the median is the reliable
+        figure.
+        """
+        gaps = self.intervals()
+        if not gaps:
+            return 0.0, 0.0
+        return statistics.median(gaps) * 1000, min(gaps) * 1000
+
+    def clear(self):
+        with self.condition:
+            self.keys, self.arrivals, self.unknown = [], [], []
+            self._pressed = 0
+
+    def close(self):
+        for fd in (self._slave, self.fd):
+            if fd is not None:
+                try:
+                    os.close(fd)
+                except OSError:
+                    pass
+
+def main():
+    parser = argparse.ArgumentParser(description="Decode HID reports written to a pty or FIFO.")
+    parser.add_argument("--layout", default=hid.LAYOUT, choices=sorted(hid.LAYOUTS))
+    parser.add_argument("--fifo", action="store_true", help="Use a FIFO instead of a pty")
+    args = parser.parse_args()
+    sink = HidSink(args.layout, fifo=args.fifo, echo=True)
+    print(f"HID_DEVICE={sink.path}")
+    try:
+        sink.thread.join()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        sink.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""Run the web app off the Pi with every device simulated.
+
+- HID goes to a HidSink pty, and the decoded keystrokes are echoed here.
+- adb is sim/fake_adb.py and sudo is sim/fake_sudo.py.
+- pigpio is sim/fake_pigpio.py.
+
+Logs, the IR socket and the fake device logs go to a temporary directory.
+
+    python3 sim/serve.py [--port 5000] [--adb-latency 0.02]
+"""
+import argparse
+import os
+import runpy
+import sys
+import tempfile
+
+SIM_DIR = os.path.dirname(os.path.abspath(__file__))
+BASE_DIR = os.path.dirname(SIM_DIR)
+sys.path.insert(0, SIM_DIR)
+
+def simulate(tmp, hid_path, adb_latency=0.0):
+    """Point the app's settings at the stand-ins (before anything imports engine)."""
+    os.environ.update({
+        "HID_DEVICE": hid_path,
+        "ADB": os.path.join(SIM_DIR, "fake_adb.py"),
+        "SUDO": os.path.join(SIM_DIR, "fake_sudo.py"),
+        "FAKE_ADB_LATENCY": str(adb_latency),
+        "FAKE_ADB_LOG": os.path.join(tmp, "adb.log"),
+        "FAKE_SUDO_LOG": os.path.join(tmp, "sudo.log"),
+        "IR_SOCKET": os.path.join(tmp, "ir.sock"),
+        "LOG_FILE": os.path.join(tmp, "app.log"),
+        "STATE_FILE": os.path.join(tmp, "state.json"),
+        "DEVICES_FILE": os.environ.get("DEVICES_FILE", os.path.join(tmp, "devices.json")),
+    })
+    # Child processes (emitter.py, cron jobs) get the fake pigpio too
+    stubs = os.path.join(SIM_DIR, "stubs")
+    os.environ["PYTHONPATH"] = os.pathsep.join(filter(None, [stubs, os.environ.get("PYTHONPATH")]))
+    import fake_pigpio
+    sys.modules['pigpio'] = fake_pigpio
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=5000)
+    parser.add_argument("--adb-latency", type=float, default=0.02)
+    args = parser.parse_args()
+
+    from hid_sink import HidSink
+    tmp = tempfile.mkdtemp()
+    sink = HidSink(echo=True)
+    simulate(tmp, sink.path, args.adb_latency)
+    os.environ["PORT"] = str(args.port)
+    print(f"Simulated devices; logs in {tmp}. Keystrokes typed over HID appear below.")
+    sys.path.insert(0, BASE_DIR)
+    os.chdir(tmp)
+    runpy.run_path(os.path.join(BASE_DIR, "app.py"), run_name="__main__")
+
+if __name__ == "__main__":
+    main()
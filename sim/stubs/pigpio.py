@@ -0,0 +1,7 @@
+"""Makes `import pigpio` resolve to the fake in subprocesses (PYTHONPATH=sim/stubs)."""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_pigpio import *
@@ -0,0 +1,209 @@
+"""What the TV, soundbar and Firestick are doing, as far as we can tell.
+
+The Firestick is asked directly: one batched `dumpsys` query over the
+persistent ADB shell every POLL_INTERVAL seconds (and before an ENSURE
+command) gives its power state and foreground app. The TV and soundbar
+only have IR, so their power, mute and volume are inferred from the
+commands we send; power is a toggle, so it stays unknown until someone
+sets it (tap it in the page's state line, or PUT /state/<device>). ENSURE
+commands won't send a toggle while its field is unknown.
+
+With a `path`, the TV and soundbar values are saved there whenever they
+change and loaded on startup, so a restart doesn't forget them. The
+Firestick is polled over a shell of its own, so a slow dumpsys never
+holds up keyevents.
+"""
+import json
+import logging
+import os
+import re
+import threading
+import time
+
+from adb import AdbError
+import registry
+
+POLL_INTERVAL = float(os.environ.get("STATE_POLL_INTERVAL", "10"))
+
+# Last known TV and soundbar state, one entry per Firestick address (room)
+STATE_FILE = os.environ.get("STATE_FILE", "state.json")
+SAVED_DEVICES = ('tv', 'soundbar')
+SAVED_FIELDS = ('power', 'input', 'volume', 'mute', 'updated')
+
+log = logging.getLogger(__name__)
+
+# Rooms share the file, so saves are serialized
+_file_lock = threading.Lock()
+
+MAX_VOLUME = 100
+
+# Only the first matching line of each dumpsys is read
+FIRESTICK_QUERY = ("dumpsys power | grep -m1 mWakefulness=; "
+                   "dumpsys window | grep -m1 mCurrentFocus=")
+
+WAKEFULNESS_RE = re.compile(r'mWakefulness=(\w+)')
+FOCUS_RE = re.compile(r'mCurrentFocus=Window\{\S+ \S+ ([\w.]+)/')
+
+# Effect of each command on the inferred state: command -> (device, field, change)
+# change is True/False to set, 'toggle', or +1/-1 for volume steps
+EFFECTS = {
+    'TVPOWER': ('tv', 'power', 'toggle'),
+    'TVMUTE': ('tv', 'mute', 'toggle'),
+    'TVVOLUP': ('tv', 'volume', +1),
+    'TVVOLDOWN': ('tv', 'volume', -1),
+    'SOUNDBARON': ('soundbar', 'power', 'toggle'),
+    'SOUNDBARVOLMUTE': ('soundbar', 'mute', 'toggle'),
+    'SOUNDBARVOLUP': ('soundbar', 'volume', +1),
+    'SOUNDBARVOLDOWN': ('soundbar', 'volume', -1),
+    'FIRESLEEP': ('firestick', 'power', False),
+    'FIREWAKE': ('firestick', 'power', True),
+    'FIREPOWER': ('firestick', 'power', 'toggle'),
+}
+
+
+class DeviceState:
+    """State cache for every device, shared by the engine and the web app."""
+
+    def __init__(self, adb_shell=None, poll_interval=POLL_INTERVAL, path=None, key=None):
+        self.adb_shell = adb_shell
+        self.poll_interval = poll_interval
+        self.path = path
+        self.key = key
+        self.lock = threading.Lock()
+        self.devices = {
+            'tv': {'power': None, 'input': None, 'volume': None, 'mute': None, 'source': 'inferred'},
+            'soundbar': {'power': None, 'input': None, 'volume': None, 'mute': None, 'source': 'inferred'},
+            'firestick': {'power': None, 'app': None, 'reachable': None, 'source': 'adb'},
+        }
+        for device in self.devices.values():
+            device['updated'] = None
+        self.listeners = []
+        self.stop_event = threading.Event()
+        self.thread = None
+        if path:
+            self._load()
+
+    def get(self, device, field):
+        with self.lock:
+            return self.devices[device].get(field)
+
+    def snapshot(self):
+        with self.lock:
+            return {name: dict(fields) for name, fields in self.devices.items()}
+
+    def set(self, device, **fields):
+        """Record known values, e.g. set('tv', power=True); unknown fields are rejected."""
+        if device not in self.devices:
+            raise KeyError(device)
+        unknown = set(fields) - set(self.devices[device])
+        if unknown:
+            raise KeyError(", ".join(sorted(unknown)))
+        with self.lock:
+            state = self.devices[device]
+            changed = any(state[field] != value for field, value in fields.items())
+            state.update(fields)
+            state['updated'] = time.time()
+        if changed:
+            if self.path and device in SAVED_DEVICES:
+                self._save()
+            self._notify()
+        return changed
+
+    def _read_file(self):
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            log.warning("Ignoring saved state in %s: %s", self.path, e)
+            return {}
+
+    def _load(self):
+        saved = self._read_file().get(self.key, {})
+        with self.lock:
+            for device in SAVED_DEVICES:
+                for field, value in saved.get(device, {}).items():
+                    if field in SAVED_FIELDS:
+                        self.devices[device][field] = value
+
+    def _save(self):
+        with self.lock:
+            entry = {device: {field: self.devices[device][field] for field in SAVED_FIELDS}
+                     for device in SAVED_DEVICES}
+        with _file_lock:
+            saved = self._read_file()
+            saved[self.key] = entry
+            temp = f"{self.path}.tmp"
+            try:
+                with open(temp, 'w') as f:
+                    json.dump(saved, f, indent=4)
+                os.replace(temp, self.path)
+            except OSError as e:
+                log.warning("Could not save state to %s: %s", self.path, e)
+
+    def apply(self, command, repeats=1):
+        """Update inferred state after `command` was sent successfully."""
+        effect = EFFECTS.get(command)
+        if effect is None:
+            entry, value = registry.lookup(command)
+            if entry is not None and entry.kind == registry.ADB_INTENT:
+                # Confirmed by the next poll
+                return self.set('firestick', power=True, app=value[0].split('/')[0])
+            return False
+        device, field, change = effect
+        current = self.get(device, field)
+        if change == 'toggle':
+            value = None if current is None else not current
+        elif isinstance(change, bool):  # Checked before numbers: True == 1
+            value = change
+        elif current is None:
+            return False  # No baseline for the volume yet
+        else:
+            value = max(0, min(MAX_VOLUME, current + change * repeats))
+        fields = {field: value}
+        if field == 'volume':
+            fields['mute'] = False  # Volume keys unmute on both devices
+        return self.set(device, **fields)
+
+    # -- Firestick polling ------------------------------------------------
+
+    def poll_firestick(self):
+        """Query the Firestick once; returns False if it couldn't be reached."""
+        if self.adb_shell is None:
+            return False
+        try:
+            _, output = self.adb_shell.run(FIRESTICK_QUERY)
+        except (AdbError, OSError):
+            self.set('firestick', reachable=False)
+            return False
+        fields = {'reachable': True}
+        wakefulness = WAKEFULNESS_RE.search(output)
+        if wakefulness:
+            fields['power'] = wakefulness.group(1) == 'Awake'
+        focus = FOCUS_RE.search(output)
+        if focus:
+            fields['app'] = focus.group(1)
+        self.set('firestick', **fields)
+        return True
+
+    def start(self):
+        """Poll the Firestick in the background every poll_interval seconds."""
+        if self.thread is None and self.poll_interval > 0:
+            self.thread = threading.Thread(target=self._poll_loop, name="state-poll", daemon=True)
+            self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        if self.adb_shell is not None:
+            self.adb_shell.close()
+
+    def _poll_loop(self):
+        while not self.stop_event.is_set():
+            self.poll_firestick()
+            self.stop_event.wait(self.poll_interval)
+
+    def _notify(self):
+        snapshot = self.snapshot()
+        for listener in list(self.listeners):
+            listener(snapshot)
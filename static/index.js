@@ -4,92 +4,311 @@ function appendToDisplay(value) {
     // Do nothing; leaves unmapped buttons inactive
 }
 
+// Results and device status are pushed over a single EventSource stream;
+// button presses go out as small form-encoded POSTs to /send
+let events = null;
+let nextRef = 1;
+const pending = new Map();
+// Room from devices.json that buttons control; null until /rooms has loaded
+let currentRoom = null;
+
+function connectEvents() {
+    events = new EventSource('/events');
+    events.addEventListener('job', (event) => {
+        const job = JSON.parse(event.data);
+        if (!pending.has(job.ref)) {
+            return;
+        }
+        const command = pending.get(job.ref);
+        pending.delete(job.ref);
+        console.log('Command finished:', command, job);
+        if (job.status === 'error') {
+            alert(`Error: ${job.output}`);
+        }
+    });
+    events.addEventListener('press', (event) => {
+        const result = JSON.parse(event.data);
+        if (!result.ok) {
+            console.error(`Error: ${result.output}`);
+        }
+    });
+    events.addEventListener('state', (event) => showState(JSON.parse(event.data)));
+    events.addEventListener('status', (event) => {
+        document.dispatchEvent(new CustomEvent('remote-status', { detail: JSON.parse(event.data) }));
+    });
+    // EventSource reconnects on its own after errors, but not after a refusal
+    // (503 when the server has all the streams it allows); presses poll /jobs meanwhile
+    events.onerror = () => {
+        if (events.readyState === EventSource.CLOSED) {
+            console.warn('Event stream refused, retrying in 30s');
+            setTimeout(connectEvents, 30000);
+        } else {
+            console.warn('Event stream interrupted, reconnecting...');
+        }
+    };
+}
+
+function describePower(power) {
+    return power === null ? '?' : (power ? 'on' : 'off');
+}
+
+// Last state shown, so a tap on the state line knows what to correct
+let shownState = null;
+
+function showState(state) {
+    const line = document.getElementById('state');
+    if (!line || (currentRoom && state.room !== currentRoom)) {
+        return;
+    }
+    shownState = state;
+    const app = state.firestick.app ? state.firestick.app.split('.').pop() : '';
+    document.getElementById('state-tv').textContent = `TV ${describePower(state.tv.power)}`;
+    document.getElementById('state-soundbar').textContent = `Soundbar ${describePower(state.soundbar.power)}`;
+    document.getElementById('state-volume').textContent = `vol ${state.soundbar.volume === null ? '?' : state.soundbar.volume}`;
+    document.getElementById('state-firestick').textContent =
+        `Firestick ${describePower(state.firestick.power)}${app ? ' ' + app : ''}`;
+}
+
+function loadState() {
+    const query = currentRoom ? `?room=${encodeURIComponent(currentRoom)}` : '';
+    fetch(`/state${query}`)
+        .then(response => response.json())
+        .then(showState)
+        .catch(error => console.error('Error loading state:', error));
+}
+
+// The TV and soundbar only hear IR, so their state is inferred from what was
+// sent. Tapping one records what it is really doing; nothing is sent to it.
+function correctState(device, fields) {
+    const query = currentRoom ? `?room=${encodeURIComponent(currentRoom)}` : '';
+    fetch(`/state/${device}${query}`, {
+        method: 'PUT',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify(fields),
+    })
+        .then(response => response.json())
+        .then(showState)
+        .catch(error => console.error('Error correcting state:', error));
+}
+
+function attachStateControls() {
+    ['tv', 'soundbar'].forEach(device => {
+        document.getElementById(`state-${device}`).addEventListener('click', () => {
+            if (shownState) {
+                correctState(device, { power: shownState[device].power !== true });
+            }
+        });
+    });
+    document.getElementById('state-volume').addEventListener('click', () => {
+        const volume = prompt('Soundbar volume', shownState && shownState.soundbar.volume !== null ? shownState.soundbar.volume : '');
+        if (volume !== null && volume.trim() !== '' && !isNaN(volume)) {
+            correctState('soundbar', { volume: Math.round(Number(volume)) });
+        }
+    });
+}
+
+function loadRooms() {
+    const picker = document.getElementById('room');
+    fetch('/rooms')
+        .then(response => response.json())
+        .then(config => {
+            currentRoom = config.default;
+            if (picker && config.rooms.length > 1) {
+                config.rooms.forEach(room => picker.add(new Option(room.name, room.name, false, room.name === currentRoom)));
+                picker.hidden = false;
+                picker.addEventListener('change', () => {
+                    currentRoom = picker.value;
+                    loadState();
+                });
+            }
+            loadState();
+        })
+        .catch(error => console.error('Error loading rooms:', error));
+}
+
+function post(fields) {
+    if (currentRoom) {
+        fields.room = currentRoom;
+    }
+    return fetch('/send', {
+        method: 'POST',
+        body: new URLSearchParams(fields),
+        keepalive: true
+    });
+}
+
+// Poll a queued job until it finishes and report errors (used when the
+// event stream is down)
+async function watchJob(jobId) {
+    for (let attempt = 0; attempt < 40; attempt++) {
+        await new Promise(resolve => setTimeout(resolve, 250));
+        const response = await fetch(`/jobs/${jobId}`);
+        const job = await response.json();
+        if (job.status === 'done') {
+            return;
+        }
+        if (job.status === 'error') {
+            alert(`Error: ${job.output}`);
+            return;
+        }
+    }
+}
+
 // Function to send a command to the backend server
-async function sendCommand(command) {
+async function sendCommand(command, action = 'execute') {
+    const ref = String(nextRef++);
+    const streaming = events && events.readyState === EventSource.OPEN;
+    if (streaming) {
+        pending.set(ref, command);
+    }
     try {
-        const response = await fetch('/execute', {
-            method: 'POST',
-            headers: {
-                'Content-Type': 'application/json',
-            },
-            body: JSON.stringify({ command: command })
-        });
-        
-        const result = await response.json();
-        console.log('Command executed:', result);
-        
-        if (result.status !== 'success') {
-            alert(`Error: ${result.error}`);
+        const response = await post({ action: action, command: command, ref: ref });
+        if (!response.ok) {
+            pending.delete(ref);
+            alert(`Error: ${await response.text()}`);
+        } else if (!streaming) {
+            watchJob(await response.text());
         }
     } catch (error) {
+        pending.delete(ref);
         console.error('Error executing command:', error);
         alert('Network error occurred.');
     }
 }
 
+// Hold-to-repeat: a tap shorter than HOLD_DELAY ms is queued like a click;
+// holding longer starts a hold, and the release names the hold it ends
+const HOLD_DELAY = 300;
+// Keeps hold refs from different pages apart on the server
+const holdPrefix = Math.random().toString(36).slice(2) + '-';
+
+function postHold(action, command, ref) {
+    post({ action: action, command: command, ref: ref })
+        .catch(error => console.error('Error sending hold:', error));
+}
+
+function attachHold(button, command) {
+    let timer = null;
+    let ref = null;
+    const release = (tap) => {
+        if (timer !== null) {
+            clearTimeout(timer);
+            timer = null;
+            if (tap) {
+                sendCommand(command);
+            }
+        } else if (ref !== null) {
+            postHold('release', command, ref);
+            ref = null;
+        }
+    };
+    button.addEventListener('pointerdown', (event) => {
+        event.preventDefault();
+        if (timer !== null || ref !== null) {
+            return;
+        }
+        timer = setTimeout(() => {
+            timer = null;
+            ref = holdPrefix + nextRef++;
+            postHold('press', command, ref);
+        }, HOLD_DELAY);
+    });
+    button.addEventListener('pointerup', () => release(true));
+    button.addEventListener('pointerleave', () => release(false));
+    button.addEventListener('pointercancel', () => release(false));
+    button.addEventListener('contextmenu', (event) => event.preventDefault());
+}
+
+// Latency summary, refreshed while the panel is open
+async function refreshMetrics() {
+    const panel = document.getElementById('metrics');
+    if (!panel || !panel.open) {
+        return;
+    }
+    try {
+        const response = await fetch('/metrics/summary');
+        const summary = await response.json();
+        const rows = summary.stages.map(stage => `<tr><td>${stage.stage}${stage.channel ? ' (' + stage.channel + ')' : ''}</td>` +
+            `<td>${stage.count}</td><td>${stage.p50_ms}</td><td>${stage.p95_ms}</td><td>${stage.max_ms}</td></tr>`);
+        document.getElementById('metrics-table').innerHTML =
+            '<tr><th>Stage</th><th>Count</th><th>p50 ms</th><th>p95 ms</th><th>Max ms</th></tr>' + rows.join('');
+    } catch (error) {
+        console.error('Error loading metrics:', error);
+    }
+}
+
+// Recent log records, refreshed while the panel is open
+async function refreshLogs() {
+    const panel = document.getElementById('logs');
+    if (!panel || !panel.open) {
+        return;
+    }
+    try {
+        const response = await fetch('/logs?limit=50');
+        const result = await response.json();
+        document.getElementById('log-lines').textContent = result.records
+            .map(record => `${new Date(record.time * 1000).toLocaleTimeString()} ${record.level} ${record.message}`)
+            .join('\n');
+    } catch (error) {
+        console.error('Error loading logs:', error);
+    }
+}
+
 // Add event listeners when the DOM is fully loaded
 document.addEventListener('DOMContentLoaded', () => {
-    // Map only the specified buttons to their commands
-    const buttonCommands = {
-        'FireUp': 'UP',
-        'FireLeft': 'LEFT',
-        'FireSelect': 'ENTER',
-        'FireRight': 'RIGHT',
-        'FireDown': 'DOWN',
-        'FireBack': 'ESC',
-        'FireHome': 'HOME',
-        'FireMenu': 'MENU',
-        'FireRewind': 'REWIND',
-        'FirePlayPause': 'PLAYPAUSE',
-        'FireFastForward': 'FASTFORWARD',
-        'FireReboot': 'FIREREBOOT',
-        'RpiReboot': 'RPIREBOOT',
-        'FireSleep': 'FIRESLEEP',
-        'FireWake': 'FIREWAKE',
-        'Plex': 'PLEX',
-        'YouTube': 'YOUTUBE',
-        'Prime': 'PRIME',
-        'Netflix': 'NETFLIX',
-        'Hulu': 'HULU',
-        'HBO': 'HBO',
-        'DiscoveryPlus': 'DISCOVERYPLUS',
-        'ParamountPlus': 'PARAMOUNTPLUS',
-        'AppleTV': 'APPLETV',
-        
-        'SoundbarOn': 'SOUNDBARON',
-        'SoundbarInput': 'SOUNDBARINPUT',
-        'SoundbarVolUp': 'SOUNDBARVOLUP',
-        'SoundbarVolDown': 'SOUNDBARVOLDOWN',
-        'SoundbarVolMute': 'SOUNDBARVOLMUTE',
-        'SoundbarSubVolUp': 'SOUNDBARSUBVOLUP',
-        'SoundbarSubVolDown': 'SOUNDBARSUBVOLDOWN',
-
-        'TVPower': 'TVPOWER',
-        'TVUp': 'TVUP',
-        'TVInput': 'TVINPUT',
-        'TVLeft': 'TVLEFT',
-        'TVSelect': 'TVSELECT',
-        'TVRight': 'TVRIGHT',
-        'TVPBack': 'TVPBACK',
-        'TVDown': 'TVDOWN',
-        'TVMenu': 'TVMENU',
-        'TVVolMute': 'TVVOLMUTE',
-        'TVVolUp': 'TVVOLUP',
-        'TVVolDown': 'TVVOLDOWN',
+    connectEvents();
+    loadRooms();
+    attachStateControls();
 
-    };
+    const metricsPanel = document.getElementById('metrics');
+    if (metricsPanel) {
+        metricsPanel.addEventListener('toggle', refreshMetrics);
+        setInterval(refreshMetrics, 5000);
+    }
+    const logPanel = document.getElementById('logs');
+    if (logPanel) {
+        logPanel.addEventListener('toggle', refreshLogs);
+        setInterval(refreshLogs, 5000);
+    }
 
-    // Attach click event listeners only to mapped buttons
-    Object.keys(buttonCommands).forEach(buttonId => {
-        const button = document.getElementById(buttonId);
-        if (button) {
-            button.addEventListener('click', () => {
-                sendCommand(buttonCommands[buttonId]);
+    // Button ids -> commands come from the server's command registry
+    fetch('/commands')
+        .then(response => response.json())
+        .then(registry => {
+            const buttonCommands = registry.buttons;
+            const repeatable = new Set(registry.repeat);
+
+            // Attach click event listeners only to mapped buttons
+            Object.keys(buttonCommands).forEach(buttonId => {
+                const button = document.getElementById(buttonId);
+                if (button && repeatable.has(buttonCommands[buttonId])) {
+                    attachHold(button, buttonCommands[buttonId]);
+                } else if (button) {
+                    button.addEventListener('click', () => {
+                        sendCommand(buttonCommands[buttonId]);
+                    });
+                } else {
+                    console.warn(`Button with ID ${buttonId} not found.`);
+                }
             });
-        } else {
-            console.warn(`Button with ID ${buttonId} not found.`);
-        }
-    });
+        })
+        .catch(error => console.error('Error loading commands:', error));
+
+    // One button per named macro from macros.json
+    const macroArea = document.getElementById('macros');
+    fetch('/macros')
+        .then(response => response.json())
+        .then(config => {
+            config.macros.forEach(macro => {
+                const button = document.createElement('button');
+                button.className = 'Macro';
+                button.textContent = macro.name;
+                button.title = macro.description;
+                button.addEventListener('click', () => sendCommand(macro.name, 'macro'));
+                macroArea.appendChild(button);
+            });
+        })
+        .catch(error => console.error('Error loading macros:', error));
 
     // Handle the send button for the text input (wrap in quotes for string typing)
     const sendButton = document.getElementById('send-button');
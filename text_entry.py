@@ -0,0 +1,146 @@
+"""Typing text on the Firestick over whichever channel is faster.
+
+HID types one character per press/release report pair, so it costs about
+2 x REPORT_INTERVAL per character. `adb shell input text` costs one round
+trip plus Android starting the `input` tool (a few hundred ms on a
+Firestick) whatever the length. So short strings go over HID and longer ones
+over the persistent ADB shell:
+
+- All the `input` calls for one string go in a single shell command, so a
+  string costs one round trip. Each call carries up to TEXT_CHUNK characters
+  so the device never gets an overlong command line.
+- Newlines and tabs become ENTER and TAB keyevents.
+- Characters `input text` can't type (anything outside printable ASCII) send
+  the whole string over HID.
+- The shell timeout grows by ADB_CALL_TIMEOUT for every `input` call.
+- If the chosen channel fails before anything was sent, the other one is
+  tried. Once an ADB command or any HID report has gone out, part of the
+  string may already be typed, so it is not typed again. After an ADB
+  failure, ADB isn't tried again for ADB_RETRY_AFTER seconds.
+
+The ADB cost estimate starts at TEXT_ADB_SECONDS and follows the measured
+time per `input` call. TEXT_ENTRY=hid or adb forces one channel, with no
+fallback to the other.
+"""
+import os
+import shlex
+import time
+
+from adb import AdbError
+import metrics
+
+TEXT_ENTRY = os.environ.get("TEXT_ENTRY", "auto")
+TEXT_ADB_SECONDS = float(os.environ.get("TEXT_ADB_SECONDS", "0.4"))
+TEXT_CHUNK = int(os.environ.get("TEXT_CHUNK", "100"))
+ADB_RETRY_AFTER = 60.0
+ADB_CALL_TIMEOUT = 2.0
+
+# Keyevents for the control characters type_text() understands
+KEYEVENTS = {'\n': 66, '\t': 61}
+
+def adb_typable(text):
+    return all(' ' <= char <= '~' or char in KEYEVENTS for char in text)
+
+def escape(text):
+    """Argument for `input text`: spaces are written as %s."""
+    return text.replace(' ', '%s')
+
+def adb_chunks(text, size=TEXT_CHUNK):
+    """Split text into `input text` payloads of at most `size` characters.
+
+    `input text` turns every "%s" into a space, so a literal "%s" is split
+    across two calls, and newlines and tabs are yielded on their own.
+    """
+    chunk = ''
+    for char in text:
+        if char in KEYEVENTS or len(chunk) >= size or (char == 's' and chunk.endswith('%')):
+            if chunk:
+                yield chunk
+            chunk = ''
+            if char in KEYEVENTS:
+                yield char
+                continue
+        chunk += char
+    if chunk:
+        yield chunk
+
+def adb_command(text):
+    """One shell command that types the whole string."""
+    calls = []
+    for chunk in adb_chunks(text):
+        if chunk in KEYEVENTS:
+            calls.append(f"input keyevent {KEYEVENTS[chunk]}")
+        else:
+            calls.append("input text " + shlex.quote(escape(chunk)))
+    return " && ".join(calls), len(calls)
+
+
+class TextEntry:
+    """Picks HID or ADB for each string and falls back to the other."""
+
+    def __init__(self, hid, adb_shell, log=print, mode=TEXT_ENTRY):
+        self.hid = hid
+        self.adb_shell = adb_shell
+        self.log = log
+        self.mode = mode
+        self.adb_seconds = TEXT_ADB_SECONDS
+        self.adb_down_until = 0.0
+
+    def choose(self, text, char_delay=0):
+        """'hid' or 'adb', whichever should finish first."""
+        if self.mode in ('hid', 'adb'):
+            return self.mode
+        # Per-character delays only make sense over HID
+        if char_delay or not adb_typable(text) or time.monotonic() < self.adb_down_until:
+            return 'hid'
+        hid_seconds = len(self.hid.layout.translate(text)) // 8 * self.hid.interval
+        _, calls = adb_command(text)
+        return 'adb' if calls * self.adb_seconds < hid_seconds else 'hid'
+
+    def type(self, text, char_delay=0):
+        """Type text; returns False if it couldn't be typed in full."""
+        first = self.choose(text, char_delay)
+        second = 'hid' if first == 'adb' else 'adb'
+        ok, sent = self._type(first, text, char_delay)
+        if ok:
+            return True
+        if sent:
+            self.log(f"Typing over {first.upper()} failed after it was sent; not typing it again")
+            return False
+        if self.mode == first:
+            return False  # Forced channel
+        if second == 'adb' and not adb_typable(text):
+            return False
+        self.log(f"Typing over {first.upper()} failed, trying {second.upper()}")
+        return self._type(second, text, char_delay)[0]
+
+    def _type(self, strategy, text, char_delay):
+        start = time.perf_counter()
+        if strategy == 'hid':
+            written = self.hid.reports_written
+            ok = self.hid.type_string(text, char_delay=char_delay)
+            sent = self.hid.reports_written > written
+        else:
+            ok, sent = self.type_adb(text)
+        metrics.observe('text_entry', time.perf_counter() - start, strategy)
+        return ok, sent
+
+    def type_adb(self, text):
+        """Type text in one ADB command; returns (ok, whether the command went out)."""
+        command, calls = adb_command(text)
+        start = time.monotonic()
+        try:
+            status, output = self.adb_shell.run(command, timeout=self.adb_shell.timeout + calls * ADB_CALL_TIMEOUT)
+        except AdbError as e:
+            self.log(f"ADB text entry failed: {e}")
+            self.adb_down_until = time.monotonic() + ADB_RETRY_AFTER
+            return False, e.sent
+        if status != 0:
+            # Calls before the failing one have typed their part
+            self.log(f"ADB text entry failed: {output}")
+            self.adb_down_until = time.monotonic() + ADB_RETRY_AFTER
+            return False, True
+        # Follow what an `input` call really costs on this device
+        per_call = (time.monotonic() - start) / calls
+        self.adb_seconds = 0.8 * self.adb_seconds + 0.2 * per_call
+        return True, True